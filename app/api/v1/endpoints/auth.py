@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from app.infra.schemas import RegisterSchema, LoginSchema, RefreshSchema, TokenSchema, RegisterResponseSchema, RefreshResponseSchema
 from app.infra.uow import UnitOfWork, get_uow
-from app.core.db import get_db
+from app.core.db import get_db, pin_primary
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.services.auth.auth_service import AuthService
 from app.core.exceptions.base import BaseException as AppException
@@ -11,6 +11,8 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 
 # 依赖函数，创建AuthService
 async def get_auth_service(db: AsyncSession = Depends(get_db)) -> AuthService:
+    # 注册 / 登录 / refresh token 必须读到最新数据, 不使用 replica
+    pin_primary(db)
     return AuthService(db=db)
 
 # 注册
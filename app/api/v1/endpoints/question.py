@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, Body, Header, Request
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 import asyncio, json, urllib.parse
 from app.services.agent.question.agent import QuestionAgent
 from app.services.question.types import QuestionUnion, QuestionListAdapter
@@ -17,6 +18,55 @@ import contextlib
 router = APIRouter(prefix="/question", tags=["question"])
 
 
+# 把 agent 的 event 流包装成 SSE 响应
+# 客户端断开时 Starlette 会取消推送; background 中 aclose 保证 run_stream 的 finally 一定执行 (取消 agent 并回滚)
+def _sse_response(events) -> StreamingResponse:
+    async def event_gen():
+        async for ev in events:
+            # SSE 帧必须以 \n\n 结束；加 data: 兼容浏览器
+            yield "data: " + ev.model_dump_json() + "\n\n"
+
+    return StreamingResponse(
+        event_gen(),                      # ← 传包装后的 async-generator
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+        background=BackgroundTask(events.aclose),
+    )
+
+
+# 等待 WebSocket 客户端断开 (客户端后续发来的消息忽略)
+async def _wait_disconnect(websocket: WebSocket) -> None:
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
+# 把 agent 的 event 流推送到 WebSocket; 客户端断开时立即停止并关闭 event 流 (取消 agent 并回滚)
+async def _send_ws(websocket: WebSocket, events) -> None:
+    async def forward():
+        async for ev in events:
+            await websocket.send_text(ev.model_dump_json())
+            if ev.type == AgentEventType.RESULT:
+                break
+
+    forward_task = asyncio.create_task(forward())
+    watch_task = asyncio.create_task(_wait_disconnect(websocket))
+    try:
+        await asyncio.wait({forward_task, watch_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (forward_task, watch_task):
+            task.cancel()
+        await asyncio.gather(forward_task, watch_task, return_exceptions=True)
+        await events.aclose()
+    # 推送过程中的异常继续向上抛出
+    if forward_task.done() and not forward_task.cancelled() and forward_task.exception():
+        raise forward_task.exception()
+
+
 # StreamingResponse 流式返回 Agent 进度与结果
 @router.post(
     "/agent/question/stream",
@@ -39,22 +89,11 @@ async def make_question_by_agent_stream(
 ):
     """即时流式返回 Agent 进度与结果 (SSE)。"""
     question_agent = QuestionAgent()
+    # 配额不足时在开始推送前返回 429
+    await question_agent.preflight()
     # 进行URL解码
     user_input = urllib.parse.unquote(user_input)
-    async def event_gen():
-        async for ev in question_agent.run_stream(user_input):
-            result = "data: " + ev.model_dump_json() + "\n\n"
-            # SSE 帧必须以 \n\n 结束；加 data: 兼容浏览器
-            yield result
-
-    return StreamingResponse(
-        event_gen(),                      # ← 传包装后的 async-generator
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "X-Accel-Buffering": "no",
-        },
-    )
+    return _sse_response(question_agent.run_stream(user_input))
 
 
 @router.websocket("/agent/question/ws")
@@ -76,8 +115,7 @@ async def make_question_by_agent_ws(
                     user_input = obj["user_input"]
                 else:
                     user_input = msg
-        async for ev in question_agent.run_stream(user_input):
-            await websocket.send_text(ev.model_dump_json())
+        await _send_ws(websocket, question_agent.run_stream(user_input))
     except WebSocketDisconnect:
         pass
     finally:
@@ -90,6 +128,7 @@ async def make_question_by_agent(
     user_input: str = Body(...)
 ):
     question_agent = QuestionAgent()
+    await question_agent.preflight()
     return await question_agent.run(user_input)
 
 @router.post("/judge" , response_model=JudgeResult)
@@ -129,21 +168,9 @@ async def record_question_by_stream(
     data: RecordAgentRequestData = Body(...)
 ):
     record_agent = RecordAgent()
-    # 进行URL解码
-    async def event_gen():
-        async for ev in record_agent.run_stream(data.user_input, data.questions):
-            result = "data: " + ev.model_dump_json() + "\n\n"
-            # SSE 帧必须以 \n\n 结束；加 data: 兼容浏览器
-            yield result
-
-    return StreamingResponse(
-        event_gen(),                      # ← 传包装后的 async-generator
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "X-Accel-Buffering": "no",
-        },
-    )
+    # 配额不足时在开始推送前返回 429
+    await record_agent.preflight()
+    return _sse_response(record_agent.run_stream(data.user_input, data.questions))
 
 
 @router.websocket("/agent/record/ws")
@@ -159,10 +186,7 @@ async def record_question_ws(
         msg_dict = json.loads(msg)
         user_input = msg_dict["user_input"]
         questions: List[QuestionUnion] = QuestionListAdapter.validate_python(msg_dict["questions"])
-        async for ev in record_agent.run_stream(user_input, questions):
-            await websocket.send_text(ev.model_dump_json())
-            if ev.type == AgentEventType.RESULT:
-                break
+        await _send_ws(websocket, record_agent.run_stream(user_input, questions))
     except WebSocketDisconnect:
         pass
     finally:
@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict
+from typing import Any, Dict, MutableMapping
 
 import jwt
 from jwt import InvalidTokenError
@@ -72,4 +72,21 @@ def verify_access_token(token: str) -> Dict[str, Any]:
         payload = jwt.decode(token, _PUBLIC_KEY, algorithms=[ALGORITHM])
         return payload
     except InvalidTokenError as exc:
-        raise InvalidTokenException() from exc 
\ No newline at end of file
+        raise InvalidTokenException() from exc 
+
+
+# ASGI scope["state"] 中保存本请求已校验过的 (token, payload); RateLimitMiddleware 先校验, get_uow 直接复用
+_VERIFIED_TOKEN_STATE = "verified_access_token"
+
+
+def verify_access_token_once(token: str, state: MutableMapping[str, Any]) -> Dict[str, Any]:
+    """Like ``verify_access_token``, but reuse the payload already verified for the same token in this request.
+
+    同(おな)じリクエストで検証(けんしょう)済(ず)みなら、署名(しょめい)をもう一度(いちど)検証しません。
+    """
+    cached = state.get(_VERIFIED_TOKEN_STATE)
+    if cached is not None and cached[0] == token:
+        return cached[1]
+    payload = verify_access_token(token)
+    state[_VERIFIED_TOKEN_STATE] = (token, payload)
+    return payload
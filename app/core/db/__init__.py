@@ -1,6 +1,11 @@
 from app.core.db.base import get_db, Base, BaseModel
 from app.core.db.repository import Repository
-from app.core.db.provider import get_async_session_maker, set_async_session_maker, make_async_session_maker, get_engine, check_table_exists
+from app.core.db.provider import get_async_session_maker, set_async_session_maker, make_async_session_maker, get_engine, get_replica_engine, check_table_exists
+from app.core.db.routing import pin_primary, use_primary
+from app.core.db.session import has_pending_writes, release_connection
+from app.core.db.pool import record_pool_gauges, start_liveness_check
+# 注册 SQL span 的 engine 事件
+import app.core.db.tracing  # noqa: F401
 
 __all__ = [
     "get_db",
@@ -11,5 +16,12 @@ __all__ = [
     "set_async_session_maker",
     "make_async_session_maker",
     "get_engine",
+    "get_replica_engine",
+    "pin_primary",
+    "use_primary",
     "check_table_exists",
+    "has_pending_writes",
+    "release_connection",
+    "record_pool_gauges",
+    "start_liveness_check",
 ]
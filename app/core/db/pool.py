@@ -0,0 +1,140 @@
+"""
+Engine pool settings from environment, checkout instrumentation and liveness check.
+
+接続(せつぞく) pool の設定(せってい)を環境変数(かんきょうへんすう)から読(よ)み、checkout の待(ま)ち時間(じかん)を計測(けいそく)します。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+from sqlalchemy import exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.metrics import counter, gauge
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return str(os.getenv(name, default)).strip().lower() in {"1", "true", "yes", "on"}
+
+
+# 每个 uvicorn worker 一个 engine, 总连接数 = workers * (pool_size + max_overflow)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+# 每次 checkout 都会多一次往返; 开启后台存活检查 (DB_LIVENESS_INTERVAL > 0) 时默认关闭
+DB_LIVENESS_INTERVAL = float(os.getenv("DB_LIVENESS_INTERVAL", "0"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", "false" if DB_LIVENESS_INTERVAL > 0 else "true")
+# asyncpg prepared statement 缓存大小 (经过 pgbouncer transaction 模式时设为 0)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+# pool label 取自 pool_logging_name (primary / replica)
+POOL_CHECKOUTS = counter("vounica_db_pool_checkouts_total", "Connections checked out from the pool", labelnames=("pool",))
+POOL_WAIT_SECONDS = counter("vounica_db_pool_wait_seconds_total", "Seconds spent waiting for a pooled connection", labelnames=("pool",))
+POOL_TIMEOUTS = counter("vounica_db_pool_timeouts_total", "Checkouts that failed with a pool timeout", labelnames=("pool",))
+# 以下 gauge 在 /metrics 被抓取时由 record_pool_gauges 更新
+POOL_CONNECTIONS = gauge(
+    "vounica_db_pool_connections",
+    "Pooled connections by state (checked_out / checked_in / overflow)",
+    labelnames=("pool", "state"),
+)
+POOL_SIZE = gauge("vounica_db_pool_size", "Configured pool size and max overflow", labelnames=("pool", "limit"))
+POOL_WAIT_MAX = gauge("vounica_db_pool_wait_seconds_max", "Longest checkout wait since the process started", labelnames=("pool",))
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long each checkout waited."""
+
+    max_wait: float = 0.0
+
+    @property
+    def role(self) -> str:
+        return self.logging_name or "primary"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc(pool=self.role)
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            POOL_CHECKOUTS.inc(pool=self.role)
+            POOL_WAIT_SECONDS.inc(waited, pool=self.role)
+            if waited > self.max_wait:
+                self.max_wait = waited
+
+
+def engine_kwargs(database_url: str, role: str = "primary") -> Dict[str, Any]:
+    """Return create_async_engine keyword arguments for the given URL."""
+    url = make_url(database_url)
+    # sqlite (测试) 使用 SQLAlchemy 默认的 pool
+    if url.get_backend_name() == "sqlite":
+        return dict(echo=False)
+    kwargs: Dict[str, Any] = dict(
+        echo=False,
+        poolclass=InstrumentedQueuePool,
+        pool_logging_name=role,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    if url.get_driver_name() == "asyncpg":
+        kwargs["connect_args"] = {
+            # SQLAlchemy 侧的 prepared statement 缓存 与 asyncpg 自身的缓存
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        }
+    return kwargs
+
+
+def record_pool_gauges(engine: AsyncEngine) -> None:
+    """Copy the current pool state (checked out / overflow / longest wait) into the ``vounica_db_pool_*`` gauges."""
+    pool = engine.pool
+    # sqlite (测试) 的默认 pool 没有这些统计
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return
+    role = getattr(pool, "role", "primary")
+    POOL_CONNECTIONS.set(pool.checkedout(), pool=role, state="checked_out")
+    POOL_CONNECTIONS.set(pool.checkedin(), pool=role, state="checked_in")
+    POOL_CONNECTIONS.set(max(pool.overflow(), 0), pool=role, state="overflow")
+    POOL_SIZE.set(pool.size(), pool=role, limit="size")
+    POOL_SIZE.set(pool._max_overflow, pool=role, limit="max_overflow")
+    POOL_WAIT_MAX.set(getattr(pool, "max_wait", 0.0), pool=role)
+
+
+async def run_liveness_check(engine: AsyncEngine, interval: float = DB_LIVENESS_INTERVAL) -> None:
+    """
+    Periodically ping the database instead of pre-pinging every checkout.
+
+    连接断开 (例如数据库重启) 时 SQLAlchemy 会让整个 pool 失效, 之后的 checkout 会重新建立连接。
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        except Exception as e:
+            logger.warning("Database liveness check failed: %s", e)
+
+
+def start_liveness_check(engine: AsyncEngine) -> asyncio.Task | None:
+    """Start the background liveness check when DB_LIVENESS_INTERVAL > 0."""
+    if DB_LIVENESS_INTERVAL <= 0:
+        return None
+    return asyncio.create_task(run_liveness_check(engine))
@@ -0,0 +1,59 @@
+"""
+Route read-only queries to a read replica.
+
+読(よ)み取(と)り専用(せんよう)の query を read replica へ振(ふ)り分(わ)けます。
+
+- SELECT (FOR UPDATE 以外) -> replica
+- INSERT / UPDATE / DELETE / flush / text SQL -> primary
+- 同じ session (UoW) で一度でも書き込んだら、以降の読み取りも primary (read-your-writes)
+- ``use_primary(session)`` / ``pin_primary(session)`` で明示的に primary を使えます
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .session import WROTE_FLAG
+
+# session.info 中保存 replica engine (sessionmaker 的 info 会复制到每个 session)
+REPLICA_BIND = "vounica_replica_bind"
+# 置为 True 时所有查询都走 primary
+PIN_PRIMARY = "vounica_pin_primary"
+
+
+class RoutingSession(Session):
+    """Session that sends plain SELECTs to the replica engine stored in ``info``."""
+
+    def get_bind(self, mapper: Optional[Any] = None, *, clause: Optional[Any] = None, **kw: Any):
+        replica = self.info.get(REPLICA_BIND)
+        if (
+            replica is not None
+            and isinstance(clause, Select)
+            and clause._for_update_arg is None
+            and not self._flushing
+            and not self.info.get(PIN_PRIMARY)
+            and not self.info.get(WROTE_FLAG)
+        ):
+            return replica
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+def pin_primary(session: AsyncSession) -> None:
+    """Send every following query of this session to the primary."""
+    session.info[PIN_PRIMARY] = True
+
+
+@contextmanager
+def use_primary(session: AsyncSession) -> Iterator[AsyncSession]:
+    """Temporarily send queries of this session to the primary."""
+    previous = session.info.get(PIN_PRIMARY, False)
+    session.info[PIN_PRIMARY] = True
+    try:
+        yield session
+    finally:
+        session.info[PIN_PRIMARY] = previous
@@ -0,0 +1,67 @@
+"""
+Track writes per session so read-only transactions can return their connection early.
+
+Session ごとに書(か)き込(こ)みの有無(うむ)を記録(きろく)し、読(よ)み取(と)り専用(せんよう)の transaction は
+早(はや)めに connection を pool へ返(かえ)せるようにします。
+
+AsyncSession 在第一次执行 SQL 时从 pool 取得连接, 直到 commit / rollback 才归还。
+Agent 在等待 LLM 时, 如果当前事务只做过查询, 就可以先结束事务, 下一次查询时再自动获取连接。
+一旦有写入 (flush / insert / update / delete), 事务必须保留到 UoW commit。
+"""
+
+from __future__ import annotations
+
+from sqlalchemy import event
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ORMExecuteState, Session
+
+# session.info 中记录 "当前事务有写入" 的 key
+WRITE_FLAG = "vounica_has_writes"
+# session 生命周期内 (一个 UoW) 曾经写入过, commit 后也不清除; 用于 read-your-writes (见 routing.py)
+WROTE_FLAG = "vounica_wrote"
+
+
+# do_orm_execute 先于 after_begin 触发, 所以在事务结束时 (commit / rollback) 清除标记
+@event.listens_for(Session, "after_transaction_end")
+def _reset_write_flag(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info[WRITE_FLAG] = False
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush(session: Session, flush_context) -> None:
+    session.info[WRITE_FLAG] = True
+    session.info[WROTE_FLAG] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_execute(orm_execute_state: ORMExecuteState) -> None:
+    # select 以外一律视为写入; text SQL 只有以 SELECT 开头时视为只读
+    if orm_execute_state.is_select:
+        return
+    statement = orm_execute_state.statement
+    if isinstance(statement, TextClause) and statement.text.lstrip().lower().startswith("select"):
+        return
+    orm_execute_state.session.info[WRITE_FLAG] = True
+    orm_execute_state.session.info[WROTE_FLAG] = True
+
+
+def has_pending_writes(session: AsyncSession) -> bool:
+    """Return True if the current transaction wrote (or is about to write) anything."""
+    return bool(session.info.get(WRITE_FLAG) or session.new or session.dirty or session.deleted)
+
+
+async def release_connection(session: AsyncSession) -> bool:
+    """
+    End a read-only transaction so its connection goes back to the pool.
+
+    Returns ``False`` (and keeps the transaction) when there are writes waiting for commit.
+    """
+    if not session.in_transaction():
+        return True
+    if has_pending_writes(session):
+        return False
+    # expire_on_commit=False, 已加载的 ORM 对象在 commit 后仍然可用
+    await session.commit()
+    return True
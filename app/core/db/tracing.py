@@ -0,0 +1,52 @@
+"""
+One span per SQL statement (``db.execute``), for every engine.
+
+SQL を実行(じっこう)するたびに span を作(つく)ります。tracing が無効(むこう)なら何(なに)もしません。
+"""
+
+from __future__ import annotations
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.tracing import current_span, get_tracer
+
+# ExecutionContext 上保存 span 的属性名
+_SPAN_ATTR = "_vounica_span"
+
+
+def _operation(statement: str) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+
+
+# greenlet_spawn 会沿用调用方的 context, 这里能取到请求中的当前 span
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_sql_span(conn, cursor, statement, parameters, context, executemany) -> None:
+    tracer = get_tracer()
+    if not tracer.enabled:
+        return
+    span = tracer.start_span(
+        "db.execute",
+        current_span(),
+        operation=_operation(statement),
+        statement=statement,
+        pool=conn.engine.pool.logging_name or "primary",
+        executemany=executemany,
+    )
+    setattr(context, _SPAN_ATTR, span)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_sql_span(conn, cursor, statement, parameters, context, executemany) -> None:
+    span = getattr(context, _SPAN_ATTR, None)
+    if span is not None:
+        span.set_attribute("rowcount", getattr(cursor, "rowcount", None))
+        span.end()
+
+
+@event.listens_for(Engine, "handle_error")
+def _fail_sql_span(exception_context) -> None:
+    span = getattr(exception_context.execution_context, _SPAN_ATTR, None)
+    if span is not None:
+        span.record_exception(exception_context.original_exception)
+        span.end()
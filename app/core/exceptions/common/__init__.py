@@ -5,10 +5,12 @@ from .not_found import NotFoundException
 from .bad_request import BadRequestException
 from .validation_error import ValidationException
 from .token_quota_exceeded import TokenQuotaExceededException
+from .too_many_requests import TooManyRequestsException
 
 __all__ = [
     "NotFoundException",
     "BadRequestException",
     "ValidationException",
     "TokenQuotaExceededException",
+    "TooManyRequestsException",
 ] 
\ No newline at end of file
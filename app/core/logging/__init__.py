@@ -0,0 +1,26 @@
+"""Structured logging core package (context fields + non-blocking queue handler)."""
+
+from app.core.logging.context import bind_log_context, log_context, new_request_id, reset_log_context
+from app.core.logging.handlers import (
+    ContextFilter,
+    JsonFormatter,
+    NonBlockingQueueHandler,
+    SamplingFilter,
+    TextFormatter,
+)
+from app.core.logging.setup import configure_logging, parse_sample_rates, shutdown_logging
+
+__all__ = [
+    "bind_log_context",
+    "log_context",
+    "new_request_id",
+    "reset_log_context",
+    "ContextFilter",
+    "JsonFormatter",
+    "NonBlockingQueueHandler",
+    "SamplingFilter",
+    "TextFormatter",
+    "configure_logging",
+    "parse_sample_rates",
+    "shutdown_logging",
+]
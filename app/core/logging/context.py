@@ -0,0 +1,39 @@
+"""
+Per-request log fields (request id, user id) carried in a ContextVar.
+
+リクエストごとの request_id / user_id を log に自動(じどう)で付(つ)けます。
+"""
+
+from __future__ import annotations
+
+import contextvars
+import uuid
+from typing import Any, Dict, Optional
+
+_log_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("vounica_log_context", default={})
+
+# 客户端传入的 X-Request-ID 只保留这么长, 避免异常值进入日志
+_MAX_REQUEST_ID_LENGTH = 64
+
+
+def new_request_id(header: Optional[str] = None) -> str:
+    """Return the client supplied id (``X-Request-ID``) or a new random one."""
+    if header:
+        header = header.strip()[:_MAX_REQUEST_ID_LENGTH]
+        if header:
+            return header
+    return uuid.uuid4().hex
+
+
+def bind_log_context(**fields: Any) -> contextvars.Token:
+    """Add fields to every log record of the current context; pass the token to ``reset_log_context``."""
+    # asyncio task 复制 context, SSE 中的 agent task 在 get_uow 退出后仍带着这些字段
+    return _log_context.set({**_log_context.get(), **{key: value for key, value in fields.items() if value is not None}})
+
+
+def reset_log_context(token: contextvars.Token) -> None:
+    _log_context.reset(token)
+
+
+def log_context() -> Dict[str, Any]:
+    return _log_context.get()
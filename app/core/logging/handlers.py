@@ -0,0 +1,125 @@
+"""
+Filters, formatter and the non-blocking queue handler.
+
+log を queue に入(い)れて別(べつ) thread で出力(しゅつりょく)します。event loop は stdout を待(ま)ちません。
+
+- filter 与 ``prepare`` 在调用方 (event loop) 执行, 只做廉价的工作; 格式化与写入在 QueueListener thread
+- 队列满时丢弃 record 并计数, 不阻塞请求
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler
+from typing import Any, Dict, Mapping
+
+from app.core.metrics import counter
+from app.core.tracing import current_span
+
+from .context import log_context
+
+LOGS_DROPPED = counter(
+    "vounica_log_dropped_total",
+    "Log records not written (queue_full / sampled)",
+    labelnames=("reason",),
+)
+
+# LogRecord 自带的属性; 其余的 (logging 的 extra=...) 作为结构化字段输出
+_RECORD_ATTRIBUTES = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "taskName"}
+
+
+class ContextFilter(logging.Filter):
+    """Copy request id / user id and the current trace id onto the record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in log_context().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        current = current_span()
+        if current is not None and current.recording:
+            record.trace_id = current.trace_id
+            record.span_id = current.span_id
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of DEBUG / INFO records of high-volume loggers (WARNING and above are always kept)."""
+
+    def __init__(self, rates: Mapping[str, float]) -> None:
+        super().__init__()
+        # 最长前缀优先: "app.agent.tool" 比 "app.agent" 更具体
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def rate_of(self, name: str) -> float:
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        if random.random() < self.rate_of(record.name):
+            return True
+        LOGS_DROPPED.inc(reason="sampled")
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """``QueueHandler`` that drops (and counts) records when the queue is full instead of raising."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 默认实现会在调用方格式化整条 record; 这里只固定 message (args 可能之后被修改) 与 traceback
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOGS_DROPPED.inc(reason="queue_full")
+
+
+def _fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {key: value for key, value in record.__dict__.items() if key not in _RECORD_ATTRIBUTES}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, context and ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human readable line for local development: ``time LEVEL logger message key=value ...``."""
+
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            extra = " ".join(f"{key}={value}" for key, value in fields.items())
+            # traceback 在最后, 字段插在第一行后面
+            head, sep, tail = line.partition("\n")
+            line = f"{head} {extra}{sep}{tail}"
+        return line
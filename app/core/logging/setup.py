@@ -0,0 +1,87 @@
+"""
+Logging configuration from environment variables.
+
+環境(かんきょう)変数(へんすう)から log の level・形式(けいしき)・sampling を設定(せってい)します。
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueListener
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+from .handlers import ContextFilter, JsonFormatter, NonBlockingQueueHandler, SamplingFilter, TextFormatter
+
+load_dotenv()
+
+# app.* logger 的级别; 第三方库 (httpx 每个请求一行 INFO 等) 使用 LOG_ROOT_LEVEL
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_ROOT_LEVEL = os.getenv("LOG_ROOT_LEVEL", "WARNING").upper()
+# json / text
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# logger 前缀=保留比例, 只作用于 DEBUG / INFO; 例如 "app.agent.tool=0.1,app.infra.vector=0.5"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "app.agent.tool=0.1")
+
+_listener: Optional[QueueListener] = None
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """Parse ``name=rate,name=rate`` into a dict (invalid entries are ignored)."""
+    rates: Dict[str, float] = {}
+    for item in value.split(","):
+        name, sep, rate = item.partition("=")
+        if not sep or not name.strip():
+            continue
+        try:
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+
+def configure_logging(
+    level: str = LOG_LEVEL,
+    fmt: str = LOG_FORMAT,
+    sample_rates: Optional[Dict[str, float]] = None,
+    queue_size: int = LOG_QUEUE_SIZE,
+) -> None:
+    """
+    Route all records through a queue to a background writer thread.
+
+    何度(なんど)呼(よ)んでも設定(せってい)は一(ひと)つだけです。
+    """
+    global _listener
+    if _listener is not None:
+        return
+    records: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    handler = NonBlockingQueueHandler(records)
+    # handler 的 filter 在调用方执行: context 必须在这里读取, 采样也在入队前完成
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES) if sample_rates is None else sample_rates))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_ROOT_LEVEL)
+    logging.getLogger("app").setLevel(level.upper())
+
+    _listener = QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
@@ -0,0 +1,33 @@
+"""Metrics core package."""
+
+from app.core.metrics.registry import (
+    Metric,
+    Counter,
+    Gauge,
+    Histogram,
+    MetricRegistry,
+    REGISTRY,
+    DEFAULT_BUCKETS,
+    counter,
+    gauge,
+    histogram,
+)
+from app.core.metrics.exposition import CONTENT_TYPE, render
+from app.core.metrics.middleware import MetricsMiddleware, current_endpoint
+
+__all__ = [
+    "Metric",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricRegistry",
+    "REGISTRY",
+    "DEFAULT_BUCKETS",
+    "counter",
+    "gauge",
+    "histogram",
+    "CONTENT_TYPE",
+    "render",
+    "MetricsMiddleware",
+    "current_endpoint",
+]
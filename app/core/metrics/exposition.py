@@ -0,0 +1,57 @@
+"""
+Prometheus text exposition format (version 0.0.4) of a metric registry.
+
+registry の値(あたい)を Prometheus が読(よ)めるテキストに変換(へんかん)します。
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Sequence
+
+from app.core.metrics.registry import REGISTRY, Histogram, MetricRegistry
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Dict[str, str] | None = None) -> str:
+    pairs = [(name, value) for name, value in zip(names, values) if value != ""]
+    pairs.extend((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(registry: MetricRegistry = REGISTRY) -> str:
+    """Return every metric of ``registry`` in the Prometheus text format."""
+    lines: List[str] = []
+    for metric in sorted(registry.metrics(), key=lambda m: m.name):
+        lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        samples = metric.samples()  # type: ignore[attr-defined]
+        if isinstance(metric, Histogram):
+            bounds = [_number(b) for b in metric.buckets] + ["+Inf"]
+            for key, sample in sorted(samples.items()):
+                # Prometheus 的 bucket 是累计值
+                cumulative = 0
+                for bound, count in zip(bounds, sample.buckets):
+                    cumulative += count
+                    lines.append(f"{metric.name}_bucket{_labels(metric.labelnames, key, {'le': bound})} {cumulative}")
+                lines.append(f"{metric.name}_sum{_labels(metric.labelnames, key)} {_number(sample.sum)}")
+                lines.append(f"{metric.name}_count{_labels(metric.labelnames, key)} {sample.count}")
+        else:
+            for key, value in sorted(samples.items()):
+                lines.append(f"{metric.name}{_labels(metric.labelnames, key)} {_number(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,79 @@
+"""
+ASGI middleware counting requests per route, and the ``endpoint`` label of the current request.
+
+リクエストの数(かず)と時間(じかん)を route ごとに記録(きろく)します。
+LLM / embedding の metric もこの route を endpoint label として使(つか)います。
+"""
+
+from __future__ import annotations
+
+import contextvars
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.metrics.registry import counter, histogram
+
+Scope = Dict[str, Any]
+Message = Dict[str, Any]
+ASGIApp = Callable[[Scope, Callable[[], Awaitable[Message]], Callable[[Message], Awaitable[None]]], Awaitable[None]]
+
+HTTP_REQUESTS = counter(
+    "vounica_http_requests_total",
+    "HTTP / WebSocket requests by route template and status code",
+    labelnames=("method", "endpoint", "status"),
+)
+HTTP_REQUEST_SECONDS = histogram(
+    "vounica_http_request_duration_seconds",
+    "Request duration including the whole SSE stream",
+    labelnames=("method", "endpoint"),
+)
+
+# 请求外 (后台 worker、脚本) 记录的 metric 使用这个 endpoint
+BACKGROUND_ENDPOINT = "background"
+
+_current_scope: contextvars.ContextVar[Optional[Scope]] = contextvars.ContextVar("vounica_metrics_scope", default=None)
+
+
+def current_endpoint() -> str:
+    """Return the route template of the current request (``/v1/vocab/{id}``, not the raw path)."""
+    scope = _current_scope.get()
+    if scope is None:
+        return BACKGROUND_ENDPOINT
+    return _route_path(scope)
+
+
+def _route_path(scope: Scope) -> str:
+    # Router 匹配后把 route 写入同一个 scope dict; 匹配之前 (或 404) 用固定值, 避免原始路径造成高基数
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Record ``vounica_http_requests_total`` / duration and expose the route to ``current_endpoint()``."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive, send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        token = _current_scope.set(scope)
+        status = {"code": "500" if scope["type"] == "http" else "101"}
+        start = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_scope.reset(token)
+            method = scope.get("method", "WS")
+            endpoint = _route_path(scope)
+            HTTP_REQUESTS.inc(method=method, endpoint=endpoint, status=status["code"])
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=method, endpoint=endpoint)
+
@@ -0,0 +1,190 @@
+"""
+Process-local metric registry (counters, gauges and histograms).
+
+プロセス内(ない)で共有(きょうゆう)する metric を保持(ほじ)します。
+"""
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# label 值按 labelnames 的顺序组成 tuple, 作为 key
+LabelValues = Tuple[str, ...]
+
+
+class Metric:
+    """Base class holding name, help text and label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+        # 多线程 (例如 call_soon_threadsafe 之外的线程) 下也保证计数一致
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        # 未传的 label 使用空字符串, 避免调用方每次都要写全
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+
+class Counter(Metric):
+    """Monotonically increasing counter."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counter can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(Metric):
+    """Value that can go up and down (e.g. queue length, lag)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+# 默认 bucket 上界 (秒), 覆盖 DB 查询 (毫秒级) 到 agent 运行 (数十秒)
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class HistogramSample:
+    """Per-label-set state of a histogram: count per bucket (not cumulative), sum and count."""
+
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self, size: int) -> None:
+        # 最后一个位置是 +Inf
+        self.buckets: List[int] = [0] * (size + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def copy(self) -> "HistogramSample":
+        sample = HistogramSample(len(self.buckets) - 1)
+        sample.buckets = list(self.buckets)
+        sample.sum = self.sum
+        sample.count = self.count
+        return sample
+
+
+class Histogram(Metric):
+    """Distribution of observed values (latency, tokens per call) in fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, HistogramSample] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        # value <= 上界 的第一个 bucket
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._values.get(key)
+            if sample is None:
+                sample = self._values[key] = HistogramSample(len(self.buckets))
+            sample.buckets[index] += 1
+            sample.sum += value
+            sample.count += 1
+
+    def count(self, **labels: str) -> int:
+        sample = self._values.get(self._key(labels))
+        return sample.count if sample else 0
+
+    def sum(self, **labels: str) -> float:
+        sample = self._values.get(self._key(labels))
+        return sample.sum if sample else 0.0
+
+    def samples(self) -> Dict[LabelValues, HistogramSample]:
+        with self._lock:
+            return {key: sample.copy() for key, sample in self._values.items()}
+
+
+class MetricRegistry:
+    """Name -> metric mapping; registering the same name twice returns the existing metric (same kind and labels only)."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # 同名但类型 / label 不同时直接报错, 避免之后在 .inc() / .observe() 时才出现难以理解的错误
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(
+                        f"metric {metric.name!r} already registered as {type(existing).__name__}"
+                        f"{existing.labelnames}, not {type(metric).__name__}{metric.labelnames}"
+                    )
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def get(self, name: str) -> Metric | None:
+        return self._metrics.get(name)
+
+    def metrics(self) -> Iterable[Metric]:
+        return list(self._metrics.values())
+
+
+# 全局默认 registry
+REGISTRY = MetricRegistry()
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    """Create (or fetch) a counter in the default registry."""
+    return REGISTRY.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    """Create (or fetch) a gauge in the default registry."""
+    return REGISTRY.register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+
+def histogram(
+    name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+) -> Histogram:
+    """Create (or fetch) a histogram in the default registry."""
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
@@ -0,0 +1,41 @@
+"""Tracing core package (spans + pluggable exporters)."""
+
+from app.core.tracing.exporters import (
+    SpanExporter,
+    ConsoleSpanExporter,
+    JsonFileSpanExporter,
+    OTLPSpanExporter,
+    make_span_exporter,
+)
+from app.core.tracing.middleware import TracingMiddleware
+from app.core.tracing.tracer import (
+    NOOP_SPAN,
+    Span,
+    Tracer,
+    current_span,
+    get_tracer,
+    make_tracer,
+    set_current_span,
+    set_tracer,
+    span,
+    start_span,
+)
+
+__all__ = [
+    "SpanExporter",
+    "ConsoleSpanExporter",
+    "JsonFileSpanExporter",
+    "OTLPSpanExporter",
+    "make_span_exporter",
+    "TracingMiddleware",
+    "NOOP_SPAN",
+    "Span",
+    "Tracer",
+    "current_span",
+    "get_tracer",
+    "make_tracer",
+    "set_current_span",
+    "set_tracer",
+    "span",
+    "start_span",
+]
@@ -0,0 +1,156 @@
+"""
+Span exporters: console, JSON lines file, OTLP/HTTP (JSON encoding).
+
+span の送(おく)り先(さき)です。export() は tracer の背景(はいけい) thread から呼(よ)ばれます。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Protocol, Sequence
+
+import httpx
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    from .tracer import Span
+
+load_dotenv()
+
+TRACING_JSON_PATH = os.getenv("TRACING_JSON_PATH", "traces.jsonl")
+# OTLP/HTTP collector (例如 OpenTelemetry Collector, Jaeger, Tempo) 的 traces 端点
+TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+# 额外的请求头, 例如认证: "Authorization=Bearer xxx,X-Scope-OrgID=vounica"
+TRACING_OTLP_HEADERS = os.getenv("TRACING_OTLP_HEADERS", "")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "vounica")
+
+
+class SpanExporter(Protocol):
+    """Send a batch of finished spans somewhere; must not raise for transient failures it can retry later."""
+
+    def export(self, spans: Sequence["Span"]) -> None:
+        ...
+
+    def shutdown(self) -> None:
+        ...
+
+
+class ConsoleSpanExporter:
+    """One human-readable line per span on stderr (development)."""
+
+    def __init__(self, stream: Any = None) -> None:
+        self.stream = stream or sys.stderr
+
+    def export(self, spans: Sequence["Span"]) -> None:
+        lines = []
+        for span in spans:
+            attributes = " ".join(f"{key}={value}" for key, value in span.attributes.items())
+            error = f" ERROR {span.error}" if span.status == "error" else ""
+            lines.append(
+                f"[trace {span.trace_id[:8]}] {span.name} {span.duration_ms:.1f}ms "
+                f"span={span.span_id[:8]} parent={(span.parent_id or '-')[:8]} {attributes}{error}\n"
+            )
+        self.stream.write("".join(lines))
+        self.stream.flush()
+
+    def shutdown(self) -> None:
+        pass
+
+
+class JsonFileSpanExporter:
+    """Append spans as JSON lines to a local file (``jq`` / pandas で分析)."""
+
+    def __init__(self, path: str = TRACING_JSON_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence["Span"]) -> None:
+        payload = "".join(json.dumps(span.to_dict(), ensure_ascii=False) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(payload)
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+class OTLPSpanExporter:
+    """POST spans to an OTLP/HTTP collector using the JSON encoding (no opentelemetry SDK needed)."""
+
+    def __init__(
+        self,
+        endpoint: str = TRACING_OTLP_ENDPOINT,
+        headers: Optional[Dict[str, str]] = None,
+        service_name: str = TRACING_SERVICE_NAME,
+        timeout: float = 5.0,
+    ) -> None:
+        if headers is None:
+            headers = dict(
+                item.split("=", 1) for item in TRACING_OTLP_HEADERS.split(",") if "=" in item
+            )
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self._client = httpx.Client(timeout=timeout, headers=headers)
+
+    def encode(self, spans: Sequence["Span"]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{
+                    "scope": {"name": "vounica"},
+                    "spans": [
+                        {
+                            "traceId": span.trace_id,
+                            "spanId": span.span_id,
+                            "parentSpanId": span.parent_id or "",
+                            "name": span.name,
+                            # SPAN_KIND_INTERNAL
+                            "kind": 1,
+                            "startTimeUnixNano": str(span.start_ns),
+                            "endTimeUnixNano": str(span.end_ns),
+                            "attributes": _otlp_attributes(span.attributes),
+                            # STATUS_CODE_OK = 1, STATUS_CODE_ERROR = 2
+                            "status": {"code": 2, "message": span.error} if span.status == "error" else {"code": 1},
+                        }
+                        for span in spans
+                    ],
+                }],
+            }],
+        }
+
+    def export(self, spans: Sequence["Span"]) -> None:
+        response = self._client.post(self.endpoint, json=self.encode(spans))
+        response.raise_for_status()
+
+    def shutdown(self) -> None:
+        self._client.close()
+
+
+def make_span_exporter(name: str) -> Optional[SpanExporter]:
+    """Create the exporter named ``name``; ``none`` disables tracing."""
+    name = name.lower()
+    if name in ("", "none"):
+        return None
+    if name == "console":
+        return ConsoleSpanExporter()
+    if name == "json":
+        return JsonFileSpanExporter()
+    if name == "otlp":
+        return OTLPSpanExporter()
+    raise ValueError(f"Unknown tracing exporter: {name!r} (expected 'none', 'console', 'json' or 'otlp')")
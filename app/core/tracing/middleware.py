@@ -0,0 +1,39 @@
+"""
+ASGI middleware opening the root span of every HTTP / WebSocket request.
+
+リクエストごとに root span を作(つく)ります。StreamingResponse（SSE）の送信(そうしん)が終(お)わるまで含(ふく)みます。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, Dict
+
+from .tracer import get_tracer
+
+Scope = Dict[str, Any]
+Message = Dict[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+
+class TracingMiddleware:
+    """Wrap each request in an ``http.request`` span (method, path, status code)."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        tracer = get_tracer()
+        if scope["type"] not in ("http", "websocket") or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        # BaseHTTPMiddleware 会在另一个 task 中运行 endpoint; 纯 ASGI 实现让 span 覆盖整个 stream
+        with tracer.span(f"{scope['type']}.request", method=scope.get("method", "WS"), path=scope["path"]) as span:
+            async def send_with_status(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    span.set_attribute("status_code", message["status"])
+                await send(message)
+
+            await self.app(scope, receive, send_with_status)
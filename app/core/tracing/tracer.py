@@ -0,0 +1,301 @@
+"""
+Lightweight spans (OpenTelemetry-style) with a background batch exporter.
+
+リクエストの中(なか)で時間(じかん)がかかる処理(しょり)を span として記録(きろく)し、
+別(べつ) thread でまとめて exporter に送(おく)ります。
+
+- 当前 span 保存在 ContextVar 中, 子 span 自动以它为 parent (asyncio task 会复制 context)
+- 采样在 root span 决定; 未采样的 trace 中所有 span 都是空操作
+- exporter 为 None (TRACING_EXPORTER=none) 时 ``span()`` 几乎没有开销
+"""
+
+from __future__ import annotations
+
+import contextvars
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+from app.core.metrics import counter
+
+from .exporters import SpanExporter, make_span_exporter
+
+load_dotenv()
+
+# none / console / json / otlp
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+# root span 的采样率 (0.0 - 1.0)
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1.0"))
+# 后台 thread 每隔多久 / 攒够多少个 span 导出一次; 队列满时丢弃新的 span
+TRACING_EXPORT_INTERVAL_MS = float(os.getenv("TRACING_EXPORT_INTERVAL_MS", "1000"))
+TRACING_BATCH_SIZE = int(os.getenv("TRACING_BATCH_SIZE", "512"))
+TRACING_MAX_QUEUE = int(os.getenv("TRACING_MAX_QUEUE", "10000"))
+
+SPANS_DROPPED = counter("vounica_tracing_dropped_spans_total", "Finished spans dropped because the export queue was full")
+SPANS_EXPORT_ERRORS = counter("vounica_tracing_export_errors_total", "Span batches the exporter failed to send")
+
+# 属性值只保留可以序列化的基本类型, 字符串截断
+_MAX_ATTRIBUTE_LENGTH = 256
+
+
+def _attribute(value: Any) -> Any:
+    if isinstance(value, (bool, int, float)):
+        return value
+    text = str(value)
+    return text if len(text) <= _MAX_ATTRIBUTE_LENGTH else text[:_MAX_ATTRIBUTE_LENGTH] + "..."
+
+
+class Span:
+    """One timed operation; ``end()`` hands it to the tracer for export."""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status", "error")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = {key: _attribute(value) for key, value in attributes.items() if value is not None}
+        self.status = "ok"
+        self.error = ""
+
+    @property
+    def recording(self) -> bool:
+        return True
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = _attribute(value)
+
+    def set_attributes(self, **attributes: Any) -> None:
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{type(exc).__name__}: {exc}"[:_MAX_ATTRIBUTE_LENGTH]
+
+    def end(self) -> None:
+        # 重复调用只导出一次
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        self.tracer._on_end(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Span of a disabled tracer or an unsampled trace; every method does nothing."""
+
+    __slots__ = ()
+
+    recording = False
+    trace_id = ""
+    span_id = ""
+    duration_ms = 0.0
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes: Any) -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: contextvars.ContextVar[Span | _NoopSpan | None] = contextvars.ContextVar("vounica_current_span", default=None)
+
+
+def current_span() -> Span | _NoopSpan | None:
+    """Return the active span of this context (``None`` outside any trace)."""
+    return _current_span.get()
+
+
+def set_current_span(span: Span | _NoopSpan | None) -> contextvars.Token:
+    """Make ``span`` the parent of spans started in this context (e.g. inside ``Context.run``)."""
+    return _current_span.set(span)
+
+
+class Tracer:
+    """Create spans and export finished ones in batches from a daemon thread."""
+
+    def __init__(
+        self,
+        exporter: Optional[SpanExporter] = None,
+        *,
+        sample_rate: float = TRACING_SAMPLE_RATE,
+        export_interval: float = TRACING_EXPORT_INTERVAL_MS / 1000,
+        batch_size: int = TRACING_BATCH_SIZE,
+        max_queue: int = TRACING_MAX_QUEUE,
+    ) -> None:
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.export_interval = export_interval
+        self.batch_size = batch_size
+        self._queue: queue.Queue[Span] = queue.Queue(maxsize=max_queue)
+        self._flush_requested = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_span(self, name: str, parent: Span | _NoopSpan | None = None, **attributes: Any) -> Span | _NoopSpan:
+        """Start a span under ``parent`` (a new trace when ``None``) without making it current."""
+        if self.exporter is None or parent is NOOP_SPAN:
+            return NOOP_SPAN
+        if parent is None:
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                return NOOP_SPAN
+            return Span(self, name, f"{random.getrandbits(128):032x}", None, attributes)
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span | _NoopSpan]:
+        """Run the block inside a child span of the current one; exceptions mark the span as failed."""
+        span = self.start_span(name, current_span(), **attributes)
+        if span is NOOP_SPAN and current_span() is not None:
+            yield span
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Export everything queued so far (blocks until done or ``timeout``)."""
+        if self._thread is None:
+            return
+        self._flush_requested.set()
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def shutdown(self) -> None:
+        """Flush the queue and stop the export thread (called at application shutdown)."""
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._flush_requested.set()
+        self._thread.join(timeout=5.0)
+        self._thread = None
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+    # Internal helpers
+
+    def _on_end(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            SPANS_DROPPED.inc()
+            return
+        if self._thread is None:
+            self._start_thread()
+        if self._queue.qsize() >= self.batch_size:
+            self._flush_requested.set()
+
+    def _start_thread(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name="vounica-span-exporter", daemon=True)
+                self._thread.start()
+
+    def _drain(self) -> List[Span]:
+        batch: List[Span] = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            self._flush_requested.wait(self.export_interval)
+            self._flush_requested.clear()
+            while batch := self._drain():
+                try:
+                    self.exporter.export(batch)  # type: ignore[union-attr]
+                except Exception:
+                    # 导出失败不影响请求, 只计数
+                    SPANS_EXPORT_ERRORS.inc()
+            if self._stopped.is_set():
+                return
+
+
+_tracer: Tracer | None = None
+
+
+def set_tracer(tracer: Tracer) -> None:
+    """Inject the tracer used by ``span()`` and the instrumentation hooks."""
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer() -> Tracer:
+    """Return the current tracer, creating it from TRACING_EXPORTER on first use."""
+    if _tracer is None:
+        return make_tracer()
+    return _tracer
+
+
+def make_tracer(exporter: Optional[str] = None, **kwargs: Any) -> Tracer:
+    """
+    Create a tracer exporting to ``exporter`` (default: TRACING_EXPORTER) and inject it.
+
+    環境(かんきょう)変数(へんすう) TRACING_EXPORTER から tracer を作成(さくせい)します。
+    """
+    tracer = Tracer(make_span_exporter(exporter or TRACING_EXPORTER), **kwargs)
+    set_tracer(tracer)
+    return tracer
+
+
+def span(name: str, **attributes: Any):
+    """Context manager for a child span of the current span on the global tracer."""
+    return get_tracer().span(name, **attributes)
+
+
+def start_span(name: str, **attributes: Any) -> Span | _NoopSpan:
+    """Start a child span of the current span without making it current; call ``end()`` yourself."""
+    return get_tracer().start_span(name, current_span(), **attributes)
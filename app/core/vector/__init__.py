@@ -1,5 +1,13 @@
 from .provider import get_qdrant_client, set_qdrant_client, make_qdrant_client
 from .session import get_vector_session, VectorSession
+from .embeddings import (
+    EmbeddingProvider,
+    HashEmbeddingProvider,
+    OpenAIEmbeddingProvider,
+    get_embedding_provider,
+    set_embedding_provider,
+    make_embedding_provider,
+)
 
 __all__ = [
     "get_qdrant_client",
@@ -7,4 +15,10 @@ __all__ = [
     "make_qdrant_client",
     "get_vector_session",
     "VectorSession",
+    "EmbeddingProvider",
+    "HashEmbeddingProvider",
+    "OpenAIEmbeddingProvider",
+    "get_embedding_provider",
+    "set_embedding_provider",
+    "make_embedding_provider",
 ]
\ No newline at end of file
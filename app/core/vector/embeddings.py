@@ -1,8 +1,17 @@
+import hashlib
+import math
 import os
-from typing import List
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional, Protocol, Sequence
 from dotenv import load_dotenv
+import numpy as np
 import openai
 
+from app.core.metrics import counter, current_endpoint, histogram
+from app.core.tracing import span
+
 
 # 从.env文件中读取配置信息，特别是OpenAI API密钥
 # Load environment variables from .env file, especially OpenAI API key
@@ -15,25 +24,204 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 # OpenAI text-embedding-3-small 模型输出的向量维度为 1536
 # 这个常量定义了嵌入向量的维度，用于创建向量集合时设置向量大小
 # This constant defines the dimension of embedding vectors
-EMBEDDING_DIMENSION = 1536
+# 各 named vector 可以用更小的维度 (见 app/infra/vector/collections.py 的 EMBEDDING_DIMENSIONS)
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "1536"))
+
+# 一次 API 调用最多嵌入的文本数 (OpenAI 单次上限为 2048)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+# embedding 后端: openai (默认) / hash (本地、离线、确定性, 用于开发 / 压测 / CI)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai").lower()
+# hash 后端每次调用的模拟延迟 (毫秒), 压测时可设为接近 API 的值
+EMBEDDING_HASH_LATENCY_MS = float(os.getenv("EMBEDDING_HASH_LATENCY_MS", "0"))
+
+# 每个 endpoint 的 embedding 调用次数 / 文本数 (除以 vounica_http_requests_total 即每个请求的调用数)
+EMBEDDING_REQUESTS = counter(
+    "vounica_embedding_requests_total", "Embedding calls", labelnames=("provider", "endpoint", "status")
+)
+EMBEDDING_TEXTS = counter(
+    "vounica_embedding_request_texts_total", "Texts sent to the embedding backend", labelnames=("provider", "endpoint")
+)
+EMBEDDING_SECONDS = histogram(
+    "vounica_embedding_request_duration_seconds", "Embedding call latency", labelnames=("provider", "endpoint")
+)
+
+
+@contextmanager
+def embedding_call(provider: str, texts: int, dimensions: Optional[int] = None, **attributes: Any) -> Iterator[None]:
+    """Span + metrics around one embedding call."""
+    endpoint = current_endpoint()
+    start = time.perf_counter()
+    status = "error"
+    try:
+        with span("embedding", provider=provider, texts=texts, dimensions=dimensions or EMBEDDING_DIMENSION, **attributes):
+            yield
+        status = "ok"
+    finally:
+        EMBEDDING_REQUESTS.inc(provider=provider, endpoint=endpoint, status=status)
+        EMBEDDING_TEXTS.inc(texts, provider=provider, endpoint=endpoint)
+        EMBEDDING_SECONDS.observe(time.perf_counter() - start, provider=provider, endpoint=endpoint)
+
+
+class EmbeddingProvider(Protocol):
+    """
+    Turn texts into vectors; one call per batch, results keep the input order.
+
+    text を vector に変(か)える backend の interface です。
+    """
+
+    name: str
+
+    def embed(self, texts: List[str], dimensions: Optional[int] = None) -> List[List[float]]:
+        ...
 
 
-def get_embedding(text: str) -> List[float]:
+class OpenAIEmbeddingProvider:
+    """OpenAI text-embedding-3-small (``dimensions`` は API 側で切り詰め)."""
+
+    name = "openai"
+
+    def __init__(self, model: str = "text-embedding-3-small") -> None:
+        self.model = model
+
+    def embed(self, texts: List[str], dimensions: Optional[int] = None) -> List[List[float]]:
+        # 调用OpenAI的嵌入API，将文本转换为向量表示
+        # textを vectorに変換するために OpenAIの APIを呼び出します
+        response = openai.embeddings.create(
+            input=texts,
+            model=self.model,
+            dimensions=dimensions or EMBEDDING_DIMENSION,
+        )
+        # data 按 index 返回, 这里显式排序以防万一
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class HashEmbeddingProvider:
+    """
+    Deterministic offline embeddings: hashed character n-grams and words, signed, L2-normalized.
+
+    同(おな)じ text は常(つね)に同じ vector、似(に)た text は近(ちか)い vector になります（意味(いみ)は理解(りかい)しません）。
     """
-    使用 OpenAI 的 text-embedding-3-small 模型获取文本的嵌入向量
-    
+
+    name = "hash"
+
+    def __init__(
+        self,
+        dimension: int = EMBEDDING_DIMENSION,
+        ngram_range: Sequence[int] = (1, 3),
+        latency: float = EMBEDDING_HASH_LATENCY_MS / 1000,
+    ) -> None:
+        self.dimension = dimension
+        self.ngram_range = tuple(ngram_range)
+        self.latency = latency
+
+    def _features(self, text: str) -> List[str]:
+        text = text.lower()
+        low, high = self.ngram_range
+        # 日语/中文没有空格, 以字符 n-gram 为主, 再加上空格分隔的词
+        features = [text[i:i + n] for n in range(low, high + 1) for i in range(len(text) - n + 1)]
+        features.extend(f"w:{word}" for word in re.findall(r"\w+", text))
+        return features
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        features = self._features(text)
+        if not features:
+            return vector
+        # blake2b 与进程无关 (内置 hash() 每个进程的 seed 不同)
+        digests = np.frombuffer(
+            b"".join(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest() for f in features), dtype="<u8"
+        )
+        indexes = (digests % self.dimension).astype(np.int64)
+        signs = np.where((digests >> np.uint64(63)) == 0, 1.0, -1.0).astype(np.float32)
+        np.add.at(vector, indexes, signs)
+        return vector
+
+    def embed(self, texts: List[str], dimensions: Optional[int] = None) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        # 与 truncate_embedding 一致: 只能截短; 更大的维度需要调大 EMBEDDING_DIMENSION
+        if dimensions is not None and dimensions > self.dimension:
+            raise ValueError(f"Cannot extend a {self.dimension}-dim hash embedding to {dimensions} dims")
+        if not texts:
+            return []
+        matrix = np.stack([self._vector(text) for text in texts])
+        # 与 OpenAI 相同: 小维度 = 完整向量的前 dimensions 维再归一化 (和 truncate_embedding 一致)
+        matrix = matrix[:, : dimensions or self.dimension]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return (matrix / np.where(norms == 0, 1.0, norms)).tolist()
+
+
+_provider: EmbeddingProvider | None = None
+
+
+def set_embedding_provider(provider: EmbeddingProvider) -> None:
+    """Inject the embedding backend used by ``get_embedding`` / ``get_embeddings``."""
+    global _provider
+    _provider = provider
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Return the current embedding backend, creating it from EMBEDDING_PROVIDER on first use."""
+    if _provider is None:
+        return make_embedding_provider()
+    return _provider
+
+
+def make_embedding_provider(name: Optional[str] = None) -> EmbeddingProvider:
+    """
+    Create the embedding backend named ``name`` (default: EMBEDDING_PROVIDER) and inject it.
+
+    環境(かんきょう)変数(へんすう) EMBEDDING_PROVIDER から backend を作成(さくせい)します。
+    """
+    name = (name or EMBEDDING_PROVIDER).lower()
+    if name == "openai":
+        provider: EmbeddingProvider = OpenAIEmbeddingProvider()
+    elif name == "hash":
+        provider = HashEmbeddingProvider()
+    else:
+        raise ValueError(f"Unknown embedding provider: {name!r} (expected 'openai' or 'hash')")
+    set_embedding_provider(provider)
+    return provider
+
+
+def get_embedding(text: str, dimensions: Optional[int] = None) -> List[float]:
+    """
+    使用当前的 embedding 后端 (默认 OpenAI text-embedding-3-small) 获取文本的嵌入向量
+
     Args:
         text: 需要嵌入的文本
-        
+        dimensions: 向量维度 (Matryoshka, 截断并归一化); None 时为 EMBEDDING_DIMENSION
+
     Returns:
         包含嵌入向量的浮点数列表
     """
-    # 调用OpenAI的嵌入API，将文本转换为向量表示
-    # 这个函数将文本发送到OpenAI的服务器，获取其向量表示
-    # This function sends text to OpenAI's server and gets vector representation
-    # textを vectorに変換するために OpenAIの APIを呼び出します
-    response = openai.embeddings.create(
-        input=text,
-        model="text-embedding-3-small",
-    )
-    return response.data[0].embedding 
\ No newline at end of file
+    provider = get_embedding_provider()
+    with embedding_call(provider.name, 1, dimensions):
+        return provider.embed([text], dimensions)[0]
+
+
+def get_embeddings(texts: List[str], dimensions: Optional[int] = None) -> List[List[float]]:
+    """
+    Embed several texts with a single API call; results keep the input order.
+
+    複数(ふくすう)の text を 1 回(かい)の API 呼(よ)び出(だ)しで vector にします。
+    """
+    if not texts:
+        return []
+    provider = get_embedding_provider()
+    with embedding_call(provider.name, len(texts), dimensions):
+        return provider.embed(texts, dimensions)
+
+
+def truncate_embedding(vector: Sequence[float], dimensions: int) -> List[float]:
+    """
+    Shorten a stored embedding to ``dimensions`` and re-normalize it.
+
+    text-embedding-3 は Matryoshka 表現(ひょうげん)なので、先頭(せんとう)の次元(じげん)だけで使(つか)えます。
+    """
+    if dimensions > len(vector):
+        raise ValueError(f"Cannot extend a {len(vector)}-dim embedding to {dimensions} dims")
+    head = [float(x) for x in vector[:dimensions]]
+    norm = math.sqrt(sum(x * x for x in head)) or 1.0
+    return [x / norm for x in head]
@@ -2,6 +2,9 @@
 Vector session wrapper providing transactional-like behavior for Qdrant operations.
 
 Qdrant への操作(そうさ)をトランザクション風(ふう)に扱(あつか)うためのラッパーです。
+
+应用中的向量写入不经过这里: BaseService 写 outbox (app/infra/vector/outbox.py), 由 VectorSyncWorker 同步到 Qdrant,
+UoW 也不再创建 VectorSession。保留这个类只作为独立的小工具 (脚本、测试 fixture 的 spec), 新的向量写入 / 监控不要加在这里。
 """
 
 from __future__ import annotations
@@ -4,6 +4,7 @@ from .story import Story
 from .grammar import Grammar
 from .memory import Memory
 from .mistake import Mistake
+from .vector_outbox import VectorOutbox
 
 __all__ = [
     "User",
@@ -12,4 +13,5 @@ __all__ = [
     "Grammar",
     "Memory",
     "Mistake",
+    "VectorOutbox",
 ]
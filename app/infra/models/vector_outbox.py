@@ -0,0 +1,42 @@
+# 向量同步的 outbox 表, 与业务数据在同一个事务中写入, 由后台 worker 同步到 Qdrant
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from app.core.db.base import BaseModel
+
+
+# 向量同步任务表, 每行表示一条 (model, origin_id) 的 upsert / delete
+class VectorOutbox(BaseModel):
+    """
+    The VectorOutbox table by SQLAlchemy.
+    これは Qdrant 同期(どうき)用(よう)の Outbox Tableです。
+    """
+    __tablename__ = "vector_outbox"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    # ORM 模型名 (MODEL_FIELD_TO_COLLECTION 的 key), 例如 "Vocab"
+    model = Column(String(32), nullable=False)
+
+    # 业务表中的主键, 同时作为 Qdrant point id
+    origin_id = Column(Integer, nullable=False)
+
+    # 所属用户; 不加外键, 用户删除后 delete 任务仍需执行
+    user_id = Column(Integer)
+
+    # "upsert" 或 "delete"
+    op = Column(String(8), nullable=False)
+
+    # 失败重试次数与下次可执行时间 (指数退避)
+    attempts = Column(Integer, default=0, nullable=False)
+    available_at = Column(DateTime, default=datetime.now, nullable=False)
+    last_error = Column(Text)
+
+    # BaseModel 的 default 在 import 时求值, 这里需要真实的入队时间
+    created_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index("ix_vector_outbox_available", "available_at", "id"),
+    )
+
+    def __repr__(self):
+        return f"<VectorOutbox {self.id} {self.op} {self.model}:{self.origin_id}>"
@@ -1,5 +1,11 @@
 from app.infra.quota.bucket import QuotaBucket
+from app.infra.quota.lease import QuotaLease
+from app.infra.quota.rate_limit import RateLimit, RateLimiter, RateLimitMiddleware
 
 __all__ = [
     "QuotaBucket",
-]
\ No newline at end of file
+    "QuotaLease",
+    "RateLimit",
+    "RateLimiter",
+    "RateLimitMiddleware",
+]
@@ -10,12 +10,24 @@ import redis.asyncio as redis
 from dotenv import load_dotenv
 
 from app.core.exceptions.common.token_quota_exceeded import TokenQuotaExceededException
+from app.core.metrics import counter, current_endpoint
 from app.infra.models.user import User
 
 load_dotenv()
 # 默认4小时
 _DEFAULT_WINDOW = int(os.getenv("TOKEN_QUOTA_WINDOW", "14400"))  # 秒
 
+QUOTA_CHECKS = counter(
+    "vounica_quota_checks_total",
+    "Quota checks by result (ok / rejected with TokenQuotaExceededException)",
+    labelnames=("endpoint", "result"),
+)
+QUOTA_CONSUMED = counter(
+    "vounica_quota_consumed_tokens_total",
+    "Quota deducted (tokens x model price factor)",
+    labelnames=("endpoint",),
+)
+
 
 class QuotaBucket:
     """Per-user quota bucket using Redis TTL to reset periodically."""
@@ -45,10 +57,12 @@ class QuotaBucket:
         """Ensure quota has at least `need` tokens remaining."""
         remaining = await self._get_remaining(create_if_missing=True)
         if remaining < need:
+            QUOTA_CHECKS.inc(endpoint=current_endpoint(), result="rejected")
             raise TokenQuotaExceededException(
                 message="Token quota exceeded",
                 detail={"remaining": remaining, "required": need},
             )
+        QUOTA_CHECKS.inc(endpoint=current_endpoint(), result="ok")
 
     # 消费token
     async def consume(self, used: int, *, multiplier: int = 1) -> None:
@@ -61,6 +75,7 @@ class QuotaBucket:
         if used <= 0 or multiplier <= 0:
             return
         cost = used * multiplier
+        QUOTA_CONSUMED.inc(cost, endpoint=current_endpoint())
 
         # Use pipeline to ensure atomicity
         tr = self._redis.pipeline()
@@ -72,6 +87,9 @@ class QuotaBucket:
         else:
             await self._redis.decrby(self._key, cost)
 
+    async def aclose(self) -> None:
+        """Nothing held locally; ``QuotaLease`` returns its unused lease here."""
+
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
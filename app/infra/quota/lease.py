@@ -0,0 +1,131 @@
+"""
+In-process quota lease: reserve a chunk of the Redis balance and spend it locally.
+
+Redis の残高(ざんだか)からまとめて借(か)りて、手元(てもと)で使(つか)います。
+残(のこ)りは UoW を閉(と)じるときに返(かえ)します。
+
+- check / consume 在本地余额足够时不访问 Redis; 不足时一次 Lua 调用补充 (原子地读取余额并扣除)
+- 超额上限: 每个进行中的请求最多多用一个 lease 的量 (其他请求看不到本地尚未使用的部分)
+- 窗口过期 (key 消失) 后归还的余额直接丢弃, 不会加到新窗口中
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Optional, Tuple
+
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+from app.core.exceptions.common.token_quota_exceeded import TokenQuotaExceededException
+from app.core.metrics import counter, current_endpoint
+from app.infra.models.user import User
+
+from .bucket import QUOTA_CHECKS, QUOTA_CONSUMED, QuotaBucket
+
+load_dotenv()
+# 每次向 Redis 借的量 (token x 价格); 0 表示不借, 与 QuotaBucket 一样每次 check / consume 都访问 Redis
+QUOTA_LEASE_SIZE = int(os.getenv("QUOTA_LEASE_SIZE", "1000000"))
+
+QUOTA_REDIS_CALLS = counter(
+    "vounica_quota_redis_calls_total",
+    "Redis round-trips made by quota leases (lease / return)",
+    labelnames=("op",),
+)
+
+# KEYS[1]: 余额 key; ARGV: limit, window, want, need
+# 至少扣除 need (已经发生的消费, 可以透支), 余额足够时最多借到 want; 返回 {借到的量, 借之前的余额}
+_LEASE_LUA = """
+local balance = tonumber(redis.call('GET', KEYS[1]))
+if balance == nil then
+  balance = tonumber(ARGV[1])
+  redis.call('SET', KEYS[1], balance, 'EX', tonumber(ARGV[2]))
+end
+local grant = math.max(tonumber(ARGV[4]), math.min(tonumber(ARGV[3]), math.max(balance, 0)))
+if grant > 0 then
+  redis.call('DECRBY', KEYS[1], grant)
+end
+return {grant, balance}
+"""
+
+# 只在当前窗口仍存在时归还
+_RETURN_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+
+class QuotaLease(QuotaBucket):
+    """``QuotaBucket`` that spends a locally held lease and returns the rest on ``aclose()``."""
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        user: User,
+        *,
+        window: Optional[int] = None,
+        lease_size: int = QUOTA_LEASE_SIZE,
+    ) -> None:
+        super().__init__(redis_client, user, window=window)
+        self.lease_size = lease_size
+        # 已从 Redis 扣除、尚未使用的量
+        self.local = 0
+        # 同一请求中并行的工具 / LLM 调用共用一个 lease, 补充时串行
+        self._lock = asyncio.Lock()
+        self._lease = redis_client.register_script(_LEASE_LUA)
+        self._return = redis_client.register_script(_RETURN_LUA)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def check(self, need: int = 0) -> None:
+        """Ensure quota has at least `need` tokens remaining (local lease + Redis balance)."""
+        async with self._lock:
+            available = self.local
+            if self.local <= 0 or self.local < need:
+                grant, balance = await self._refill(want=self.lease_size, need=0)
+                # 留在 Redis 中的余额也计入: 大额预检 (agent preflight) 只借一个 lease, 不会借走整个预估额
+                available = self.local + balance - grant
+        if available < need:
+            QUOTA_CHECKS.inc(endpoint=current_endpoint(), result="rejected")
+            raise TokenQuotaExceededException(
+                message="Token quota exceeded",
+                detail={"remaining": available, "required": need},
+            )
+        QUOTA_CHECKS.inc(endpoint=current_endpoint(), result="ok")
+
+    async def consume(self, used: int, *, multiplier: int = 1) -> None:
+        """Deduct tokens multiplied by model cost factor from the local lease (refilled when short)."""
+        if used <= 0 or multiplier <= 0:
+            return
+        cost = used * multiplier
+        QUOTA_CONSUMED.inc(cost, endpoint=current_endpoint())
+        async with self._lock:
+            if cost > self.local:
+                # 不足的部分一定扣除 (token 已经用掉), 顺便补充下一次的 lease
+                deficit = cost - self.local
+                await self._refill(want=deficit + self.lease_size, need=deficit)
+            self.local -= cost
+
+    async def aclose(self) -> None:
+        """Return the unused part of the lease to Redis."""
+        async with self._lock:
+            amount, self.local = self.local, 0
+            if amount <= 0:
+                return
+            QUOTA_REDIS_CALLS.inc(op="return")
+            await self._return(keys=[self._key], args=[amount])
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+
+    async def _refill(self, *, want: int, need: int) -> Tuple[int, int]:
+        QUOTA_REDIS_CALLS.inc(op="lease")
+        grant, balance = await self._lease(keys=[self._key], args=[self.limit, self.window, want, need])
+        self.local += int(grant)
+        return int(grant), int(balance)
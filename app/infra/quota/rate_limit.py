@@ -0,0 +1,262 @@
+"""
+Redis sliding-window request limiter and concurrent agent stream cap, per user and route class.
+
+ユーザーごとのリクエスト数(すう)と、同時(どうじ)に動(うご)く agent stream の数(かず)を制限(せいげん)します。
+
+- 每次检查只有一次 Lua 调用 (EVALSHA), 清理、计数、记录在 Redis 中原子执行, 多个 worker 共享同一限额
+- stream 槽位带开始时间, 进程崩溃未释放的槽位在 AGENT_STREAM_TTL 后自动失效
+- Redis 不可用时放行 (fail open), 配额 (QuotaBucket) 仍然限制 LLM 用量
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import time
+import uuid
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+import redis.asyncio as redis
+from dotenv import load_dotenv
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+from starlette.websockets import WebSocketClose
+
+from app.core.auth.jwt import verify_access_token_once
+from app.core.exceptions.common.too_many_requests import TooManyRequestsException
+from app.core.metrics import counter
+from app.core.redis import get_redis_client
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return str(os.getenv(name, default)).strip().lower() in {"1", "true", "yes", "on"}
+
+
+RATE_LIMIT_ENABLED = _env_bool("RATE_LIMIT_ENABLED", "true")
+# route class=请求数/窗口秒数
+RATE_LIMITS = os.getenv("RATE_LIMITS", "agent=20/60,llm=60/60,default=600/60")
+# 每个用户同时运行的 agent (SSE / WebSocket / 非流式) 数量上限; 0 表示不限制
+AGENT_MAX_CONCURRENT_STREAMS = int(os.getenv("AGENT_MAX_CONCURRENT_STREAMS", "2"))
+AGENT_STREAM_TTL = int(os.getenv("AGENT_STREAM_TTL", "900"))  # 秒
+
+# path 前缀 -> route class, 按顺序匹配第一个; 不匹配的请求不限制
+ROUTE_CLASSES: Sequence[Tuple[str, str]] = (
+    ("/v1/question/agent/", "agent"),
+    ("/v1/question/judge", "llm"),
+    ("/v1/question/record", "llm"),
+    ("/v1/question/error_reason", "llm"),
+    ("/v1/story/create", "llm"),
+    ("/v1/", "default"),
+)
+# 这些 route class 的请求同时占用一个 stream 槽位
+STREAM_CLASSES = frozenset({"agent"})
+
+RATE_LIMITED = counter(
+    "vounica_rate_limited_total",
+    "Requests rejected with 429 by the rate limiter (reason: window / streams)",
+    labelnames=("route_class", "reason"),
+)
+
+# KEYS[1]: 窗口 key; ARGV: now_ms, window_ms, limit, member
+# 返回 {允许 1/0, 窗口内请求数, 需要等待的毫秒数}
+_SLIDING_WINDOW_LUA = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count >= limit then
+  local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+  return {0, count, tonumber(oldest[2]) + window - now}
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('PEXPIRE', KEYS[1], window)
+return {1, count + 1, 0}
+"""
+
+# KEYS[1]: 用户的 stream 槽位; ARGV: now_ms, ttl_ms, limit, member
+_ACQUIRE_STREAM_LUA = """
+local now = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - ttl)
+local count = redis.call('ZCARD', KEYS[1])
+if count >= tonumber(ARGV[3]) then
+  return {0, count}
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('PEXPIRE', KEYS[1], ttl)
+return {1, count + 1}
+"""
+
+
+class RateLimit(NamedTuple):
+    limit: int
+    window: float  # 秒
+
+
+def parse_rate_limits(value: str) -> Dict[str, RateLimit]:
+    """Parse ``class=limit/window_seconds,...`` (invalid entries are ignored)."""
+    limits: Dict[str, RateLimit] = {}
+    for item in value.split(","):
+        name, sep, spec = item.partition("=")
+        limit, slash, window = spec.partition("/")
+        if not sep or not slash or not name.strip():
+            continue
+        try:
+            limits[name.strip()] = RateLimit(int(limit), float(window))
+        except ValueError:
+            continue
+    return limits
+
+
+def route_class_of(path: str) -> Optional[str]:
+    for prefix, route_class in ROUTE_CLASSES:
+        if path.startswith(prefix):
+            return route_class
+    return None
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class RateLimiter:
+    """Per-user sliding-window limits and concurrent stream slots stored in Redis."""
+
+    KEY_TEMPLATE = "ratelimit:{route_class}:{user_id}"
+    STREAM_KEY_TEMPLATE = "ratelimit:streams:{user_id}"
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        *,
+        limits: Optional[Dict[str, RateLimit]] = None,
+        max_streams: int = AGENT_MAX_CONCURRENT_STREAMS,
+        stream_ttl: int = AGENT_STREAM_TTL,
+    ) -> None:
+        self.redis = redis_client
+        self.limits = parse_rate_limits(RATE_LIMITS) if limits is None else limits
+        self.max_streams = max_streams
+        self.stream_ttl = stream_ttl
+        # register_script 使用 EVALSHA, 脚本未缓存时自动回退到 EVAL
+        self._hit = redis_client.register_script(_SLIDING_WINDOW_LUA)
+        self._acquire = redis_client.register_script(_ACQUIRE_STREAM_LUA)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def check(self, user_id: int, route_class: str) -> None:
+        """Count one request; raise ``TooManyRequestsException`` when the window is full."""
+        rate = self.limits.get(route_class)
+        if rate is None or rate.limit <= 0:
+            return
+        window_ms = int(rate.window * 1000)
+        key = self.KEY_TEMPLATE.format(route_class=route_class, user_id=user_id)
+        allowed, count, retry_ms = await self._hit(keys=[key], args=[_now_ms(), window_ms, rate.limit, uuid.uuid4().hex])
+        if not int(allowed):
+            RATE_LIMITED.inc(route_class=route_class, reason="window")
+            raise TooManyRequestsException(
+                message="Rate limit exceeded",
+                detail={
+                    "route_class": route_class,
+                    "limit": rate.limit,
+                    "window": rate.window,
+                    "retry_after": math.ceil(max(int(retry_ms), 0) / 1000),
+                },
+            )
+
+    async def acquire_stream(self, user_id: int) -> Optional[str]:
+        """Take one concurrent agent slot; return its id for ``release_stream`` (``None`` when unlimited)."""
+        if self.max_streams <= 0:
+            return None
+        slot = uuid.uuid4().hex
+        key = self.STREAM_KEY_TEMPLATE.format(user_id=user_id)
+        allowed, count = await self._acquire(keys=[key], args=[_now_ms(), self.stream_ttl * 1000, self.max_streams, slot])
+        if not int(allowed):
+            RATE_LIMITED.inc(route_class="agent", reason="streams")
+            raise TooManyRequestsException(
+                message="Too many concurrent agent streams",
+                detail={"limit": self.max_streams, "active": int(count)},
+            )
+        return slot
+
+    async def release_stream(self, user_id: int, slot: Optional[str]) -> None:
+        if slot is None:
+            return
+        await self.redis.zrem(self.STREAM_KEY_TEMPLATE.format(user_id=user_id), slot)
+
+
+def _user_id_of(conn: HTTPConnection) -> Optional[int]:
+    # 这里只校验 JWT, 不查询用户; 无效 token 交给 get_uow 返回 401
+    # 校验结果留在 scope["state"] 中, get_uow 不再重复验签
+    authorization = conn.headers.get("authorization")
+    if authorization and authorization.lower().startswith("bearer "):
+        token = authorization.split(" ", 1)[1]
+    else:
+        token = conn.query_params.get("token") if conn.scope["type"] == "websocket" else None
+    if not token:
+        return None
+    try:
+        return int(verify_access_token_once(token, conn.scope.setdefault("state", {})).get("sub"))
+    except Exception:
+        return None
+
+
+class RateLimitMiddleware:
+    """Reject requests over the per-user limit with 429 and hold a stream slot while an agent runs."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self._limiter: Optional[RateLimiter] = None
+
+    def limiter(self) -> RateLimiter:
+        # Redis client 在 lifespan 中创建, 第一次请求时再绑定
+        client = get_redis_client()
+        if self._limiter is None or self._limiter.redis is not client:
+            self._limiter = RateLimiter(client)
+        return self._limiter
+
+    async def __call__(self, scope, receive, send) -> None:
+        route_class = route_class_of(scope.get("path", "")) if scope["type"] in ("http", "websocket") else None
+        user_id = _user_id_of(HTTPConnection(scope)) if RATE_LIMIT_ENABLED and route_class else None
+        if user_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        slot: Optional[str] = None
+        try:
+            limiter = self.limiter()
+            await limiter.check(user_id, route_class)
+            if route_class in STREAM_CLASSES:
+                slot = await limiter.acquire_stream(user_id)
+        except TooManyRequestsException as exc:
+            await self._reject(exc, scope, receive, send)
+            return
+        except (redis.RedisError, RuntimeError) as e:
+            logger.warning("Rate limiter unavailable, request allowed: %s", e)
+            limiter = None
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # SSE / WebSocket 在推送结束 (或客户端断开) 后才返回, 槽位在此之前一直占用
+            if slot is not None and limiter is not None:
+                try:
+                    await limiter.release_stream(user_id, slot)
+                except redis.RedisError as e:
+                    logger.warning("Releasing agent stream slot failed: %s", e)
+
+    @staticmethod
+    async def _reject(exc: TooManyRequestsException, scope, receive, send) -> None:
+        if scope["type"] == "websocket":
+            # accept 之前关闭即拒绝握手
+            await WebSocketClose(code=1008, reason=exc.message)(scope, receive, send)
+            return
+        headers = {"Retry-After": str(exc.detail["retry_after"])} if "retry_after" in exc.detail else None
+        await JSONResponse(status_code=exc.code, content=exc.to_dict(), headers=headers)(scope, receive, send)
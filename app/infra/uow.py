@@ -9,74 +9,125 @@
 """
 
 import inspect
+import logging
 from contextlib import asynccontextmanager
-from typing import Any, AsyncGenerator, Dict, Optional, TypeVar, Type, TYPE_CHECKING
-from fastapi import Header, Depends
+from typing import Any, AsyncGenerator, Callable, Dict, Optional, Tuple, TypeVar, Type, TYPE_CHECKING
+from fastapi import Header, Depends, Request
 import redis
 from sqlalchemy.ext.asyncio import AsyncSession
 from contextlib import suppress
 
-from app.core.db import get_db
-from app.core.vector import get_vector_session
-from app.core.vector.session import VectorSession
+from app.core.db import get_db, release_connection, use_primary
 from app.core.redis import get_redis_client
-from app.core.auth.jwt import verify_access_token
+from app.core.tracing import span
+from app.core.logging import bind_log_context, new_request_id, reset_log_context
+from app.core.exceptions.base import BaseException as AppException
+from app.core.auth.jwt import verify_access_token_once
 from app.core.exceptions.auth.invalid_token import InvalidTokenException
 from app.core.exceptions.auth.unauthorized import UnauthorizedException
 from app.infra.repo.user_repository import UserRepository
 from app.infra.models import User
-from app.infra.quota import QuotaBucket
+from app.infra.quota import QuotaBucket, QuotaLease
+from app.infra.vector.outbox import COMMITTED_JOBS, publish_vector_jobs
 from contextvars import Token
 from .context import uow_ctx
 from fastapi import WebSocket
 
+logger = logging.getLogger(__name__)
+
+class Lazy:
+    """
+    Resource factory evaluated on first attribute access of the UnitOfWork.
+
+    最初(さいしょ)にアクセスされたときに作(つく)られる resource です。
+    """
+
+    __slots__ = ("factory", "owned")
+
+    def __init__(self, factory: Callable[["UnitOfWork"], Any], *, owned: bool = True) -> None:
+        # factory 接收 uow, 可以依赖其他资源 (例如 quota 依赖 redis)
+        self.factory = factory
+        # owned=False: 进程共享的资源 (例如 redis client), UoW 结束时不关闭
+        self.owned = owned
+
+
+# 没有 commit / rollback / close 的普通值, 不做反射
+_PLAIN_TYPES = (str, int, float, bool, type(None))
+
+# hook 名 -> (bound method, 是否 async)
+Hook = Tuple[Callable[[], Any], bool]
+
+
 class UnitOfWork:
     """Resource manager implementing unit-of-work pattern"""
 
     db: AsyncSession
-    vector: VectorSession
     redis: redis.Redis
     current_user: "User"
     current_user_id: int
+    # 日志关联 id (X-Request-ID 或随机生成)
+    request_id: str
     accept_language: str
     target_language: str
     quota: QuotaBucket
     
     def __init__(self, **resources: Any) -> None:
         # 将资源同时存入私有 dict，并挂到实例属性上，便于外部通过 uow.db 直接访问
+        # Lazy 资源在第一次访问时才创建; commit / rollback / close 只作用于已创建的资源
         self._resources: Dict[str, Any] = {}
+        self._hooks: Dict[str, Dict[str, Hook]] = {}
+        self._lazy: Dict[str, Lazy] = {}
         for key, resource in resources.items():
-            setattr(self, key, resource)
-            self._resources[key] = resource
+            if isinstance(resource, Lazy):
+                self._lazy[key] = resource
+            else:
+                self._register(key, resource)
+
+    def __getattr__(self, name: str) -> Any:
+        # 只有实例上还没有该属性时才会进入这里
+        lazy = self.__dict__.get("_lazy", {}).get(name)
+        if lazy is None:
+            raise AttributeError(f"{type(self).__name__} has no resource {name!r}")
+        # factory 失败 (例如 Redis 未初始化) 时保留 Lazy, 下次访问重新抛出原来的错误
+        resource = self._register(name, lazy.factory(self), owned=lazy.owned)
+        del self._lazy[name]
+        return resource
+
+    def is_created(self, name: str) -> bool:
+        """Return True if the resource exists (lazy resources are not created by this call)."""
+        return name in self._resources
 
     async def commit(self) -> None:
         """Iterate through resources and commit if possible."""
         # 逐个资源调用 commit；若资源无此方法则自动跳过
         await self._broadcast("commit")
+        # DB 提交后通知向量同步 worker (任务本身已在 outbox 中)
+        db = self._resources.get("db")
+        if db is not None and db.info.get(COMMITTED_JOBS):
+            await publish_vector_jobs(db, self.redis)
 
     async def rollback(self) -> None:
         """Iterate through resources and rollback if possible."""
         # 出错时统一回滚，保持跨资源一致性
         await self._broadcast("rollback")
 
+    def use_primary(self):
+        """Context manager sending DB reads to the primary (read-your-writes escape hatch)."""
+        # 本 UoW 写入过之后会自动走 primary; 这里用于读取其他请求刚写入的数据
+        return use_primary(self.db)
+
+    async def release(self) -> bool:
+        """Return the DB connection to the pool if the current transaction has no writes."""
+        # 长时间等待 (LLM 调用) 前调用; 有写入时保留事务, 等待 commit
+        db = self._resources.get("db")
+        if db is None:
+            return True
+        return await release_connection(db)
+
     async def close(self) -> None:
         """Iterate through resources and close if possible."""
-        methods = [
-            'aclose',
-            'close'
-        ]
-        # 检测self._resources中是否存在
-        for resource in self._resources.values():
-            for method in methods:
-                # 如果不存在对应方法，则跳过
-                if not hasattr(resource, method):
-                    continue
-                # 如果存在对应方法，检测是否为异步方法，如果是则await，否则直接调用
-                if inspect.iscoroutinefunction(getattr(resource, method)) or method == "aclose":
-                    await getattr(resource, method)()
-                    break
-                else:
-                    getattr(resource, method)()
+        # 每个资源优先使用 aclose, 其次 close (见 _register)
+        await self._broadcast("close")
 
     # Async context manager helpers
 
@@ -92,33 +143,72 @@ class UnitOfWork:
 
     # Internal helpers
 
+    # 资源创建时解析一次 commit / rollback / close 方法, 之后的 _broadcast 不再反射
+    def _register(self, key: str, resource: Any, *, owned: bool = True) -> Any:
+        setattr(self, key, resource)
+        self._resources[key] = resource
+        hooks: Dict[str, Hook] = {}
+        if not isinstance(resource, _PLAIN_TYPES):
+            for name in ("commit", "rollback"):
+                method = getattr(resource, name, None)
+                if method is not None and callable(method):
+                    hooks[name] = (method, inspect.iscoroutinefunction(method))
+            if owned:
+                aclose = getattr(resource, "aclose", None)
+                close = getattr(resource, "close", None)
+                if aclose is not None and callable(aclose):
+                    hooks["close"] = (aclose, True)
+                elif close is not None and callable(close):
+                    hooks["close"] = (close, inspect.iscoroutinefunction(close))
+        self._hooks[key] = hooks
+        return resource
+
     # 通过string调用资源中的方法, 可以通用化
     async def _broadcast(self, method_name: str) -> None:
-        """Call method_name on every resource if that method exists."""
-        for resource in self._resources.values():
-            # 若资源不存在对应方法则直接跳过
-            method = getattr(resource, method_name, None)
-            if method is None or not callable(method):
+        """Call method_name on every created resource that has it."""
+        for hooks in list(self._hooks.values()):
+            hook = hooks.get(method_name)
+            if hook is None:
                 continue
-
+            method, is_async = hook
             # 兼容同步和异步方法，减少实现约束
-            if inspect.iscoroutinefunction(method):
+            if is_async:
                 await method()
             else:
                 method()
 
 
+# Lazy resource factories
+
+def _get_redis_client(uow: UnitOfWork) -> redis.Redis:
+    # 进程共享的 client, 不随 UoW 关闭
+    return get_redis_client()
+
+
+def _make_quota_bucket(uow: UnitOfWork) -> QuotaBucket:
+    # 本地 lease: 请求内的 check / consume 大多不访问 Redis, 未用完的部分在 UoW close 时归还
+    return QuotaLease(uow.redis, uow.current_user)
+
+
+def _log_rollback(exc: Exception) -> None:
+    # 业务异常 (404 / 配额不足等) 由 exception handler 转换为响应, 只记一行; 其他异常带 traceback
+    if isinstance(exc, AppException):
+        logger.info("uow rolled back: %s", exc, extra={"error": type(exc).__name__})
+    else:
+        logger.error("uow rolled back", exc_info=exc)
+
+
 # FastAPI dependency helper
 async def get_uow(
+    request: Request,
     authorization: str | None = Header(default=None, alias="Authorization"),
     accept_language: str | None = Header(default=None, alias="Accept-Language"),
     target_language: str | None = Header(default=None, alias="Target-Language"),
+    x_request_id: str | None = Header(default=None, alias="X-Request-ID"),
     db: AsyncSession = Depends(get_db),
-    vector: VectorSession = Depends(get_vector_session),
-    redis_client: redis.Redis = Depends(get_redis_client),
 ) -> AsyncGenerator[UnitOfWork, None]:
     """
-    Aggregate db, vector, and authenticated user context into a single unit-of-work
+    Aggregate db, redis, quota and authenticated user context into a single unit-of-work
     object. If JWT is missing or invalid, raise 401 immediately.
     
     認証(にんしょう)トークンがない、または無効(むこう)の場合(ばあい)は 401 を返(かえ)します。
@@ -130,33 +220,37 @@ async def get_uow(
 
     token = authorization.split(" ", 1)[1]
 
-    try:
-        payload = verify_access_token(token)
-    except InvalidTokenException as exc:
-        # 直接向上抛出，FastAPI 会转换为 JSON 响应
-        raise UnauthorizedException("Invalid token") from exc
-
-    # 提取用户 ID；payload 必须包含 sub 字段
-    user_sub = payload.get("sub")
-    if user_sub is None:
-        raise UnauthorizedException("Token missing subject")
-
-    try:
-        user_id = int(user_sub)
-    except ValueError:
-        raise UnauthorizedException("Malformed subject in token")
-
-    # 把user_id转换为user
-    user_repo = UserRepository(db=db)
-    user = await user_repo.get_by_id(user_id)
-    if user is None:
-        raise UnauthorizedException("User not found")
+    with span("uow.auth") as auth_span:
+        try:
+            # RateLimitMiddleware 已校验过的 token 不再重复验签
+            payload = verify_access_token_once(token, request.scope.setdefault("state", {}))
+        except InvalidTokenException as exc:
+            # 直接向上抛出，FastAPI 会转换为 JSON 响应
+            raise UnauthorizedException("Invalid token") from exc
+
+        # 提取用户 ID；payload 必须包含 sub 字段
+        user_sub = payload.get("sub")
+        if user_sub is None:
+            raise UnauthorizedException("Token missing subject")
+
+        try:
+            user_id = int(user_sub)
+        except ValueError:
+            raise UnauthorizedException("Malformed subject in token")
+        auth_span.set_attribute("user_id", user_id)
+
+        # 把user_id转换为user (刚注册的用户可能还没有同步到 replica, 使用 primary)
+        user_repo = UserRepository(db=db)
+        with use_primary(db):
+            user = await user_repo.get_by_id(user_id)
+        if user is None:
+            raise UnauthorizedException("User not found")
 
     # 创建UoW实例，包含所有必要的资源
+    # redis / quota 在第一次访问时才创建 (CRUD 接口大多用不到)
     uow = UnitOfWork(
         db=db, 
-        vector=vector,
-        redis=redis_client,
+        redis=Lazy(_get_redis_client, owned=False),
         # 当前认证用户
         current_user=user,
         # 请求头中的首选语言
@@ -164,23 +258,28 @@ async def get_uow(
         # 请求头中的目标语言
         target_language=target_language,
         # 用户配额
-        quota=QuotaBucket(redis_client, user),
+        quota=Lazy(_make_quota_bucket),
         # 当前用户ID
         current_user_id=user_id,
+        # 本请求的日志关联 id
+        request_id=new_request_id(x_request_id),
     )
-    
+    # 认证查询结束后立即归还连接, 之后的查询按需重新获取
+    await uow.release()
+
     token = uow_ctx.set(uow)
+    log_token = bind_log_context(request_id=uow.request_id, user_id=user_id)
     try:
         yield uow
         await uow.commit()
     except Exception as e:
-        strerror = str(e)
-        print(strerror)
+        _log_rollback(e)
         # 确保异常情况下也回滚
         await uow.rollback()
         raise
     finally:
         # 无论如何都要关闭资源
+        reset_log_context(log_token)
         uow_ctx.reset(token)
         await uow.close()
 
@@ -188,8 +287,6 @@ async def get_uow(
 async def get_uow_ws(
     websocket: WebSocket,
     db: AsyncSession = Depends(get_db),
-    vector: VectorSession = Depends(get_vector_session),
-    redis_client: redis.Redis = Depends(get_redis_client),
 ) -> AsyncGenerator[UnitOfWork, None]:
     """
     WebSocket-compatible dependency to aggregate resources and auth.
@@ -211,24 +308,27 @@ async def get_uow_ws(
     if not token:
         raise UnauthorizedException("Missing bearer token")
 
-    try:
-        payload = verify_access_token(token)
-    except InvalidTokenException as exc:
-        raise UnauthorizedException("Invalid token") from exc
+    with span("uow.auth") as auth_span:
+        try:
+            payload = verify_access_token_once(token, websocket.scope.setdefault("state", {}))
+        except InvalidTokenException as exc:
+            raise UnauthorizedException("Invalid token") from exc
 
-    user_sub = payload.get("sub")
-    if user_sub is None:
-        raise UnauthorizedException("Token missing subject")
+        user_sub = payload.get("sub")
+        if user_sub is None:
+            raise UnauthorizedException("Token missing subject")
 
-    try:
-        user_id = int(user_sub)
-    except ValueError:
-        raise UnauthorizedException("Malformed subject in token")
+        try:
+            user_id = int(user_sub)
+        except ValueError:
+            raise UnauthorizedException("Malformed subject in token")
+        auth_span.set_attribute("user_id", user_id)
 
-    user_repo = UserRepository(db=db)
-    user = await user_repo.get_by_id(user_id)
-    if user is None:
-        raise UnauthorizedException("User not found")
+        user_repo = UserRepository(db=db)
+        with use_primary(db):
+            user = await user_repo.get_by_id(user_id)
+        if user is None:
+            raise UnauthorizedException("User not found")
 
     # Languages from headers or query params
     accept_language = websocket.query_params.get("accept-language") or websocket.headers.get("accept-language")
@@ -236,23 +336,28 @@ async def get_uow_ws(
 
     uow = UnitOfWork(
         db=db,
-        vector=vector,
-        redis=redis_client,
+        redis=Lazy(_get_redis_client, owned=False),
         current_user=user,
         accept_language=accept_language,
         target_language=target_language,
-        quota=QuotaBucket(redis_client, user),
+        quota=Lazy(_make_quota_bucket),
         current_user_id=user_id,
+        request_id=new_request_id(websocket.query_params.get("request-id") or websocket.headers.get("x-request-id")),
     )
+    # WebSocket 连接可能持续很久, 认证查询结束后立即归还连接
+    await uow.release()
 
     token_ctx: Token = uow_ctx.set(uow)
+    log_token = bind_log_context(request_id=uow.request_id, user_id=user_id)
     try:
         yield uow
         # Let caller decide commit timing; default to commit when scope ends
         await uow.commit()
-    except Exception:
+    except Exception as e:
+        _log_rollback(e)
         await uow.rollback()
         raise
     finally:
+        reset_log_context(log_token)
         uow_ctx.reset(token_ctx)
         await uow.close()
\ No newline at end of file
@@ -1,9 +1,12 @@
 from .collections import VectorCollection, COLLECTIONS_CONFIG
-from .operations import ensure_collections_exist, queue_vector_from_instance
+from .operations import ensure_collections_exist
+from .outbox import VectorSyncWorker, enqueue_vector_upsert, enqueue_vector_delete
 
 __all__ = [
     "VectorCollection",
     "COLLECTIONS_CONFIG",
     "ensure_collections_exist",
-    "queue_vector_from_instance",
+    "VectorSyncWorker",
+    "enqueue_vector_upsert",
+    "enqueue_vector_delete",
 ] 
\ No newline at end of file
@@ -1,65 +1,173 @@
+import os
 from enum import Enum
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 
-from qdrant_client.http.models import VectorParams, Distance
+from dotenv import load_dotenv
+from qdrant_client.http.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Distance,
+    HnswConfigDiff,
+    IntegerIndexParams,
+    IntegerIndexType,
+    KeywordIndexParams,
+    KeywordIndexType,
+    PayloadSchemaParams,
+    QuantizationConfig,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+)
 
 from app.core.vector.embeddings import EMBEDDING_DIMENSION
 
+load_dotenv()
+
 
 # Collection name definitions
 class VectorCollection(str, Enum):
     """
     Enumerate all Qdrant collection names used in the project.
+
+    1 つの model に 1 つの collection。field ごとの vector は named vector で持ちます。
     """
-    # Memory
-    MEMORY_CONTENT = "memory_content"
-    MEMORY_SUMMARY = "memory_summary"
-    # Grammar
-    GRAMMAR_USAGE = "grammar_usage"
-    GRAMMAR_NAME = "grammar_name"
-    # Vocabulary
-    VOCAB_USAGE = "vocab_usage"
-    VOCAB_NAME = "vocab_name"
-
-    # Mistake
-    MISTAKE_QUESTION = "mistake_question"
-    MISTAKE_ANSWER = "mistake_answer"
-    MISTAKE_CORRECT_ANSWER = "mistake_correct_answer"
-    MISTAKE_ERROR_REASON = "mistake_error_reason"
-
-    # Story
-    STORY_CONTENT = "story_content"
-    STORY_SUMMARY = "story_summary"
-    STORY_CATEGORY = "story_category"
-
-
-# Collection config mapping
-COLLECTIONS_CONFIG: Dict[VectorCollection, VectorParams] = {
-    collection: VectorParams(size=EMBEDDING_DIMENSION, distance=Distance.COSINE)
+    MEMORY = "memory"
+    GRAMMAR = "grammar"
+    VOCAB = "vocab"
+    MISTAKE = "mistake"
+    STORY = "story"
+
+
+# 每个 collection 的 named vector (= ORM 字段名)
+COLLECTION_VECTORS: Dict[VectorCollection, Tuple[str, ...]] = {
+    VectorCollection.MEMORY: ("content", "summary"),
+    VectorCollection.GRAMMAR: ("usage", "name"),
+    VectorCollection.VOCAB: ("usage", "name"),
+    VectorCollection.MISTAKE: ("question", "answer", "correct_answer", "error_reason"),
+    VectorCollection.STORY: ("content", "summary", "category"),
+}
+
+# 量化: none (float32 全部在内存) / scalar (int8) / binary (1 bit)
+# 默认值 VECTOR_QUANTIZATION, 每个 collection 可用 VECTOR_QUANTIZATION_<NAME> 覆盖 (例: VECTOR_QUANTIZATION_MISTAKE=binary)
+QUANTIZATION_KINDS = ("none", "scalar", "binary")
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+# 检索时多取 oversampling 倍的候选, 再用磁盘上的原始向量 rescore
+VECTOR_QUANTIZATION_OVERSAMPLING = float(os.getenv("VECTOR_QUANTIZATION_OVERSAMPLING", "2.0"))
+
+
+def quantization_config(kind: str) -> Optional[QuantizationConfig]:
+    """Return the Qdrant quantization config for ``kind`` (``None`` keeps plain float32)."""
+    if kind == "none":
+        return None
+    if kind == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    if kind == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    raise ValueError(f"Unknown vector quantization: {kind!r} (expected one of {QUANTIZATION_KINDS})")
+
+
+def vector_params(kind: str, size: int = EMBEDDING_DIMENSION) -> VectorParams:
+    """Return the params of one named vector; quantized vectors keep the originals on disk."""
+    quantization = quantization_config(kind)
+    return VectorParams(
+        size=size,
+        distance=Distance.COSINE,
+        quantization_config=quantization,
+        on_disk=quantization is not None,
+    )
+
+
+# 各 named vector 的维度 (text-embedding-3 的 Matryoshka 截断), 例:
+#   EMBEDDING_DIMENSIONS="vocab.name=512,grammar.name=512,story.category=512"   (字段)
+#   EMBEDDING_DIMENSIONS="vocab=512"                                             (整个 collection)
+# 修改已有 collection 的维度后, 用 python -m scripts.reindex_vectors 迁移
+def _parse_dimensions(spec: str) -> Dict[str, int]:
+    dimensions: Dict[str, int] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, value = item.partition("=")
+        dimensions[key.strip().lower()] = int(value)
+    return dimensions
+
+
+EMBEDDING_DIMENSIONS = _parse_dimensions(os.getenv("EMBEDDING_DIMENSIONS", ""))
+
+
+def vector_dimension(collection: VectorCollection, name: str) -> int:
+    """Return the embedding size of the named vector ``name`` in ``collection``."""
+    return EMBEDDING_DIMENSIONS.get(
+        f"{collection.value}.{name}", EMBEDDING_DIMENSIONS.get(collection.value, EMBEDDING_DIMENSION)
+    )
+
+
+COLLECTION_QUANTIZATION: Dict[VectorCollection, str] = {
+    collection: os.getenv(f"VECTOR_QUANTIZATION_{collection.name}", VECTOR_QUANTIZATION).lower()
     for collection in VectorCollection
 }
 
-# A key is (model_class.__name__, field_name)
+# Collection config mapping: collection -> {vector name: params}
+COLLECTIONS_CONFIG: Dict[VectorCollection, Dict[str, VectorParams]] = {
+    collection: {
+        name: vector_params(COLLECTION_QUANTIZATION[collection], size=vector_dimension(collection, name))
+        for name in names
+    }
+    for collection, names in COLLECTION_VECTORS.items()
+}
+
+# 检索参数: 量化的 collection 用原始向量 rescore; 未量化时为 None
+SEARCH_PARAMS: Dict[VectorCollection, Optional[SearchParams]] = {
+    collection: (
+        None
+        if kind == "none"
+        else SearchParams(
+            quantization=QuantizationSearchParams(rescore=True, oversampling=VECTOR_QUANTIZATION_OVERSAMPLING)
+        )
+    )
+    for collection, kind in COLLECTION_QUANTIZATION.items()
+}
+
+# 多租户 (用户多、每个用户数据少) 的 HNSW 配置:
+# m=0 不建全局图, payload_m 按 payload index (user_id) 为每个用户建图; 所有检索都带 user_id 过滤
+VECTOR_HNSW_M = int(os.getenv("VECTOR_HNSW_M", "0"))
+VECTOR_HNSW_PAYLOAD_M = int(os.getenv("VECTOR_HNSW_PAYLOAD_M", "16"))
+HNSW_CONFIG = HnswConfigDiff(m=VECTOR_HNSW_M, payload_m=VECTOR_HNSW_PAYLOAD_M)
+
+# 所有 collection 共有的 payload index
+PAYLOAD_INDEXES: Dict[str, PayloadSchemaParams] = {
+    # 只做等值匹配, 不需要 range
+    "user_id": IntegerIndexParams(type=IntegerIndexType.INTEGER, lookup=True, range=False),
+    "language": KeywordIndexParams(type=KeywordIndexType.KEYWORD),
+    "model": KeywordIndexParams(type=KeywordIndexType.KEYWORD),
+}
+
+# A key is (model_class.__name__, field_name); the vector name inside the collection is field_name
 MODEL_FIELD_TO_COLLECTION: Dict[Tuple[str, str], VectorCollection] = {
-    # Memory
-    ("Memory", "content"): VectorCollection.MEMORY_CONTENT,
-    ("Memory", "summary"): VectorCollection.MEMORY_SUMMARY,
-    # Grammar
-    ("Grammar", "usage"): VectorCollection.GRAMMAR_USAGE,
-    ("Grammar", "name"): VectorCollection.GRAMMAR_NAME,
-    # Vocab
-    ("Vocab", "usage"): VectorCollection.VOCAB_USAGE,
-    ("Vocab", "name"): VectorCollection.VOCAB_NAME,
-    
-    # Mistake
-    ("Mistake", "question"): VectorCollection.MISTAKE_QUESTION,
-    ("Mistake", "answer"): VectorCollection.MISTAKE_ANSWER,
-    ("Mistake", "correct_answer"): VectorCollection.MISTAKE_CORRECT_ANSWER,
-    ("Mistake", "error_reason"): VectorCollection.MISTAKE_ERROR_REASON,
-
-    # Story
-    ("Story", "content"): VectorCollection.STORY_CONTENT,
-    ("Story", "summary"): VectorCollection.STORY_SUMMARY,
-    ("Story", "category"): VectorCollection.STORY_CATEGORY,
-
-} 
\ No newline at end of file
+    (model, field): collection
+    for model, collection in (
+        ("Memory", VectorCollection.MEMORY),
+        ("Grammar", VectorCollection.GRAMMAR),
+        ("Vocab", VectorCollection.VOCAB),
+        ("Mistake", VectorCollection.MISTAKE),
+        ("Story", VectorCollection.STORY),
+    )
+    for field in COLLECTION_VECTORS[collection]
+}
+
+# 迁移前的 (model, field) -> collection 名, 由 scripts/migrate_named_vectors 读取
+LEGACY_FIELD_COLLECTIONS: Dict[Tuple[str, str], str] = {
+    ("Memory", "content"): "memory_content",
+    ("Memory", "summary"): "memory_summary",
+    ("Grammar", "usage"): "grammar_usage",
+    ("Grammar", "name"): "grammar_name",
+    ("Vocab", "usage"): "vocab_usage",
+    ("Vocab", "name"): "vocab_name",
+    ("Mistake", "question"): "mistake_question",
+    ("Mistake", "answer"): "mistake_answer",
+    ("Mistake", "correct_answer"): "mistake_correct_answer",
+    ("Mistake", "error_reason"): "mistake_error_reason",
+    ("Story", "content"): "story_content",
+    ("Story", "summary"): "story_summary",
+    ("Story", "category"): "story_category",
+}
@@ -1,31 +1,55 @@
 from __future__ import annotations
 
+import hashlib
 import uuid
 from datetime import datetime,timezone
-from typing import Any, Dict, Sequence
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import VectorParams
 
-from app.core.vector.embeddings import get_embedding
 from app.core.vector.payload import VectorPayload
 from app.core.vector.provider import get_qdrant_client
-from app.core.vector.session import VectorSession
 
-from .collections import COLLECTIONS_CONFIG, MODEL_FIELD_TO_COLLECTION, VectorCollection
+from .collections import (
+    COLLECTIONS_CONFIG,
+    HNSW_CONFIG,
+    MODEL_FIELD_TO_COLLECTION,
+    PAYLOAD_INDEXES,
+    VectorCollection,
+    vector_dimension,
+)
+
+
 
+# 创建一个 collection (multitenant HNSW + payload index)
+def create_vector_collection(client: QdrantClient, name: str, params: Dict[str, VectorParams]) -> None:
+    """Create collection ``name`` with the named vectors ``params`` and the shared payload indexes."""
+    client.create_collection(collection_name=name, vectors_config=params, hnsw_config=HNSW_CONFIG)
+    for field_name, schema in PAYLOAD_INDEXES.items():
+        client.create_payload_index(collection_name=name, field_name=field_name, field_schema=schema)
 
 
 # 创建Qdrant collection
-def ensure_collections_exist() -> None:
-    """Create all defined Qdrant collections if they are missing."""
-    client = get_qdrant_client()
+def ensure_collections_exist(client: Optional[QdrantClient] = None) -> None:
+    """Create missing Qdrant collections (multitenant HNSW) and missing payload indexes."""
+    client = client or get_qdrant_client()
     for collection, params in COLLECTIONS_CONFIG.items():
         name = collection.value
         if not client.collection_exists(name):
-            client.create_collection(collection_name=name, vectors_config=params)
+            create_vector_collection(client, name, params)
+            continue
+        # 已有 collection 只补建 index; HNSW 配置的修改会触发重建, 需要手动 update_collection
+        # 向量维度的修改用 scripts/reindex_vectors 迁移
+        indexed = client.get_collection(name).payload_schema or {}
+        for field_name, schema in PAYLOAD_INDEXES.items():
+            if field_name not in indexed:
+                client.create_payload_index(collection_name=name, field_name=field_name, field_schema=schema)
 
 
 # 构建Qdrant point
-def _build_point(vector: Sequence[float], payload_extra: Dict[str, Any], origin_id: int) -> Dict[str, Any]:
-    """Internal helper to build a Qdrant point dict."""
+def _build_point(vectors: Dict[str, Sequence[float]], payload_extra: Dict[str, Any], origin_id: int) -> Dict[str, Any]:
+    """Internal helper to build a Qdrant point dict with named vectors."""
     base_payload = VectorPayload(
         user_id=payload_extra["user_id"],
         created_at=int(datetime.now().timestamp()),
@@ -34,74 +58,52 @@ def _build_point(vector: Sequence[float], payload_extra: Dict[str, Any], origin_
     payload = base_payload | payload_extra  # type: ignore[operator]
     return {
         "id": origin_id,
-        "vector": vector,
+        "vector": dict(vectors),
         "payload": payload,
     }
 
 
-# 将ORM实例中的可向量化字段进行向量化x
-def queue_vector_from_instance(
-    instance: Any,
-    session: VectorSession,
-) -> None:
-    """Scan the given ORM instance and queue vector operations for all mappable fields.
+# 模型对应的 collection (没有向量字段时为 None)
+def collection_for_model(model_name: str) -> Optional[VectorCollection]:
+    """Return the collection that stores the named vectors of the given model."""
+    for (mapped_model, _field_name), collection in MODEL_FIELD_TO_COLLECTION.items():
+        if mapped_model == model_name:
+            return collection
+    return None
 
-    This will automatically look up the mapping in ``MODEL_FIELD_TO_COLLECTION`` and
-    call the OpenAI embedding API for each matched field.
 
-    Args:
-        instance: SQLAlchemy ORM instance containing text fields.
-        session: Active ``VectorSession`` used to queue operations.
-    """
+# 取出ORM实例中需要向量化的字段 (不调用 embedding)
+def vector_fields(instance: Any) -> List[Tuple[VectorCollection, str, str]]:
+    """Return ``(collection, vector name, text)`` for every non-empty mapped field of the instance."""
     model_name = instance.__class__.__name__
-
-    # 遍历MODEL_FIELD_TO_COLLECTION中的映射关系, 将ORM实例中的可向量化字段进行向量化
+    fields: List[Tuple[VectorCollection, str, str]] = []
     for (mapped_model, field_name), collection in MODEL_FIELD_TO_COLLECTION.items():
         if mapped_model != model_name:
             continue
-
         text_value = getattr(instance, field_name, None)
         if not text_value:
             # 跳过空值或缺失值
             continue
+        fields.append((collection, field_name, str(text_value)))
+    return fields
 
-        # 获取embedding(OpenAI API)
-        vector = get_embedding(str(text_value))
-        origin_id = getattr(instance, "id", None)
-        if origin_id is None:
-            raise ValueError("origin_id is None")
-        # 构建payload和point
-        payload_extra = {
-            "user_id": getattr(instance, "user_id", 0),  # 如果user_id不存在, 则使用0
-            "model": model_name,
-            "field": field_name,
-            "origin_id": origin_id,
-        }
-        point = _build_point(vector, payload_extra, origin_id)
-
-        # 将point添加到vector session中
-        session.add_point(collection.value, point)
-# --------------------------------------------------------------
-# 删除操作: 从 Qdrant 中删除与 ORM 实例关联的全部向量
-# --------------------------------------------------------------
-
-
-def queue_vector_delete_for_instance(
-    instance: Any,
-    session: VectorSession,
-) -> None:
-    """Queue deletion of all vector points associated with the given ORM instance.
-
-    根据 ``MODEL_FIELD_TO_COLLECTION`` 的映射，通过 `origin_id` 来删除。
-    """
 
-    model_name = instance.__class__.__name__
-    origin_id = getattr(instance, "id", None)
-    if origin_id is None:
-        return
+# 文本的 hash, 保存在 payload 中, 用于判断字段是否需要重新 embedding
+def content_hash(text: str) -> str:
+    """Return the hash of the embedded text stored in the point payload."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-    for (mapped_model, _field_name), collection in MODEL_FIELD_TO_COLLECTION.items():
-        if mapped_model != model_name:
-            continue
 
-        session.delete_by_ids(collection.value, [origin_id]) 
\ No newline at end of file
+# 构建 payload 中的附加字段 (一行一个 point, 字段的 hash 放在 content_hash 中)
+def payload_for(instance: Any) -> Dict[str, Any]:
+    """Return the extra payload stored with the point of ``instance``."""
+    origin_id = getattr(instance, "id", None)
+    if origin_id is None:
+        raise ValueError("origin_id is None")
+    return {
+        "user_id": getattr(instance, "user_id", 0),  # 如果user_id不存在, 则使用0
+        "model": instance.__class__.__name__,
+        "origin_id": origin_id,
+        # 有 payload index, 可按语言过滤
+        "language": getattr(instance, "language", None),
+    }
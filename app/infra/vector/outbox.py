@@ -0,0 +1,476 @@
+"""
+Transactional outbox for SQL -> Qdrant synchronization.
+
+SQL と同(おな)じ transaction で outbox に書(か)き込(こ)み、背景(はいけい)の worker が Qdrant に反映(はんえい)します。
+
+- ``enqueue_vector_upsert`` / ``enqueue_vector_delete``: 业务写入的同一个 DB 事务中追加 outbox 行
+- ``VectorSyncWorker``: 批量取出 outbox 行, 批量 embedding + bulk upsert / delete, 失败按指数退避重试
+- 事务提交后向 Redis stream 发布 (model, id, fields) 任务, worker 被立即唤醒 (stream 丢失时退化为轮询)
+- 请求不再等待 embedding 与 Qdrant, 两边最终一致
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import redis.asyncio as redis
+
+from dotenv import load_dotenv
+from qdrant_client.http.models import PointStruct
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.core.db import get_async_session_maker, pin_primary
+from app.core.metrics import counter, gauge, histogram
+from app.core.vector.embeddings import EMBEDDING_BATCH_SIZE, get_embeddings
+from app.core.redis import get_redis_client
+from app.core.vector.provider import get_qdrant_client
+from app.core.tracing import span
+from app.infra.models import Grammar, Memory, Mistake, Story, Vocab, VectorOutbox
+
+from .collections import MODEL_FIELD_TO_COLLECTION, VectorCollection, vector_dimension
+from .operations import _build_point, collection_for_model, content_hash, payload_for, vector_fields
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return str(os.getenv(name, default)).strip().lower() in {"1", "true", "yes", "on"}
+
+
+VECTOR_SYNC_ENABLED = _env_bool("VECTOR_SYNC_ENABLED", "true")
+# 没有待处理任务时的轮询间隔 (秒)
+VECTOR_SYNC_INTERVAL = float(os.getenv("VECTOR_SYNC_INTERVAL", "1.0"))
+VECTOR_SYNC_BATCH_SIZE = int(os.getenv("VECTOR_SYNC_BATCH_SIZE", "64"))
+# 超过次数的行保留在表中 (dead letter), 不再自动重试
+VECTOR_SYNC_MAX_ATTEMPTS = int(os.getenv("VECTOR_SYNC_MAX_ATTEMPTS", "8"))
+VECTOR_SYNC_BACKOFF_MAX = float(os.getenv("VECTOR_SYNC_BACKOFF_MAX", "300"))
+# 认领后多久没有完成 (worker 崩溃) 就允许其他 worker 重试 (秒); 应大于一个批次的 embedding + Qdrant 耗时
+VECTOR_SYNC_CLAIM_TIMEOUT = float(os.getenv("VECTOR_SYNC_CLAIM_TIMEOUT", "300"))
+# 提交后发布任务的 Redis stream (近似裁剪到 MAXLEN 条)
+VECTOR_SYNC_STREAM = os.getenv("VECTOR_SYNC_STREAM", "vounica:vector_sync")
+VECTOR_SYNC_STREAM_MAXLEN = int(os.getenv("VECTOR_SYNC_STREAM_MAXLEN", "10000"))
+
+OUTBOX_PROCESSED = counter("vounica_vector_outbox_processed_total", "Outbox rows synced to Qdrant", labelnames=("op",))
+OUTBOX_FAILURES = counter("vounica_vector_outbox_failures_total", "Outbox rows that failed and were rescheduled", labelnames=("model",))
+OUTBOX_DEAD = counter("vounica_vector_outbox_dead_total", "Outbox rows that reached VECTOR_SYNC_MAX_ATTEMPTS", labelnames=("model",))
+# worker 对 Qdrant 的 bulk 写入 (每个 collection 一次 upsert / delete)
+VECTOR_OPERATIONS = counter(
+    "vounica_vector_operations_total", "Bulk Qdrant writes made by the vector sync worker", labelnames=("op", "collection")
+)
+VECTOR_POINTS = counter(
+    "vounica_vector_points_total", "Points upserted / deleted by the vector sync worker", labelnames=("op", "collection")
+)
+VECTOR_WRITE_SECONDS = histogram(
+    "vounica_vector_write_duration_seconds", "Latency of one bulk Qdrant upsert / delete", labelnames=("op", "collection")
+)
+EMBEDDING_SKIPPED = counter("vounica_embedding_skipped_total", "Texts not re-embedded because their content hash is unchanged")
+# 最旧的待处理 outbox 行距今的秒数 (每个批次更新, 空闲时为 0)
+INDEX_LAG = gauge("vounica_vector_index_lag_seconds", "Age of the oldest pending outbox row")
+
+# outbox 中的 model 名 -> ORM class
+SYNC_MODELS: Dict[str, Any] = {m.__name__: m for m in (Vocab, Grammar, Memory, Mistake, Story)}
+
+# session.info: 本事务写入的任务 / 已提交、等待发布到 stream 的任务
+PENDING_JOBS = "vounica_vector_jobs"
+COMMITTED_JOBS = "vounica_vector_jobs_committed"
+
+
+@contextmanager
+def _qdrant_write(op: str, collection: str, points: int) -> Iterator[None]:
+    """Span + metrics around one bulk Qdrant write of the worker."""
+    start = time.perf_counter()
+    try:
+        with span(f"vector.{op}", collection=collection, points=points):
+            yield
+    finally:
+        VECTOR_OPERATIONS.inc(op=op, collection=collection)
+        VECTOR_POINTS.inc(points, op=op, collection=collection)
+        VECTOR_WRITE_SECONDS.observe(time.perf_counter() - start, op=op, collection=collection)
+
+
+# ------------------------------------------------------------------
+# Producer side (same transaction as the business write)
+# ------------------------------------------------------------------
+
+def _enqueue(db: AsyncSession, instance: Any, op: str, changed: Optional[Iterable[str]] = None) -> None:
+    model_name = instance.__class__.__name__
+    origin_id = getattr(instance, "id", None)
+    mapped = [f for (m, f) in MODEL_FIELD_TO_COLLECTION if m == model_name]
+    # 没有向量字段的模型, 或尚未 flush 的实例, 不需要同步
+    if origin_id is None or not mapped:
+        return
+    # 只更新了非向量字段 (例如 priority / correct_rate) 时不入队
+    if changed is not None:
+        changed = set(changed)
+        mapped = [f for f in mapped if f in changed]
+        if not mapped:
+            return
+    fields = ",".join(mapped)
+    db.info.setdefault(PENDING_JOBS, []).append({"model": model_name, "id": origin_id, "op": op, "fields": fields})
+    db.add(
+        VectorOutbox(
+            model=model_name,
+            origin_id=origin_id,
+            user_id=getattr(instance, "user_id", None),
+            op=op,
+        )
+    )
+
+
+def enqueue_vector_upsert(db: AsyncSession, instance: Any, changed: Optional[Iterable[str]] = None) -> None:
+    """
+    Record that the vectors of ``instance`` must be (re)built, in the current DB transaction.
+
+    ``changed`` 为本次更新的字段名; 不含向量字段时跳过。实际是否重新 embedding 由 content_hash 决定。
+    """
+    _enqueue(db, instance, "upsert", changed)
+
+
+def enqueue_vector_delete(db: AsyncSession, instance: Any) -> None:
+    """Record that the vectors of ``instance`` must be deleted, in the current DB transaction."""
+    _enqueue(db, instance, "delete")
+
+
+@event.listens_for(Session, "after_commit")
+def _jobs_committed(session: Session) -> None:
+    jobs = session.info.pop(PENDING_JOBS, None)
+    if jobs:
+        session.info.setdefault(COMMITTED_JOBS, []).extend(jobs)
+
+
+@event.listens_for(Session, "after_rollback")
+def _jobs_rolled_back(session: Session) -> None:
+    session.info.pop(PENDING_JOBS, None)
+
+
+async def publish_vector_jobs(db: AsyncSession, client: redis.Redis) -> int:
+    """
+    Publish committed outbox jobs of this session to the Redis stream.
+
+    只是唤醒 worker 的通知; 失败时任务仍在 outbox 中, 由轮询处理, 因此不抛出异常。
+    """
+    jobs = db.info.pop(COMMITTED_JOBS, None)
+    if not jobs:
+        return 0
+    try:
+        async with client.pipeline(transaction=False) as pipe:
+            for job in jobs:
+                pipe.xadd(VECTOR_SYNC_STREAM, job, maxlen=VECTOR_SYNC_STREAM_MAXLEN, approximate=True)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning("Vector job publish failed: %s", e)
+        return 0
+    return len(jobs)
+
+
+async def ensure_outbox_table(engine: AsyncEngine) -> None:
+    """Create the outbox table on databases initialized before it existed."""
+    async with engine.begin() as conn:
+        await conn.run_sync(VectorOutbox.__table__.create, checkfirst=True)
+
+
+# ------------------------------------------------------------------
+# Worker side
+# ------------------------------------------------------------------
+
+@dataclass
+class _Job:
+    """All outbox rows of one (model, origin_id) in a batch; the newest row decides the op."""
+
+    model: str
+    origin_id: int
+    op: str
+    # (outbox 行 id, 认领后的 attempts); 认领事务提交后 ORM 对象已过期, 之后只按 id 更新
+    rows: List[Tuple[int, int]] = field(default_factory=list)
+    collection: Optional[str] = None
+    # upsert 时的 payload 与 vector 名 -> 文本 (在事件循环线程中从 ORM 实例取出)
+    payload: Dict[str, Any] = field(default_factory=dict)
+    texts: Dict[str, str] = field(default_factory=dict)
+
+
+class VectorSyncWorker:
+    """
+    Drain the outbox in batches: embed, bulk upsert / delete in Qdrant, retry failures.
+
+    outbox を batch で取(と)り出(だ)し、Qdrant へ同期(どうき)します。
+    """
+
+    def __init__(
+        self,
+        session_maker: Optional[async_sessionmaker] = None,
+        client: Any = None,
+        embed: Callable[[List[str], int], List[Sequence[float]]] = get_embeddings,
+        *,
+        redis_client: Optional[redis.Redis] = None,
+        batch_size: int = VECTOR_SYNC_BATCH_SIZE,
+        embed_batch_size: int = EMBEDDING_BATCH_SIZE,
+        interval: float = VECTOR_SYNC_INTERVAL,
+        max_attempts: int = VECTOR_SYNC_MAX_ATTEMPTS,
+        claim_timeout: float = VECTOR_SYNC_CLAIM_TIMEOUT,
+    ) -> None:
+        # 默认在运行时获取, lifespan 之后才初始化
+        self._session_maker = session_maker
+        self._client = client
+        # embed(texts, dimensions) 接收多个文本, 一次 API 调用最多 embed_batch_size 个
+        self._embed = embed
+        # 为 None 时只轮询
+        self._redis = redis_client
+        self._stream_id = "$"
+        self.batch_size = batch_size
+        self.embed_batch_size = embed_batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.claim_timeout = claim_timeout
+
+    async def run(self) -> None:
+        """Process batches until cancelled; sleep only when the outbox is drained."""
+        while True:
+            try:
+                processed = await self.run_once()
+            except Exception:
+                logger.exception("Vector sync failed")
+                processed = 0
+            if processed < self.batch_size:
+                await self._wait()
+
+    async def run_once(self) -> int:
+        """Sync one batch; return the number of outbox rows handled."""
+        maker = self._session_maker or get_async_session_maker()
+        async with maker() as db:
+            # 刚提交的业务数据可能还没有同步到 replica
+            pin_primary(db)
+            rows = await self._claim(db)
+            INDEX_LAG.set(
+                max((datetime.now() - min(r.created_at for r in rows)).total_seconds(), 0.0) if rows else 0.0
+            )
+            if not rows:
+                return 0
+            jobs = await self._load(db, rows)
+            # 认领与读取在第一个短事务中完成; 提交后连接回到 pool, embedding / Qdrant 调用期间不持有事务
+            await db.commit()
+            # embedding 与 Qdrant client 都是同步调用, 放到线程中避免阻塞请求
+            failed = await asyncio.to_thread(self._sync, jobs)
+            # 第二个短事务: 删除完成的行, 失败的行按退避重新安排
+            await self._finish(db, jobs, failed)
+            await db.commit()
+        return len(rows)
+
+    # Internal helpers
+
+    async def _wait(self) -> None:
+        # 阻塞读取 stream, 有新任务时立即返回; 超时即相当于一次轮询
+        if self._redis is None:
+            await asyncio.sleep(self.interval)
+            return
+        try:
+            entries = await self._redis.xread(
+                {VECTOR_SYNC_STREAM: self._stream_id}, count=self.batch_size, block=int(self.interval * 1000)
+            )
+        except Exception as e:
+            logger.warning("Vector job stream read failed: %s", e)
+            await asyncio.sleep(self.interval)
+            return
+        for _stream, messages in entries or []:
+            if messages:
+                self._stream_id = messages[-1][0]
+
+    async def _claim(self, db: AsyncSession) -> List[VectorOutbox]:
+        stmt = (
+            select(VectorOutbox)
+            .where(
+                VectorOutbox.available_at <= datetime.now(),
+                VectorOutbox.attempts < self.max_attempts,
+            )
+            .order_by(VectorOutbox.id)
+            .limit(self.batch_size)
+            # 多个 worker (多个 uvicorn 进程) 同时运行时互不等待; sqlite 忽略该子句
+            .with_for_update(skip_locked=True)
+        )
+        rows = list((await db.execute(stmt)).scalars().all())
+        # 认领: 提交后其他 worker 在 claim_timeout 内不会再取到这些行; 崩溃时算作一次失败
+        claimed_until = datetime.now() + timedelta(seconds=self.claim_timeout)
+        for row in rows:
+            row.attempts += 1
+            row.available_at = claimed_until
+        return rows
+
+    async def _load(self, db: AsyncSession, rows: List[VectorOutbox]) -> List[_Job]:
+        # 同一对象的多次写入合并为一次, 以最新的 op 为准
+        jobs: Dict[Tuple[str, int], _Job] = {}
+        for row in rows:
+            job = jobs.setdefault((row.model, row.origin_id), _Job(row.model, row.origin_id, row.op))
+            job.op = row.op
+            collection = collection_for_model(row.model)
+            job.collection = collection.value if collection is not None else None
+            job.rows.append((row.id, row.attempts))
+
+        wanted: Dict[str, List[int]] = defaultdict(list)
+        for job in jobs.values():
+            if job.op == "upsert" and job.model in SYNC_MODELS:
+                wanted[job.model].append(job.origin_id)
+
+        for model_name, ids in wanted.items():
+            Model = SYNC_MODELS[model_name]
+            instances = {i.id: i for i in (await db.execute(select(Model).where(Model.id.in_(ids)))).scalars()}
+            for origin_id in ids:
+                job = jobs[(model_name, origin_id)]
+                instance = instances.get(origin_id)
+                if instance is None:
+                    # 已被删除 (delete 行可能在后续批次中), 直接清理向量
+                    job.op = "delete"
+                    continue
+                job.payload = payload_for(instance)
+                job.texts = {name: text for _collection, name, text in vector_fields(instance)}
+        return list(jobs.values())
+
+    def _sync(self, jobs: List[_Job]) -> Dict[int, str]:
+        """Run in a thread; return ``{job index: error}`` for jobs that must be retried."""
+        client = self._client or get_qdrant_client()
+        failed: Dict[int, str] = {}
+
+        # 需要重写 point 的任务 / collection -> [(job index, origin id)]
+        writes: List[int] = []
+        deletes: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        # 一行一个 point: 未变更的字段沿用已存储的向量, 只 embedding 变更的字段
+        stored = self._stored(client, jobs)
+        vectors: Dict[int, Dict[str, Sequence[float]]] = defaultdict(dict)
+        hashes: Dict[int, Dict[str, str]] = {}
+        # 整个批次需要 embedding 的文本, 按维度分组: dimensions -> [(job index, vector 名, text)]
+        pending: Dict[int, List[Tuple[int, str, str]]] = defaultdict(list)
+        for index, job in enumerate(jobs):
+            if job.collection is None:
+                continue
+            if job.op == "delete" or not job.texts:
+                deletes[job.collection].append((index, job.origin_id))
+                continue
+            record = stored.get((job.collection, job.origin_id))
+            old_hashes = ((record.payload or {}).get("content_hash") or {}) if record else {}
+            old_vectors = record.vector if record is not None and isinstance(record.vector, dict) else {}
+            hashes[index] = {name: content_hash(text) for name, text in job.texts.items()}
+            if hashes[index] == old_hashes and set(old_vectors) == set(job.texts):
+                # 全部字段未变更, 不需要写入
+                EMBEDDING_SKIPPED.inc(len(job.texts))
+                continue
+            writes.append(index)
+            collection = VectorCollection(job.collection)
+            for name, text in job.texts.items():
+                dimensions = vector_dimension(collection, name)
+                # 维度配置变更后 (reindex 前) 的旧向量不能沿用
+                if (
+                    old_hashes.get(name) == hashes[index][name]
+                    and name in old_vectors
+                    and len(old_vectors[name]) == dimensions
+                ):
+                    vectors[index][name] = old_vectors[name]
+                    EMBEDDING_SKIPPED.inc()
+                else:
+                    pending[dimensions].append((index, name, text))
+
+        # 跨任务合并相同维度的文本, 每 embed_batch_size 个调用一次 embedding API
+        for dimensions, texts in pending.items():
+            for start in range(0, len(texts), self.embed_batch_size):
+                chunk = texts[start:start + self.embed_batch_size]
+                try:
+                    embedded = self._embed([text for _, _, text in chunk], dimensions)
+                except Exception as e:
+                    failed.update({index: repr(e) for index, _, _ in chunk})
+                    continue
+                for (index, name, _text), vector in zip(chunk, embedded):
+                    vectors[index][name] = vector
+
+        upserts: Dict[str, List[int]] = defaultdict(list)
+        for index in writes:
+            if index not in failed:
+                upserts[jobs[index].collection].append(index)
+
+        # 每个 collection 一次 bulk 调用; 失败时该 collection 涉及的任务全部重试
+        for name, indexes in upserts.items():
+            points = [
+                PointStruct(**_build_point(vectors[i], jobs[i].payload | {"content_hash": hashes[i]}, jobs[i].origin_id))
+                for i in indexes
+            ]
+            try:
+                with _qdrant_write("upsert", name, len(points)):
+                    client.upsert(collection_name=name, points=points)
+            except Exception as e:
+                failed.update({i: repr(e) for i in indexes})
+        for name, items in deletes.items():
+            try:
+                with _qdrant_write("delete", name, len(items)):
+                    client.delete(collection_name=name, points_selector=[origin_id for _, origin_id in items])
+            except Exception as e:
+                failed.update({i: repr(e) for i, _ in items})
+        return failed
+
+    def _stored(self, client: Any, jobs: List[_Job]) -> Dict[Tuple[str, int], Any]:
+        """Fetch the stored points (content_hash and vectors) of the upsert jobs."""
+        ids_by_collection: Dict[str, List[int]] = defaultdict(list)
+        for job in jobs:
+            if job.collection is not None and job.op == "upsert" and job.texts:
+                ids_by_collection[job.collection].append(job.origin_id)
+
+        stored: Dict[Tuple[str, int], Any] = {}
+        for name, ids in ids_by_collection.items():
+            try:
+                with span("vector.retrieve", collection=name, points=len(ids)):
+                    points = client.retrieve(
+                        collection_name=name, ids=ids, with_payload=["content_hash"], with_vectors=True
+                    )
+            except Exception as e:
+                # 查不到时按全部变更处理
+                logger.warning("Vector hash lookup failed: %s", e)
+                continue
+            for point in points:
+                stored[(name, int(point.id))] = point
+        return stored
+
+    async def _finish(self, db: AsyncSession, jobs: List[_Job], failed: Dict[int, str]) -> None:
+        now = datetime.now()
+        done: List[int] = []
+        for index, job in enumerate(jobs):
+            error = failed.get(index)
+            if error is None:
+                OUTBOX_PROCESSED.inc(len(job.rows), op=job.op)
+                done.extend(row_id for row_id, _attempts in job.rows)
+                continue
+            OUTBOX_FAILURES.inc(len(job.rows), model=job.model)
+            # attempts 已在认领时增加
+            for row_id, attempts in job.rows:
+                await db.execute(
+                    update(VectorOutbox)
+                    .where(VectorOutbox.id == row_id)
+                    .values(
+                        last_error=error[:1000],
+                        available_at=now + timedelta(seconds=min(2 ** attempts, VECTOR_SYNC_BACKOFF_MAX)),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                if attempts >= self.max_attempts:
+                    OUTBOX_DEAD.inc(model=job.model)
+        if done:
+            await db.execute(
+                delete(VectorOutbox).where(VectorOutbox.id.in_(done)).execution_options(synchronize_session=False)
+            )
+
+
+def start_vector_sync_worker(worker: Optional[VectorSyncWorker] = None) -> asyncio.Task | None:
+    """
+    Start the background vector sync worker unless VECTOR_SYNC_ENABLED is false.
+
+    也可以设 VECTOR_SYNC_ENABLED=false, 用 ``python -m scripts.vector_sync_worker`` 在独立进程中运行。
+    """
+    if not VECTOR_SYNC_ENABLED:
+        return None
+    return asyncio.create_task((worker or VectorSyncWorker(redis_client=get_redis_client())).run())
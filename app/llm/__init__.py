@@ -1,8 +1,19 @@
-from .client import chat_completion, embed
-from .models import LLMModel
+from .client import chat_completion, embed, set_chat_model
+from .fake import ScriptedChatModel, make_fake_chat_model
+from .models import LLMModel, LLM_PROVIDER
+from .quota import QUOTA_CHARGED_TAG, QuotaCallbackHandler, estimate_tokens
+from .tracing import TracingCallbackHandler
 
 __all__ = [
     "chat_completion",
     "embed",
+    "set_chat_model",
+    "ScriptedChatModel",
+    "make_fake_chat_model",
     "LLMModel",
+    "LLM_PROVIDER",
+    "QUOTA_CHARGED_TAG",
+    "QuotaCallbackHandler",
+    "estimate_tokens",
+    "TracingCallbackHandler",
 ] 
\ No newline at end of file
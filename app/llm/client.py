@@ -1,14 +1,19 @@
 from __future__ import annotations
 
 import os
-from typing import Any, Dict, List
+import time
+from typing import Any, Dict, List, Optional
 
 from dotenv import load_dotenv
 from openai.types.create_embedding_response import CreateEmbeddingResponse
 from langchain_core.messages import BaseMessage
+from app.core.tracing import span
+from app.core.vector.embeddings import OpenAIEmbeddingProvider, embedding_call, get_embedding, get_embedding_provider
 from app.infra.context import uow_ctx
+from app.llm.metrics import record_llm_call
 from app.llm.models import LLMModel
-from langchain_core.language_models import LanguageModelInput
+from app.llm.quota import QUOTA_CHARGED_TAG, estimate_tokens
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
 from langchain_openai import ChatOpenAI
 from openai import OpenAI
 load_dotenv()
@@ -25,6 +30,14 @@ MODEL_MAP = {
     LLMModel.LOW: ChatOpenAI(model=LLMModel.LOW.model_name),
 }
 OPENAI_NAVITE_CLIENT = OpenAI(api_key=OPENAI_API_KEY)
+
+
+def set_chat_model(model: BaseChatModel, model_type: Optional[LLMModel] = None) -> None:
+    """Replace the chat model of ``model_type`` (every chat tier when ``None``), e.g. with a fake model."""
+    for key in ([model_type] if model_type is not None else list(MODEL_MAP)):
+        MODEL_MAP[key] = model
+
+
 class OpenAIClient:
     """OpenAI API客户端封装"""
     # 聊天补全接口
@@ -34,12 +47,24 @@ class OpenAIClient:
         调用聊天补全API并返回原始响应
         """
         uow = uow_ctx.get()
-        # 检查用户token余额是否大于0
-        await uow.quota.check()
-        # 调用API并返回结果, 并计算token使用量
-        response: BaseMessage = MODEL_MAP[model_type].invoke(input, **kwargs)
-        # 消费token
-        await uow.quota.consume(int(response.response_metadata['token_usage']['total_tokens']) * model_type.price)
+        with span("llm.chat", model=model_type.model_name, tier=model_type.name) as chat_span:
+            # 预检: 余额至少能支付输入部分 (输出长度无法预知)
+            await uow.quota.check(need=estimate_tokens(input) * model_type.price)
+            # 在 agent graph 中被调用时, 标记为已计费, 避免 QuotaCallbackHandler 重复扣除
+            config = dict(kwargs.pop("config", None) or {})
+            config["tags"] = [*(config.get("tags") or []), QUOTA_CHARGED_TAG]
+            # 调用API并返回结果, 并计算token使用量 (异步调用, 等待期间不阻塞事件循环)
+            start = time.perf_counter()
+            try:
+                response: BaseMessage = await MODEL_MAP[model_type].ainvoke(input, config=config, **kwargs)
+            except Exception:
+                record_llm_call(time.perf_counter() - start, model=model_type.model_name, tier=model_type.name, status="error")
+                raise
+            record_llm_call(time.perf_counter() - start, response, model=model_type.model_name, tier=model_type.name)
+            total_tokens = int(response.response_metadata['token_usage']['total_tokens'])
+            chat_span.set_attribute("total_tokens", total_tokens)
+            # 消费token
+            await uow.quota.consume(total_tokens * model_type.price)
         # 返回结果
         return response
     
@@ -67,10 +92,15 @@ class OpenAIClient:
         uow = uow_ctx.get()
         # 检查用户token余额是否大于0
         await uow.quota.check()
+        # 本地后端 (EMBEDDING_PROVIDER=hash) 不调用 API, 也不消费 token
+        provider = get_embedding_provider()
+        if not isinstance(provider, OpenAIEmbeddingProvider):
+            return get_embedding(text, kwargs.get("dimensions"))
         # 确定使用的嵌入模型
         model = model_type.model_name
         # 调用嵌入API并返回向量
-        resp: CreateEmbeddingResponse = OPENAI_NAVITE_CLIENT.embeddings.create(model=model, input=text, **kwargs)
+        with embedding_call("openai", 1, kwargs.get("dimensions"), model=model):
+            resp: CreateEmbeddingResponse = OPENAI_NAVITE_CLIENT.embeddings.create(model=model, input=text, **kwargs)
         # 消费token
         await uow.quota.consume(resp.usage.total_tokens * model_type.price)
         # 返回结果
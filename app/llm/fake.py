@@ -0,0 +1,220 @@
+"""
+Scripted fake chat model that replays recorded tool-call trajectories.
+
+OpenAI を呼(よ)ばずに、記録(きろく)した tool call の流(なが)れを再生(さいせい)する chat model です。
+Agent の orchestration（graph / event stream / tool / DB）のオーバーヘッドだけを測(はか)るために使(つか)います。
+
+Trajectory file (JSON)::
+
+    {"trajectories": [
+        {"name": "question", "match": "Question Generation Agent", "turns": [
+            {"tool_calls": [{"name": "search_resource", "args": {...}}]},
+            {"content": "...", "usage": {"input_tokens": 1200, "output_tokens": 40, "cached_tokens": 1024}}
+        ]}
+    ]}
+
+- 选择: 按文件顺序, 第一个 ``match`` 出现在任一 system message 中的 trajectory (没有 match 的作为默认)
+- 步骤: 最后一条 system message 之后已有的 AI message 数 (record 的三个阶段共享 thread, 也能正确计数)
+- 超出 turns 时返回不带 tool call 的空回答, graph 随之结束
+- usage 未指定时按字符数 / 4 估算 token
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from dotenv import load_dotenv
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field
+
+load_dotenv()
+
+# 默认的 trajectory 文件 (覆盖 question / record 的各阶段与 error reason)
+DEFAULT_TRAJECTORY_FILE = Path(__file__).with_name("fake_trajectories.json")
+LLM_FAKE_SCRIPT = os.getenv("LLM_FAKE_SCRIPT", str(DEFAULT_TRAJECTORY_FILE))
+# 每次调用到第一个 token 的延迟, 与之后每个 chunk 的间隔 (毫秒)
+LLM_FAKE_LATENCY_MS = float(os.getenv("LLM_FAKE_LATENCY_MS", "300"))
+LLM_FAKE_CHUNK_LATENCY_MS = float(os.getenv("LLM_FAKE_CHUNK_LATENCY_MS", "20"))
+# 估算 usage 时 prompt 中命中 prompt cache 的比例
+LLM_FAKE_CACHED_RATIO = float(os.getenv("LLM_FAKE_CACHED_RATIO", "0.0"))
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _text(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else json.dumps(message.content, ensure_ascii=False)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that answers with the next turn of a matching trajectory."""
+
+    trajectories: List[Dict[str, Any]] = Field(default_factory=list)
+    latency: float = 0.0
+    chunk_latency: float = 0.0
+    chunk_size: int = 8
+    cached_ratio: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    # create_react_agent 会绑定工具; 回答由 trajectory 决定, 这里不需要工具 schema
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "ScriptedChatModel":
+        return self
+
+    # Internal helpers
+
+    def _turn(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+        system = [i for i, m in enumerate(messages) if isinstance(m, SystemMessage)]
+        prompt = "\n".join(_text(messages[i]) for i in system)
+        trajectory: Optional[Dict[str, Any]] = None
+        for candidate in self.trajectories:
+            match = candidate.get("match")
+            if match is None or match in prompt:
+                trajectory = candidate
+                break
+        if trajectory is None:
+            return {}
+        step = sum(isinstance(m, AIMessage) for m in messages[(system[-1] if system else -1) + 1:])
+        turns = trajectory.get("turns", [])
+        return turns[step] if step < len(turns) else {}
+
+    def _message(self, messages: List[BaseMessage]) -> AIMessage:
+        turn = self._turn(messages)
+        content = turn.get("content", "")
+        tool_calls = [
+            {"name": call["name"], "args": call.get("args", {}), "id": f"call_{uuid.uuid4().hex[:24]}", "type": "tool_call"}
+            for call in turn.get("tool_calls", [])
+        ]
+        usage = dict(turn.get("usage") or {})
+        input_tokens = int(usage.get("input_tokens") or sum(_estimate_tokens(_text(m)) for m in messages))
+        output_tokens = int(
+            usage.get("output_tokens")
+            or _estimate_tokens(content + "".join(json.dumps(c["args"], ensure_ascii=False) for c in tool_calls))
+        )
+        cached_tokens = int(usage.get("cached_tokens", input_tokens * self.cached_ratio))
+        return AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+                "input_token_details": {"cache_read": cached_tokens},
+            },
+            # OpenAIClient.chat / consume 从这里读取 token 使用量
+            response_metadata={
+                "model_name": "scripted",
+                "token_usage": {
+                    "prompt_tokens": input_tokens,
+                    "completion_tokens": output_tokens,
+                    "total_tokens": input_tokens + output_tokens,
+                },
+            },
+        )
+
+    def _chunks(self, message: AIMessage) -> List[AIMessageChunk]:
+        content = message.content if isinstance(message.content, str) else ""
+        chunks = [
+            AIMessageChunk(content=content[i:i + self.chunk_size])
+            for i in range(0, len(content), self.chunk_size)
+        ]
+        # tool call 与 usage 放在最后一个 chunk 中 (与 OpenAI 的流式输出相同, 合并后得到完整的 message)
+        chunks.append(AIMessageChunk(
+            content="",
+            tool_call_chunks=[
+                {"name": c["name"], "args": json.dumps(c["args"], ensure_ascii=False), "id": c["id"], "index": i}
+                for i, c in enumerate(message.tool_calls)
+            ],
+            usage_metadata=message.usage_metadata,
+            response_metadata=message.response_metadata,
+        ))
+        return chunks
+
+    # BaseChatModel 接口
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self._message(messages)
+        time.sleep(self.latency + self.chunk_latency * len(self._chunks(message)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self._message(messages)
+        await asyncio.sleep(self.latency + self.chunk_latency * len(self._chunks(message)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for chunk in self._chunks(self._message(messages)):
+            time.sleep(self.chunk_latency)
+            if run_manager and chunk.content:
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(self._message(messages)):
+            await asyncio.sleep(self.chunk_latency)
+            if run_manager and chunk.content:
+                await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+
+def load_trajectories(path: str | Path) -> List[Dict[str, Any]]:
+    """Read the ``trajectories`` list of a trajectory file."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["trajectories"]
+
+
+def make_fake_chat_model(
+    path: str | Path | None = None,
+    *,
+    latency: Optional[float] = None,
+    chunk_latency: Optional[float] = None,
+) -> ScriptedChatModel:
+    """
+    Create a ScriptedChatModel from LLM_FAKE_SCRIPT / LLM_FAKE_LATENCY_MS (arguments override the env).
+
+    環境(かんきょう)変数(へんすう)から fake model を作成(さくせい)します。
+    """
+    return ScriptedChatModel(
+        trajectories=load_trajectories(path or LLM_FAKE_SCRIPT),
+        latency=LLM_FAKE_LATENCY_MS / 1000 if latency is None else latency,
+        chunk_latency=LLM_FAKE_CHUNK_LATENCY_MS / 1000 if chunk_latency is None else chunk_latency,
+        cached_ratio=LLM_FAKE_CACHED_RATIO,
+    )
@@ -0,0 +1,69 @@
+"""
+LLM call metrics: requests, latency and tokens by model, endpoint and agent phase.
+
+LLM 呼(よ)び出(だ)しの回数(かいすう)・時間(じかん)・token 数(すう)を記録(きろく)します（容量(ようりょう)計画(けいかく)とコスト監視(かんし)用(よう)）。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from app.core.metrics import counter, current_endpoint, histogram
+
+# tier: LLMModel 的名字 (HIGH / STANDARD / LOW); agent graph 中的调用没有 tier, 只有 model
+# agent / phase: CoreAgent 子类名与 run_stream_events 的 phase; chat_completion 直接调用时为空
+LLM_LABELS = ("model", "tier", "endpoint", "agent", "phase")
+
+LLM_REQUESTS = counter(
+    "vounica_llm_requests_total",
+    "LLM chat calls",
+    labelnames=(*LLM_LABELS, "status"),
+)
+LLM_REQUEST_SECONDS = histogram(
+    "vounica_llm_request_duration_seconds",
+    "LLM chat call latency (whole response, including streaming)",
+    labelnames=LLM_LABELS,
+)
+LLM_TOKENS = counter(
+    "vounica_llm_tokens_total",
+    "LLM tokens by kind (prompt / cached / completion)",
+    labelnames=(*LLM_LABELS, "kind"),
+)
+
+
+def usage_of(message: Any) -> Dict[str, int]:
+    """Read prompt / cached / completion tokens from ``usage_metadata`` (or OpenAI ``token_usage``)."""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return {
+            "prompt": int(usage.get("input_tokens", 0) or 0),
+            "cached": int((usage.get("input_token_details") or {}).get("cache_read", 0) or 0),
+            "completion": int(usage.get("output_tokens", 0) or 0),
+        }
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    return {
+        "prompt": int(token_usage.get("prompt_tokens", 0) or 0),
+        "cached": 0,
+        "completion": int(token_usage.get("completion_tokens", 0) or 0),
+    }
+
+
+def record_llm_call(
+    seconds: float,
+    message: Any = None,
+    *,
+    model: Optional[str] = None,
+    tier: str = "",
+    agent: str = "",
+    phase: str = "",
+    status: str = "ok",
+) -> None:
+    """Record one LLM call; ``message`` is the response (``None`` when the call failed)."""
+    labels = {"model": model or "", "tier": tier, "endpoint": current_endpoint(), "agent": agent, "phase": phase}
+    LLM_REQUESTS.inc(status=status, **labels)
+    LLM_REQUEST_SECONDS.observe(seconds, **labels)
+    if message is None:
+        return
+    for kind, tokens in usage_of(message).items():
+        if tokens:
+            LLM_TOKENS.inc(tokens, kind=kind, **labels)
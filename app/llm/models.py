@@ -13,6 +13,9 @@ OPENAI_MODEL_STADARD = os.getenv("OPENAI_MODEL_STADARD", "gpt-5-mini")
 OPENAI_MODEL_HIGH = os.getenv("OPENAI_MODEL_HIGH", "gpt-5")
 OPENAI_EMBED_MODEL = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
 
+# chat 模型后端: openai (默认) / fake (回放 app/llm/fake_trajectories.json, 用于压测与开发, 见 app/llm/fake.py)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai").lower()
+
 # 模型价格配置 (1M tokens/USD)
 OPENAI_MODEL_LOW_PRICE = int(os.getenv("OPENAI_MODEL_LOW_PRICE", "15"))
 OPENAI_MODEL_STADARD_PRICE = int(os.getenv("OPENAI_MODEL_STADARD_PRICE", "110"))
@@ -64,4 +67,11 @@ class LLMModel(Enum):
     @property
     def description(self) -> str:
         """获取模型描述"""
-        return self.value["description"] 
\ No newline at end of file
+        return self.value["description"] 
+    @classmethod
+    def price_of(cls, model_name: str | None) -> int:
+        """按 API 模型名查找价格; 未知模型 (例如 fake 模型) 按 STANDARD 计费"""
+        for model in (cls.LOW, cls.STANDARD, cls.HIGH):
+            if model.model_name == model_name:
+                return model.price
+        return cls.STANDARD.price
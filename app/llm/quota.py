@@ -0,0 +1,81 @@
+"""
+Quota charging for LLM calls made inside agent graphs, and pre-flight token estimates.
+
+agent の中(なか)の LLM 呼(よ)び出(だ)しごとに quota を消費(しょうひ)し、
+残(のこ)りがなくなったら次(つぎ)の呼(よ)び出(だ)しの前(まえ)で止(と)めます。
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import BaseMessage
+
+from app.llm.metrics import usage_of
+from app.llm.models import LLMModel
+
+if TYPE_CHECKING:
+    from app.infra.quota import QuotaBucket
+
+# chat_completion 自己计费; 带这个 tag 的调用 (即使在 graph 中被调用) 不再由 callback 计费
+QUOTA_CHARGED_TAG = "quota:charged"
+
+# 粗略估算: 平均每个 token 约 4 个字符 (日文 / 中文偏少, 作为预检足够)
+_CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(input: Any) -> int:
+    """Rough prompt token count of a chat input (string, messages or message dicts)."""
+    if isinstance(input, str):
+        return len(input) // _CHARS_PER_TOKEN + 1
+    if isinstance(input, BaseMessage):
+        return estimate_tokens(input.content if isinstance(input.content, str) else str(input.content))
+    if isinstance(input, dict):
+        return estimate_tokens(str(input.get("content", "")))
+    if isinstance(input, (list, tuple)):
+        return sum(estimate_tokens(item) for item in input)
+    return estimate_tokens(str(input))
+
+
+class QuotaCallbackHandler(AsyncCallbackHandler):
+    """Charge the user's quota after every chat model call of a graph; stop the graph when it runs out."""
+
+    # 默认 callback 的异常只会被记录; 这里需要抛出 TokenQuotaExceededException 中断 graph
+    raise_error = True
+
+    def __init__(self, quota: "QuotaBucket") -> None:
+        self.quota = quota
+        # run_id -> 模型名 (计费价格)
+        self._models: Dict[UUID, Optional[str]] = {}
+        # 本次运行累计扣除的配额 (token x 价格)
+        self.charged = 0
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, tags=None, **kwargs: Any) -> None:
+        if QUOTA_CHARGED_TAG in (tags or []):
+            return
+        # 余额已经用完时不再发起调用 (早停); 正在进行的调用仍按实际用量计费
+        await self.quota.check(need=1)
+        params = kwargs.get("invocation_params") or {}
+        metadata = kwargs.get("metadata") or {}
+        self._models[run_id] = params.get("model") or params.get("model_name") or metadata.get("ls_model_name")
+
+    async def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        if run_id not in self._models:
+            return
+        model = self._models.pop(run_id)
+        try:
+            message = response.generations[0][0].message
+        except (AttributeError, IndexError):
+            return
+        usage = usage_of(message)
+        tokens = usage["prompt"] + usage["completion"]
+        if tokens <= 0:
+            return
+        price = LLMModel.price_of(model)
+        self.charged += tokens * price
+        await self.quota.consume(tokens, multiplier=price)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._models.pop(run_id, None)
@@ -0,0 +1,70 @@
+"""
+LangChain callback turning chat model and tool runs into spans.
+
+LangGraph の中(なか)の LLM 呼(よ)び出(だ)しと tool 実行(じっこう)を span として記録(きろく)します。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from app.core.tracing import Span, current_span, get_tracer
+
+
+class TracingCallbackHandler(AsyncCallbackHandler):
+    """Open an ``llm.generate`` / ``agent.tool`` span per LangChain run, keyed by run id."""
+
+    def __init__(self, **attributes: Any) -> None:
+        # 所有 span 共用的属性 (例如 agent / phase)
+        self.attributes = attributes
+        self._spans: Dict[UUID, Span] = {}
+
+    def _start(self, run_id: UUID, name: str, **attributes: Any) -> None:
+        # callback 在调用方的 context 中执行, 当前 span 即 agent.run (或外层的 llm.chat)
+        span = get_tracer().start_span(name, current_span(), **self.attributes, **attributes)
+        if span.recording:
+            self._spans[run_id] = span
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, **attributes: Any) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        span.set_attributes(**attributes)
+        if error is not None:
+            span.record_exception(error)
+        span.end()
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        params = kwargs.get("invocation_params") or {}
+        metadata = kwargs.get("metadata") or {}
+        model = params.get("model") or params.get("model_name") or metadata.get("ls_model_name")
+        self._start(run_id, "llm.generate", model=model, messages=sum(len(batch) for batch in messages))
+
+    async def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        usage: Dict[str, Any] = {}
+        try:
+            usage = response.generations[0][0].message.usage_metadata or {}
+        except (AttributeError, IndexError):
+            pass
+        self._end(
+            run_id,
+            input_tokens=usage.get("input_tokens"),
+            cached_tokens=(usage.get("input_token_details") or {}).get("cache_read"),
+            output_tokens=usage.get("output_tokens"),
+        )
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    async def on_tool_start(self, serialized, input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name")
+        self._start(run_id, "agent.tool", tool=name)
+
+    async def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    async def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
@@ -1,12 +1,13 @@
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
+import logging
 import os
 import uvicorn
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
 from fastapi import FastAPI, APIRouter, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
@@ -14,12 +15,23 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sess
 from app.api.v1.router import router as v1_router
 
 from app.core.vector import make_qdrant_client
-from app.core.db import make_async_session_maker, get_engine, check_table_exists
+from app.core.db import make_async_session_maker, get_engine, get_replica_engine, check_table_exists, record_pool_gauges, start_liveness_check
 from app.core.redis import make_redis_client
+from app.core.metrics import CONTENT_TYPE, MetricsMiddleware, render
+from app.core.tracing import TracingMiddleware, get_tracer
+from app.core.logging import configure_logging, shutdown_logging
 from app.core.exceptions.base import BaseException as AppException
+from app.services.agent.core.graph import compile_agent_graphs, set_agent_model
+from app.llm import LLM_PROVIDER, make_fake_chat_model, set_chat_model
+from app.infra.vector.operations import ensure_collections_exist
+from app.infra.vector.outbox import ensure_outbox_table, start_vector_sync_worker
+from app.infra.quota import RateLimitMiddleware
 
 # 加载环境变量
 load_dotenv()
+# 日志经队列由后台 thread 写出, 不阻塞 event loop
+configure_logging()
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
@@ -34,22 +46,46 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     redis_client = make_redis_client()
     # 检测数据库内是否存在表
     if not await check_table_exists():
-        print("Database tables do not exist, creating tables...")
+        logger.warning("Database tables do not exist, creating tables...")
         from scripts.init_db import init_db, init_collections
         await init_db()
         await init_collections()
+    # 旧数据库没有 outbox 表时补建
+    await ensure_outbox_table(get_engine())
+    # 补建缺少的 collection 与 payload index (user_id / language / model)
+    ensure_collections_exist(qdrant_client)
+    # LLM_PROVIDER=fake: 所有 chat 模型换成回放 trajectory 的假模型 (压测 agent 的编排开销)
+    if LLM_PROVIDER == "fake":
+        fake_model = make_fake_chat_model()
+        set_chat_model(fake_model)
+        set_agent_model(fake_model)
+    # 预编译所有 Agent graph (工具 schema 也只生成一次), 请求中直接复用
+    compile_agent_graphs()
+    # DB_LIVENESS_INTERVAL > 0 时, 用后台存活检查代替每次 checkout 的 pre_ping
+    liveness_tasks = [start_liveness_check(engine) for engine in (get_engine(), get_replica_engine()) if engine is not None]
+    # 后台同步 outbox -> Qdrant
+    vector_sync_task = start_vector_sync_worker()
     # 将引擎和会话工厂注入到app的state中
     app.state.async_session_maker = async_session_maker
     app.state.qdrant_client = qdrant_client
     app.state.redis_client = redis_client
     yield
     # 关闭时释放资源
-    print("Application is shutting down...")
+    logger.info("Application is shutting down...")
+    for task in [*liveness_tasks, vector_sync_task]:
+        if task is not None:
+            task.cancel()
     
     # 关闭SQLAlchemy的连接池+
     await get_engine().dispose()
+    if get_replica_engine() is not None:
+        await get_replica_engine().dispose()
     qdrant_client.close()
     await redis_client.aclose()
+    # 导出剩余的 span
+    get_tracer().shutdown()
+    # 写出队列中剩余的日志
+    shutdown_logging()
 
 # Vue の build 出力 dist/（リポジトリ直下）
 DIST_DIR = (Path(__file__).resolve().parent.parent / "dist").resolve()
@@ -88,6 +124,8 @@ def create_app() -> FastAPI:
         allow_origins = ["*"]
         allow_credentials = False
 
+    # 每个用户的请求频率与同时运行的 agent 数量 (在 CORS 内侧, 429 响应也带 CORS 头)
+    app.add_middleware(RateLimitMiddleware)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=allow_origins,
@@ -95,6 +133,10 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    # 按 route 统计请求, 并让 LLM / embedding / quota 的 metric 带上 endpoint label
+    app.add_middleware(MetricsMiddleware)
+    # 每个请求一个 root span (TRACING_EXPORTER=none 时直接透传)
+    app.add_middleware(TracingMiddleware)
 
     # 注册全局异常处理器，将应用内自定义异常统一为标准JSON
     async def handle_app_exception(request: Request, exc: AppException):
@@ -107,6 +149,15 @@ def create_app() -> FastAPI:
     app.include_router(v1_router, prefix="/v1")
     app.include_router(health_router, prefix="/health")
 
+    # Prometheus scrape endpoint (必须在 SPA fallback 之前注册)
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        # 连接池状态只在抓取时读取 (用于按 uvicorn worker 数调整 DB_POOL_SIZE / DB_MAX_OVERFLOW)
+        for engine in (get_engine(), get_replica_engine()):
+            if engine is not None:
+                record_pool_gauges(engine)
+        return Response(render(), media_type=CONTENT_TYPE)
+
     if DIST_DIR.exists():
         assets_dir = DIST_DIR / "assets"
         if assets_dir.exists():
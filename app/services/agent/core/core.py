@@ -1,43 +1,132 @@
 from __future__ import annotations
 from typing import Any, Dict, List, Optional, Tuple, cast, abstractmethod
 from langgraph.graph.state import CompiledStateGraph
-import json, asyncio
+import json, asyncio, os, uuid, contextvars, contextlib, time
+from dotenv import load_dotenv
 from pydantic import BaseModel
 from app.infra.context import uow_ctx
-from app.llm import chat_completion, LLMModel
+from app.llm import chat_completion, LLMModel, QuotaCallbackHandler, TracingCallbackHandler
+from app.llm.metrics import record_llm_call
 from app.services.agent.core.schema import *
-from langgraph.prebuilt import create_react_agent
-from langgraph.checkpoint.memory import InMemorySaver
+from app.services.agent.core.graph import AGENT_CHECKPOINTER, get_agent_model
+from app.services.agent.core.queue import AgentEventQueue
 from app.services.tools.langchain import make_search_resource_tool, QuestionStack, LoopTool
 from app.services.common import MemoryService, StoryService, MistakeService, VocabService, GrammarService
+from app.core.metrics import counter, histogram
+from app.core.tracing import get_tracer, set_current_span, start_span
+from app.core.logging import bind_log_context
+from app.core.exceptions.base import BaseException as AppException
+from app.core.exceptions.common import TokenQuotaExceededException
 from langchain_openai import ChatOpenAI
 import logging, langchain
 import httpx
 from langchain_core.globals import set_llm_cache
+from langchain_core.callbacks import AsyncCallbackHandler
 set_llm_cache(None)
+load_dotenv()
+
+# 运行前按预估成本检查配额; 预估 = 该 agent 平均每次运行的 token (没有记录时用 ESTIMATED_RUN_TOKENS) x 比例 x 价格
+AGENT_QUOTA_PREFLIGHT = os.getenv("AGENT_QUOTA_PREFLIGHT", "true").strip().lower() in {"1", "true", "yes", "on"}
+AGENT_QUOTA_PREFLIGHT_RATIO = float(os.getenv("AGENT_QUOTA_PREFLIGHT_RATIO", "1.0"))
+
+logger = logging.getLogger(__name__)
+# 每次工具调用一条, 量大; 默认按 LOG_SAMPLE_RATES 采样
+tool_logger = logging.getLogger("app.agent.tool")
+
+# Prompt prefix cache 命中率 = cached / prompt, 两个 counter 按 agent 与 phase 分组
+LLM_PROMPT_TOKENS = counter(
+    "vounica_agent_prompt_tokens_total",
+    "Prompt tokens sent by agent LLM calls",
+    labelnames=("agent", "phase"),
+)
+LLM_PROMPT_CACHED_TOKENS = counter(
+    "vounica_agent_prompt_cached_tokens_total",
+    "Prompt tokens served from the provider prompt cache",
+    labelnames=("agent", "phase"),
+)
+
+
+# 客户端断开导致取消的运行次数, 以及因此节省的 token (按该 agent 平均每次运行的 token 估算)
+AGENT_CANCELLED_RUNS = counter(
+    "vounica_agent_cancelled_runs_total",
+    "Agent runs cancelled because the streaming client disconnected",
+    labelnames=("agent",),
+)
+AGENT_TOKENS_SAVED = counter(
+    "vounica_agent_tokens_saved_total",
+    "Estimated LLM tokens not spent thanks to cancelling runs of disconnected clients",
+    labelnames=("agent",),
+)
+# 每个 phase (run_stream_events 一次) 的耗时与工具调用次数; LLM 调用本身见 app/llm/metrics.py
+AGENT_PHASE_SECONDS = histogram(
+    "vounica_agent_phase_duration_seconds",
+    "Duration of one agent phase (one run_stream_events call)",
+    labelnames=("agent", "phase", "status"),
+)
+AGENT_TOOL_CALLS = counter(
+    "vounica_agent_tool_calls_total",
+    "Tool invocations by agent phase",
+    labelnames=("agent", "phase", "tool"),
+)
+# 每个 agent 完整运行一次的 token 数 (指数移动平均), 用于估算取消节省的 token
+_RUN_TOKENS_EMA: Dict[str, float] = {}
+_RUN_TOKENS_EMA_ALPHA = 0.2
+# 进行中的 run_stream 清理 task (event loop 只保留弱引用, 这里持有到完成为止)
+_CLEANUP_TASKS: set = set()
+
+
+def prompt_cache_hit_rate(agent: str, phase: str = "") -> float:
+    """Return cached/prompt token ratio recorded so far for the given agent (and phase)."""
+    if phase:
+        prompt = LLM_PROMPT_TOKENS.value(agent=agent, phase=phase)
+        cached = LLM_PROMPT_CACHED_TOKENS.value(agent=agent, phase=phase)
+    else:
+        prompt = sum(v for k, v in LLM_PROMPT_TOKENS.samples().items() if k[0] == agent)
+        cached = sum(v for k, v in LLM_PROMPT_CACHED_TOKENS.samples().items() if k[0] == agent)
+    return cached / prompt if prompt else 0.0
+
+
+def _error_event(exc: BaseException) -> AgentErrorEvent:
+    # 应用内异常保持与 HTTP 错误响应相同的结构; 其他异常不向客户端暴露细节
+    if isinstance(exc, AppException):
+        return AgentErrorEvent(data=AgentErrorData(**exc.to_dict()))
+    return AgentErrorEvent(data=AgentErrorData(code=500, message="Agent run failed", error_type="internal_error"))
+
+
+class ReleaseConnectionHandler(AsyncCallbackHandler):
+    """Return the DB connection to the pool before every LLM call of the graph."""
+
+    def __init__(self, uow) -> None:
+        self.uow = uow
+
+    # 在 graph 的执行流程中 await, 此时没有工具在使用 session; 只读事务先结束, 有写入则保留到 commit
+    async def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        await self.uow.release()
+
 
 class CoreAgent:
     """基础 Agent，提供模型、推送等通用能力。"""
 
+    # 还没有运行记录时, 预检使用的每次运行 token 数
+    ESTIMATED_RUN_TOKENS = 10000
+
     def __init__(self):
-        # UoW 与模型
+        # UoW 与模型 (模型在进程内共享, 见 graph.get_agent_model)
         self.uow = uow_ctx.get()
-        self.model = ChatOpenAI(
-            model=LLMModel.HIGH.model_name,
-            reasoning_effort="minimal"
-        )
-        self.high_model = ChatOpenAI(
-            model=LLMModel.HIGH.model_name,
-            reasoning_effort="high"
-        )
-        self.low_model = ChatOpenAI(
-            model=LLMModel.STANDARD.model_name,
-            reasoning_effort="low"
-        )
-        self.checkpointer = InMemorySaver()
-        # 消息队列
-        self._message_queue: asyncio.Queue = asyncio.Queue()
+        self.model = get_agent_model()
+        self.high_model = get_agent_model("high")
+        self.low_model = get_agent_model("low")
+        # graph 是预编译共享的, checkpointer 也共享; 每次运行用独立的 thread_id 隔离会话
+        self.checkpointer = AGENT_CHECKPOINTER
+        self.thread_id = uuid.uuid4().hex
+        # 消息队列 (有上限, 连续的 STREAM_CHUNK 会被合并)
+        self._message_queue: AgentEventQueue = AgentEventQueue()
         self._loop = asyncio.get_running_loop()
+        # 本次运行累计的 token 使用量 (来自 response 的 usage_metadata)
+        self.usage: Dict[str, int] = {"input_tokens": 0, "cached_tokens": 0, "output_tokens": 0}
+        # graph 中每次 LLM 调用后扣除配额 (第一次 run_config 时创建, 各 phase 共用)
+        self.quota_handler: Optional[QuotaCallbackHandler] = None
+        self._preflight_done = False
 
 
 
@@ -47,7 +136,7 @@ class CoreAgent:
         raise NotImplementedError("agent must have run method")
 
     # 暴露内部队列供外层 StreamingResponse 消费
-    def get_queue(self) -> asyncio.Queue:
+    def get_queue(self) -> AgentEventQueue:
         """暴露内部队列供外层 StreamingResponse 消费。"""
         return self._message_queue
     
@@ -58,25 +147,183 @@ class CoreAgent:
     # message方法, 调用后会发出带message的AgentEvent
     def message(self, data: BaseModel):
         event = AgentMessageEvent(type=AgentEventType.MESSAGE, data=data)
-        self._loop.call_soon_threadsafe(self._message_queue.put_nowait, event)
+        self.event(event)
     # event 方法, 代替message方法, 直接发出AgentEvent
     def event(self, event: AgentEvent):
-        self._loop.call_soon_threadsafe(self._message_queue.put_nowait, event)
+        # 在事件循环线程内直接入队, 保证与 emit 的顺序一致; 其他线程通过 call_soon_threadsafe
+        if self._in_loop():
+            self._message_queue.put_nowait(event)
+        else:
+            self._loop.call_soon_threadsafe(self._message_queue.put_nowait, event)
+
+    # emit 方法, 队列满时等待消费者 (backpressure), 用于高频的 stream chunk
+    async def emit(self, event: AgentEvent):
+        await self._message_queue.put(event)
+
+    def _in_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    # 生成本次运行的 config; 工具通过 config["configurable"] 读取当前请求的对象
+    def run_config(self, **configurable: Any) -> Dict[str, Any]:
+        # 等待 LLM 期间不占用 DB 连接
+        if self.quota_handler is None:
+            self.quota_handler = QuotaCallbackHandler(self.uow.quota)
+        callbacks: List[AsyncCallbackHandler] = [ReleaseConnectionHandler(self.uow), self.quota_handler]
+        if get_tracer().enabled:
+            # 每次 LLM 调用与工具调用一个 span
+            callbacks.append(TracingCallbackHandler(agent=self.__class__.__name__))
+        return {
+            "configurable": {"thread_id": self.thread_id, "agent": self, **configurable},
+            "callbacks": callbacks,
+        }
+
+    # 运行结束后删除共享 checkpointer 中本次运行的会话, 避免内存增长
+    def release_thread(self) -> None:
+        self.checkpointer.delete_thread(self.thread_id)
+
+    # 语言信息作为可变后缀发送, 保证前面的静态 system prompt 在请求之间字节一致, 可以命中 prompt cache
+    def language_prompt(self) -> str:
+        """Return the per-request language section referenced by the static prompts."""
+        return (
+            "# Language\n"
+            f"- Native (interface) language of the user (ISO 639-1): {self.uow.accept_language}\n"
+            f"- Target language the user is learning (ISO 639-1): {self.uow.target_language}\n"
+        )
+
+    # 从 on_chat_model_end 的输出中读取 usage_metadata, 记录 prompt cache 命中情况
+    def record_usage(self, output: Any, phase: str) -> None:
+        usage = getattr(output, "usage_metadata", None)
+        if not usage:
+            return
+        input_tokens = int(usage.get("input_tokens", 0) or 0)
+        cached_tokens = int((usage.get("input_token_details") or {}).get("cache_read", 0) or 0)
+        self.usage["input_tokens"] += input_tokens
+        self.usage["cached_tokens"] += cached_tokens
+        self.usage["output_tokens"] += int(usage.get("output_tokens", 0) or 0)
+        agent = self.__class__.__name__
+        LLM_PROMPT_TOKENS.inc(input_tokens, agent=agent, phase=phase)
+        LLM_PROMPT_CACHED_TOKENS.inc(cached_tokens, agent=agent, phase=phase)
+
+    def tokens_used(self) -> int:
+        return self.usage["input_tokens"] + self.usage["output_tokens"]
+
+    # 预估本次运行的配额消耗 (token x 默认模型价格)
+    def estimated_cost(self) -> int:
+        tokens = _RUN_TOKENS_EMA.get(self.__class__.__name__) or self.ESTIMATED_RUN_TOKENS
+        model_name = getattr(self.model, "model_name", None)
+        return int(tokens * AGENT_QUOTA_PREFLIGHT_RATIO * LLMModel.price_of(model_name))
+
+    # 运行前检查配额是否足够支付一次完整运行; SSE 接口在返回响应前调用 (可以返回 429), 之后 run_stream 不再重复检查
+    async def preflight(self) -> None:
+        if self._preflight_done or not AGENT_QUOTA_PREFLIGHT:
+            return
+        await self.uow.quota.check(need=self.estimated_cost())
+        self._preflight_done = True
+
     # 持续向外部stream消息, 每个消息必须是一个AgentEvent对象, 并且可以被直接放到FastAPI的StreamingResponse中
+    # 消费方提前结束 (客户端断开导致取消, 或调用 aclose) 时, 取消 agent task 并回滚 UoW
     async def run_stream(self, *args):
-        agent_task = asyncio.create_task(self.run(*args))
-        # 创建task, 并且
-        while True:
-            message: AgentEvent = await self._message_queue.get()
-            # 发送信息
-            yield message
-            if message.type == AgentEventType.RESULT:
-                break
-        # 确保AgentTask完成
-        await agent_task
+        # 配额不足以支付一次完整运行时不启动 agent (WebSocket 在这里检查; SSE 接口已提前检查)
+        try:
+            await self.preflight()
+        except TokenQuotaExceededException as exc:
+            yield _error_event(exc)
+            return
+        # SSE 时 get_uow 在开始推送前就已退出, 这里让 agent task 在带有本 UoW 的 context 中运行
+        context = contextvars.copy_context()
+        context.run(uow_ctx.set, self.uow)
+        # 日志关联 id 同样来自 UoW (get_uow 绑定的 context 此时已重置)
+        context.run(
+            bind_log_context,
+            request_id=getattr(self.uow, "request_id", None),
+            user_id=getattr(self.uow, "current_user_id", None),
+        )
+        # agent task 中的 SQL / LLM / 工具 span 都挂在 agent.run 下
+        run_span = start_span("agent.run", agent=self.__class__.__name__, thread_id=self.thread_id)
+        context.run(set_current_span, run_span)
+        agent_task = asyncio.create_task(self.run(*args), context=context)
+        # run 抛出异常 (例如中途配额用完) 时不会有 RESULT, 改为推送 ERROR 结束 stream
+        agent_task.add_done_callback(self._on_run_done)
+        try:
+            while True:
+                message: AgentEvent = await self._message_queue.get()
+                # 发送信息
+                yield message
+                if message.type in (AgentEventType.RESULT, AgentEventType.ERROR):
+                    break
+            if message.type == AgentEventType.ERROR:
+                # 未完成的运行不提交 (已消耗的配额不退还)
+                await self.uow.rollback()
+                return
+            # 确保AgentTask完成
+            await agent_task
+            self._record_run_tokens()
+            # SSE 时 get_uow 已在推送前退出, 由这里提交 agent 的写入 (WebSocket 时再次 commit 为空操作)
+            await self.uow.commit()
+        finally:
+            # SSE 断开时 Starlette (anyio cancel scope) 会反复取消这个 generator, finally 中的每个 await 都会立即抛出
+            # CancelledError; 清理全部放在独立的 task 中, 只 await (shield) 一次, 即使这里被取消也会执行完
+            cleanup = asyncio.ensure_future(self._finish_run(agent_task, run_span))
+            _CLEANUP_TASKS.add(cleanup)
+            cleanup.add_done_callback(_CLEANUP_TASKS.discard)
+            await asyncio.shield(cleanup)
+
+    # run_stream 结束后的清理: 取消未完成的 agent task 并回滚, 归还配额 lease, 结束 agent.run span
+    async def _finish_run(self, agent_task: asyncio.Task, run_span) -> None:
+        try:
+            if not agent_task.done():
+                run_span.set_attribute("cancelled", True)
+                await self._cancel(agent_task)
+            elif not agent_task.cancelled() and agent_task.exception() is not None:
+                run_span.record_exception(agent_task.exception())
+            # SSE 时 UoW 在推送前已关闭 (lease 已归还), agent 运行中重新借的 lease 在这里归还 (agent 已停止, 不会再扣除)
+            if self.uow.is_created("quota"):
+                try:
+                    await self.uow.quota.aclose()
+                except Exception:
+                    logger.warning("returning quota lease failed", exc_info=True)
+        finally:
+            run_span.set_attributes(**self.usage)
+            run_span.end()
+
+    def _on_run_done(self, agent_task: asyncio.Task) -> None:
+        if agent_task.cancelled() or agent_task.exception() is None:
+            return
+        self.event(_error_event(agent_task.exception()))
+
+    # 取消 agent task: 不再发起新的 LLM 调用 (也不再消耗配额), 并回滚未提交的写入
+    async def _cancel(self, agent_task: asyncio.Task) -> None:
+        agent_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await agent_task
+        try:
+            await self.uow.rollback()
+        except Exception:
+            logger.warning("rollback of cancelled agent run failed", exc_info=True)
+        agent = self.__class__.__name__
+        AGENT_CANCELLED_RUNS.inc(agent=agent)
+        expected = _RUN_TOKENS_EMA.get(agent)
+        if expected:
+            AGENT_TOKENS_SAVED.inc(max(0.0, expected - self.tokens_used()), agent=agent)
+
+    def _record_run_tokens(self) -> None:
+        used = self.tokens_used()
+        if used <= 0:
+            return
+        agent = self.__class__.__name__
+        previous = _RUN_TOKENS_EMA.get(agent)
+        _RUN_TOKENS_EMA[agent] = used if previous is None else previous + _RUN_TOKENS_EMA_ALPHA * (used - previous)
     
     # 持续向外部发送stream event, 通过agent和payload, config
-    async def run_stream_events(self, agent:CompiledStateGraph , payload: Dict[str, Any], config: Dict[str, Any]):
+    async def run_stream_events(self, agent:CompiledStateGraph , payload: Dict[str, Any], config: Dict[str, Any], phase: str = "default"):
+        agent_name = self.__class__.__name__
+        phase_start = time.perf_counter()
+        status = "ok"
+        # run_id -> LLM 调用开始时间
+        llm_started: Dict[str, float] = {}
         try:
             async for ev in agent.astream_events(payload, config=config, version="v2"):
                 t = ev["event"]
@@ -84,23 +331,39 @@ class CoreAgent:
                 data = ev.get("data", {})
 
                 if t == "on_chat_model_start":
-                    self.event(AgentThinkingEvent())
+                    llm_started[ev.get("run_id")] = time.perf_counter()
+                    await self.emit(AgentThinkingEvent())
                 elif t == "on_chat_model_stream":
                     chunk = data.get("chunk")
                     # 兼容 AIMessageChunk 或 provider 自定义结构
                     text = getattr(chunk, "content", None)
                     if text:
-                        self.event(AgentStreamChunkEvent(
+                        await self.emit(AgentStreamChunkEvent(
                             data=AgentStreamChunkData(chunk=text)
                         ))
 
                 elif t == "on_chat_model_end":
-                    self.event(AgentStreamEndEvent())
+                    self.record_usage(data.get("output"), phase)
+                    started = llm_started.pop(ev.get("run_id"), None)
+                    if started is not None:
+                        record_llm_call(
+                            time.perf_counter() - started,
+                            data.get("output"),
+                            model=(ev.get("metadata") or {}).get("ls_model_name"),
+                            agent=agent_name,
+                            phase=phase,
+                        )
+                    await self.emit(AgentStreamEndEvent())
                     self.is_streaming = False
 
                 elif t == "on_tool_end":
-                    print("on_tool_end", name, data)
-                    self.event(AgentToolCallEvent(
+                    AGENT_TOOL_CALLS.inc(agent=agent_name, phase=phase, tool=name or "")
+                    if tool_logger.isEnabledFor(logging.DEBUG):
+                        # 工具数据只在 DEBUG 时完整输出
+                        tool_logger.debug("tool end", extra={"agent": agent_name, "phase": phase, "tool": name, "data": data})
+                    else:
+                        tool_logger.info("tool end", extra={"agent": agent_name, "phase": phase, "tool": name})
+                    await self.emit(AgentToolCallEvent(
                         data = AgentToolData(
                             tool_name=name,
                             tool_data=data
@@ -108,7 +371,20 @@ class CoreAgent:
                     ))
                 elif t == "on_chain_end" and name == "LangGraph":
                     break
+        except asyncio.CancelledError:
+            # 客户端断开, run_stream 取消了 agent task
+            status = "cancelled"
+            raise
+        except TokenQuotaExceededException:
+            # 配额用完 (QuotaCallbackHandler 在下一次 LLM 调用前抛出): 停止整个运行, 不再进入后面的 phase
+            status = "quota_exceeded"
+            logger.info("agent run stopped: quota exhausted", extra={"agent": agent_name, "phase": phase})
+            self.is_streaming = False
+            raise
         except Exception as e:
-            print(e)
+            status = "error"
+            logger.error("agent phase failed", extra={"agent": agent_name, "phase": phase}, exc_info=e)
             self.event(AgentStreamEndEvent())
-            self.is_streaming = False
\ No newline at end of file
+            self.is_streaming = False
+        finally:
+            AGENT_PHASE_SECONDS.observe(time.perf_counter() - phase_start, agent=agent_name, phase=phase, status=status)
\ No newline at end of file
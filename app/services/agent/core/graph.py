@@ -0,0 +1,84 @@
+"""
+Compile agent graphs once and share them between requests.
+
+Agent の LangGraph を起動時(きどうじ)に一度(いちど)だけ compile し、全(ぜん)リクエストで共有(きょうゆう)します。
+Per-request state (UoW, QuestionStack, agent instance) is never captured by a
+graph; tools read it from ``uow_ctx`` or from ``config["configurable"]``.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Callable, Dict, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_openai import ChatOpenAI
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph.state import CompiledStateGraph
+
+from app.llm import LLMModel
+
+GraphBuilder = Callable[[], CompiledStateGraph]
+
+# 所有 graph 共用一个 checkpointer, 每次运行使用独立的 thread_id, 结束后删除
+AGENT_CHECKPOINTER = InMemorySaver()
+
+_BUILDERS: Dict[str, GraphBuilder] = {}
+_GRAPHS: Dict[str, CompiledStateGraph] = {}
+
+
+# set_agent_model 注入的模型 (例如压测用的 ScriptedChatModel), 优先于 OpenAI
+_MODEL_OVERRIDES: Dict[str, BaseChatModel] = {}
+AGENT_MODEL_TIERS = ("default", "high", "low")
+
+
+def get_agent_model(tier: str = "default") -> BaseChatModel:
+    """Return the shared chat model used by agents for the given tier."""
+    return _MODEL_OVERRIDES.get(tier) or _openai_agent_model(tier)
+
+
+def set_agent_model(model: BaseChatModel, tier: Optional[str] = None) -> None:
+    """Use ``model`` for ``tier`` (every tier when ``None``); compiled graphs are rebuilt on next use."""
+    for name in ([tier] if tier is not None else AGENT_MODEL_TIERS):
+        _MODEL_OVERRIDES[name] = model
+    # graph 在编译时绑定模型
+    _GRAPHS.clear()
+
+
+# 模型是无状态的, 进程内共享一份即可 (避免每个请求都创建 httpx client)
+@lru_cache(maxsize=None)
+def _openai_agent_model(tier: str) -> ChatOpenAI:
+    if tier == "high":
+        return ChatOpenAI(model=LLMModel.HIGH.model_name, reasoning_effort="high")
+    if tier == "low":
+        return ChatOpenAI(model=LLMModel.STANDARD.model_name, reasoning_effort="low")
+    return ChatOpenAI(model=LLMModel.HIGH.model_name, reasoning_effort="minimal")
+
+
+def register_graph(name: str) -> Callable[[GraphBuilder], GraphBuilder]:
+    """Register a builder that creates (and compiles) the graph called ``name``."""
+
+    def decorator(builder: GraphBuilder) -> GraphBuilder:
+        _BUILDERS[name] = builder
+        return builder
+
+    return decorator
+
+
+def get_graph(name: str) -> CompiledStateGraph:
+    """Return the compiled graph, compiling it on first use."""
+    graph = _GRAPHS.get(name)
+    if graph is None:
+        builder = _BUILDERS.get(name)
+        if builder is None:
+            raise KeyError(f"Agent graph {name} not registered")
+        graph = builder()
+        _GRAPHS[name] = graph
+    return graph
+
+
+def compile_agent_graphs() -> None:
+    """Compile every registered graph; called once during application startup."""
+    for name in list(_BUILDERS):
+        get_graph(name)
+
@@ -0,0 +1,139 @@
+"""
+Bounded agent event queue that coalesces consecutive stream chunks.
+
+Agent から外部(がいぶ)へ送(おく)る event の queue です。上限(じょうげん)があり、
+連続(れんぞく)する STREAM_CHUNK を一定時間(いってい じかん) / 一定サイズでまとめて 1 frame にします。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque
+
+from dotenv import load_dotenv
+
+from app.services.agent.core.schema import AgentEvent, AgentEventType
+
+load_dotenv()
+
+# 队列中最多保留的 event 数 (chunk 合并之后的数量), 慢客户端会让生产者在这里等待
+AGENT_EVENT_QUEUE_SIZE = int(os.getenv("AGENT_EVENT_QUEUE_SIZE", "256"))
+# 连续 chunk 的合并窗口 (毫秒) 与单帧最大字节数
+AGENT_STREAM_COALESCE_MS = int(os.getenv("AGENT_STREAM_COALESCE_MS", "30"))
+AGENT_STREAM_COALESCE_BYTES = int(os.getenv("AGENT_STREAM_COALESCE_BYTES", "1024"))
+
+
+@dataclass
+class _Item:
+    event: AgentEvent
+    started: float
+    size: int = 0
+
+    @property
+    def is_chunk(self) -> bool:
+        return self.event.type == AgentEventType.STREAM_CHUNK
+
+    def extend(self, other: "_Item") -> None:
+        self.event.data.chunk += other.event.data.chunk
+        self.size += other.size
+
+
+class AgentEventQueue:
+    """
+    Bounded queue of ``AgentEvent``.
+
+    - ``await put()`` waits while the queue is full (backpressure for stream chunks)
+    - ``put_nowait()`` never blocks; used for the few control events (thinking / result ...)
+    - ``get()`` merges consecutive STREAM_CHUNK events within the coalesce window / byte limit
+    """
+
+    def __init__(
+        self,
+        maxsize: int = AGENT_EVENT_QUEUE_SIZE,
+        coalesce_ms: int = AGENT_STREAM_COALESCE_MS,
+        coalesce_bytes: int = AGENT_STREAM_COALESCE_BYTES,
+    ) -> None:
+        self.maxsize = maxsize
+        self.coalesce_window = coalesce_ms / 1000
+        self.coalesce_bytes = coalesce_bytes
+        self._items: Deque[_Item] = deque()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def empty(self) -> bool:
+        return not self._items
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= len(self._items)
+
+    def _item(self, event: AgentEvent) -> _Item:
+        size = len(event.data.chunk.encode("utf-8")) if event.type == AgentEventType.STREAM_CHUNK else 0
+        return _Item(event=event, started=asyncio.get_running_loop().time(), size=size)
+
+    # 队尾是仍在窗口内的 chunk 时直接合并, 不占用新的位置
+    def _merge(self, item: _Item) -> bool:
+        if not item.is_chunk or not self._items:
+            return False
+        tail = self._items[-1]
+        if not tail.is_chunk or tail.size + item.size > self.coalesce_bytes:
+            return False
+        if item.started - tail.started > self.coalesce_window:
+            return False
+        tail.extend(item)
+        return True
+
+    def put_nowait(self, event: AgentEvent) -> None:
+        # 控制类 event 数量有限, 不受上限约束, 同步调用方 (finish / event) 不会因为队列满而失败
+        item = self._item(event)
+        if not self._merge(item):
+            self._items.append(item)
+        self._not_empty.set()
+
+    async def put(self, event: AgentEvent) -> None:
+        item = self._item(event)
+        while not self._merge(item):
+            if not self.full():
+                self._items.append(item)
+                break
+            self._not_full.clear()
+            await self._not_full.wait()
+        self._not_empty.set()
+
+    async def get(self) -> AgentEvent:
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        item = self._items.popleft()
+        self._not_full.set()
+        if item.is_chunk:
+            await self._coalesce(item)
+        return item.event
+
+    # 取出 chunk 后, 在窗口剩余时间内继续合并后续 chunk; 遇到其他 event 或达到字节上限立即返回
+    async def _coalesce(self, item: _Item) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = item.started + self.coalesce_window
+        while item.size < self.coalesce_bytes:
+            if self._items:
+                head = self._items[0]
+                if not head.is_chunk or item.size + head.size > self.coalesce_bytes:
+                    return
+                self._items.popleft()
+                self._not_full.set()
+                item.extend(head)
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                return
+            self._not_empty.clear()
+            try:
+                await asyncio.wait_for(self._not_empty.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
@@ -11,6 +11,9 @@ class AgentEventType(str, Enum):
     STREAM_END = "stream_end"
 
     TOOL_CALL = "tool_call"
+
+    # agent 中途失败 (例如配额用完), 之后不会再有 RESULT
+    ERROR = "error"
     
 
 
@@ -34,6 +37,12 @@ class AgentThinkingData(BaseModel):
 class AgentStreamEndData(BaseModel):
     pass
 
+class AgentErrorData(BaseModel):
+    code: int
+    message: str
+    error_type: str
+    detail: Dict[str, Any] = Field(default_factory=dict)
+
 class AgentThinkingEvent(AgentEvent):
     type: Literal[AgentEventType.THINKING] = Field(default=AgentEventType.THINKING)
     data: AgentThinkingData = Field(default_factory=AgentThinkingData)
@@ -50,6 +59,10 @@ class AgentToolCallEvent(AgentEvent):
     type: Literal[AgentEventType.TOOL_CALL] = Field(default=AgentEventType.TOOL_CALL)
     data: AgentToolData = Field(default_factory=AgentToolData)
 
+class AgentErrorEvent(AgentEvent):
+    type: Literal[AgentEventType.ERROR] = Field(default=AgentEventType.ERROR)
+    data: AgentErrorData
+
 class AgentMessageEvent(AgentEvent):
     type: Literal[AgentEventType.MESSAGE] = Field(default=AgentEventType.MESSAGE)
     data: AgentMessageData
@@ -11,20 +11,37 @@ from typing import Any, Dict, List, Optional, Tuple, cast
 import json
 
 from app.services.agent.core.core import CoreAgent
+from app.services.agent.core.graph import register_graph, get_graph, get_agent_model, AGENT_CHECKPOINTER
 from app.infra.context import uow_ctx
 from app.llm import chat_completion, LLMModel
 from app.services.question.types import QuestionUnion
 from langgraph.prebuilt import create_react_agent
-from langgraph.checkpoint.memory import InMemorySaver
 from app.services.tools.langchain import make_search_resource_tool, QuestionStack, LoopTool
+from app.services.tools.langchain.question_stack import QUESTION_STACK_KEY, get_question_stack_tools
 from langchain_openai import ChatOpenAI
 from app.services.agent.core.schema import AgentMessageEvent,AgentResultEvent,AgentMessageData
 from app.services.agent.question.schema import QuestionAgentResult,QuestionAgentEvent
+from app.services.agent.question.prompt import QUESTION_AGENT_SYSTEM_PROMPT
 from app.services.common.memory import MemoryService
 from app.services.common.grammar import GrammarService
 from app.services.common.story import StoryService
 from app.services.common.mistake import MistakeService
 from app.services.common.vocab import VocabService
+
+
+# 出题 graph, 启动时编译一次; 题目工具从 run config 读取当前请求的 QuestionStack
+@register_graph("question.make_questions")
+def build_question_graph():
+    return create_react_agent(
+        model=get_agent_model(),
+        tools=[
+            make_search_resource_tool(),
+            *get_question_stack_tools(),
+        ],
+        checkpointer=AGENT_CHECKPOINTER,
+    )
+
+
 class QuestionAgent(CoreAgent):
     """
     使用 React 循环的问题生成代理。
@@ -56,7 +73,10 @@ class QuestionAgent(CoreAgent):
         
         # 执行OPAR循环
         self.user_input = user_input
-        await self._make_questions(user_input)        
+        try:
+            await self._make_questions(user_input)
+        finally:
+            self.release_thread()
         self.event(
             QuestionAgentResult(
                 data = self.question_stack.questions
@@ -67,160 +87,14 @@ class QuestionAgent(CoreAgent):
         """
         React 阶段：分析用户输入, 生成题目
         """
-        # 创建Agent
-        question_agent = create_react_agent(
-            model=self.model,
-            tools=[
-                make_search_resource_tool(),
-                self.question_stack.build_delete_question_tool(),
-                self.question_stack.build_get_questions_prompt_tool(),
-                *self.question_stack.get_tools()
-            ],
-            checkpointer=self.checkpointer
-        )
+        # 使用预编译的 Agent
+        question_agent = get_graph("question.make_questions")
         # 6. 运行 Agent - 第一个问题
-        config = {"configurable": {"thread_id": "1"}}
+        config = self.run_config(**{QUESTION_STACK_KEY: self.question_stack})
+        # 静态 prompt 放在最前面 (字节一致, 可命中 prompt cache), 语言与用户数据作为可变后缀
         payload = {"messages": [
-                {"role": "system", "content": f"""
-# Role
-You are a **Question Generation Agent** for **Vounica**, an AI-powered Language Learning Platform.  
-
-## Responsibility
-- Analyze the user’s requests and learning needs.  
-- Generate practice questions that are appropriate for the user’s current level and goals.  
-- Your Message to the user MUST be only in `{self.uow.accept_language}`
-- MUST NOT contain any question content (stems/options/answers/instructions)
-- All questions MUST be added via `add_*_question` tools only.
-## You Can
-As the Question Generation Agent, you have access to several functions for managing questions in the **QuestionStack**.  
-The QuestionStack is a temporary storage of questions, controlled entirely through function calls, and will be delivered to the user once your process ends.  
-
-### Available Functions
-1. **search_resource**  
-   - Retrieve user information (Memory, Vocab & Grammar, Story, Mistake).  
-
-2. **get_questions**  
-   - Get all questions currently stored in the QuestionStack.  
-
-3. **delete_question**  
-   - Remove a specific question from the QuestionStack.  
-
-4. **add_*_question**  
-   - Add a new question into the QuestionStack.  
-   - `*` represents different question types (e.g., `add_choice_question`, `add_match_question`, `add_assembly_question`).  
-   - These questions will remain in the stack until your task is completed, at which point they are sent to the user for practice.  
-
-
-## Goal
-- Analyze the user’s input and generate practice questions that are suitable for their learning stage.  
-- Once you believe the question set is complete, use the `get_questions` tool to verify that all questions comply with **QuestionRules**.  
-- If any question violates the **QuestionRules**, you must remove it from the **QuestionStack** using `delete_question`, regenerate new questions, and re-check them. Repeat this process until every question fully complies.  
-- The user is learning `{self.uow.target_language}` (ISO 639-1) through `{self.uow.accept_language}` as their native interface language.  
-
-## Constraints
-- **Preference Retrieval (SHOULD)**: Whenever possible, retrieve the user’s preferences and learning history from the database.  
-- **Fallback Test Generation (MUST)**: If no user profile is found, you must create a diagnostic test with progressively increasing difficulty (e.g., from A1 to C1).  
-- **Transparency (MUST)**: You must inform the user of the steps you are taking during the question generation process.  
-- **Level & Weakness Adaptation (MUST)**: All generated questions must align with the user’s current level and focus on their potential weak points.  
-
-## QuestionRules
-- **Answer Visibility (MUST)**: The `correct_answer` must never be shown to the user; it should be safely stored only in the `correct_answer` field.  
-- **No Leakage (MUST)**: The correct answer must not appear outside of the `correct_answer` field.  
-- **Knowledge Requirement (MUST)**: The user must not be able to deduce the answer solely from existing content (e.g., stem, choices) without actual knowledge of the subject.  
-- **Uniqueness (MUST)**: Each question must have exactly one valid correct answer.  
-- **Correctness (MUST)**: The answer must be factually accurate.  
-- **Clarity (MUST)**: The answer must be unambiguous, with no room for interpretation.  
-- **Language Restriction (MUST)**: Only the user’s native language (`{self.uow.accept_language}`) and the target language (`{self.uow.target_language}`) may appear in the question. No third languages are allowed.  
-- **Beginner Stems (MUST)**: For beginner-level users, stems must be written in their native language, as they may recognize words but fail to understand stems in the target language.  
-- **Advanced Stems (SHOULD)**: For advanced-level users, stems may be written in the target language.  
-- **Grammar & Vocabulary Balance (SHOULD)**: Questions should train both grammar and vocabulary simultaneously.  
-- **Diversity (SUGGEST)**: Question formats and content should vary to maintain user engagement.  
-
-## Incorrect Question Examples
-
-### Example 1
-**Stem**: *What is the capital of the moon (Eclipse City)?*  
-**Correct Answer**: *The capital of the moon is called 'Eclipse City'*  
-**Choices**:  
-A. Eclipse City  
-B. New World  
-C. City of Light  
-
-- Issue: The stem contains the phrase “Eclipse City,” which allows the user to directly infer the answer without actual knowledge. Therefore, this is an invalid question.  
-
----
-
-### Example 2
-**Stem**: *请选择 thanks 在日语中对应的意思*  
-(User is learning **ja** through **cn**, based on ISO 639-1)  
-**Correct Answer**: *ありがとう*  
-**Choices**:  
-A. ありがとう  
-B. おはよう  
-C. ありがとう  
-
-- Issue: In this question, the user is only supposed to work with **cn** (native) and **ja** (target) languages. However, the stem introduces English (“thanks”). You must not require the user to know a third language, even if it is English.
-
-  
-## QuestionTypes
-
-### Choice
-- **Description**: Multiple-choice questions where the user selects one correct answer from several options.  
-- **Rules**:  
-  - Exactly one option must be correct (**MUST**).  
-  - Distractor options should be plausible but incorrect (**SHOULD**).  
-  - Options must not reveal the correct answer through wording or pattern (**MUST**).  
-
----
-
-### Match
-- **Description**: Matching questions where the user pairs items from the left column with those in the right column.  
-- **Rules**:  
-  - Each side must contain exactly four tabs/items (**MUST**).  
-  - Each left-side item must correspond to one unique right-side item (**MUST**).  
-  - No ambiguous or duplicate matches are allowed (**MUST**).  
-
----
-
-### Assembly
-- **Description**: Sentence assembly questions where the user arranges scattered tokens into a complete sentence.  
-- **Rules**:  
-  - The `stem` should be either an instruction or a sentence in the user’s native language (for beginners), or in the target language (for advanced learners) (**MUST/SHOULD** depending on level).  
-  - The `correct_answer` must be a list of tokens in the correct order that forms the full sentence (**MUST**).  
-  - The `options` list must contain the correct tokens plus distractors; it may be longer than `correct_answer` but must allow a valid reconstruction of the answer (**MUST**).  
-  - Neither `options` nor `correct_answer` should contain punctuation (**MUST**).  
-
-**Example**:  
-- **Stem**: *Transformer 是一种神经网络模型*  
-- **correct_answer**: `[Transformer, is, a, model, of, neural, network]`  
-- **options**: `[Transformer, network, of, schema, bugs, neural, is, a, model]`  
-
-## Tools
-
-### search_resource
-- **Description**: Retrieve user information for question generation and personalization.  
-- **Data Categories**:  
-  - **Memory**: LLM-managed records of the user’s answers, chats, and learning profile.  
-  - **Vocab & Grammar**: Tracks the user’s mastery of specific words and grammar rules.  
-    - `name`: The word or grammar item, stored in the target language.  
-    - `usage`: Describes the usage context of the word/grammar; helps distinguish variants and enables vector search.  
-  - **Story**: User-written personal stories that provide additional learning context.  
-  - **Mistake**: A record of the user’s incorrect answers (error book).  
-
----
-
-### delete_question
-- **Description**: Remove a specific question from the **QuestionStack**.  
-- **Rules**:  
-  - Must be used whenever a question violates **QuestionRules** (**MUST**).  
-
----
-
-### get_questions
-- **Description**: Retrieve all questions currently in the **QuestionStack**, returned as multi-line text.  
-- **Rules**:  
-  - Should always be called before finalizing to ensure compliance with **QuestionRules** (**SHOULD**).  
-                """},
+                {"role": "system", "content": QUESTION_AGENT_SYSTEM_PROMPT},
+                {"role": "system", "content": self.language_prompt()},
                 {"role": "system", "content": f"""
 #User Info
 - 这里记载了User在数据库中记录了多少信息, 如果你使用search_resource工具, 会在下方列出的信息内检索
@@ -251,4 +125,5 @@ C. ありがとう
             agent=question_agent,
             payload=payload,
             config=config,
+            phase="make_questions",
         )
\ No newline at end of file
@@ -1,6 +1,6 @@
 from typing import Annotated, List, Union
 from pydantic import Field, RootModel
-from app.services.agent.core.schema import AgentResultEvent,AgentThinkingEvent,AgentMessageEvent,AgentStreamChunkEvent,AgentStreamEndEvent,AgentToolCallEvent
+from app.services.agent.core.schema import AgentResultEvent,AgentThinkingEvent,AgentMessageEvent,AgentStreamChunkEvent,AgentStreamEndEvent,AgentToolCallEvent,AgentErrorEvent
 from app.services.question.types import QuestionUnion
 
 class QuestionAgentResult(AgentResultEvent):
@@ -9,7 +9,7 @@ class QuestionAgentResult(AgentResultEvent):
 # 联合类型, 用于在StreamingResponse中使用
 # OpenAPI看起来会通过Field的discriminator来判断是哪个类型, 并且自动Enum到对应的类型
 QuestionAgentEventUnion = Annotated[
-    Union[AgentMessageEvent, QuestionAgentResult, AgentThinkingEvent, AgentStreamChunkEvent, AgentStreamEndEvent, AgentToolCallEvent],
+    Union[AgentMessageEvent, QuestionAgentResult, AgentThinkingEvent, AgentStreamChunkEvent, AgentStreamEndEvent, AgentToolCallEvent, AgentErrorEvent],
     Field(discriminator="type"),
 ]
 class QuestionAgentEvent(RootModel[QuestionAgentEventUnion]):
@@ -12,10 +12,7 @@ from app.infra.context import uow_ctx
 from app.infra.uow  import UnitOfWork
 from app.core.db.base import BaseModel
 from app.core.db.repository import Repository
-from app.infra.vector.operations import (
-    queue_vector_from_instance,
-    queue_vector_delete_for_instance
-)
+from app.infra.vector.outbox import enqueue_vector_upsert, enqueue_vector_delete
 
 # 类型参数: 受 BaseModel 约束
 T = TypeVar("T", bound=BaseModel)
@@ -25,6 +22,7 @@ class BaseService(Generic[T]):  # pylint: disable=too-few-public-methods
     """High-level CRUD helper bound to a specific repository.
 
     DB 操作と Qdrant ベクター操作を同一(どういつ) UnitOfWork で扱(あつか)います。
+    ベクターは同(おな)じ DB transaction の outbox に記録(きろく)し、背景(はいけい) worker が同期(どうき)します。
     """
 
     def __init__(self, repository: Repository[T]):
@@ -50,14 +48,16 @@ class BaseService(Generic[T]):  # pylint: disable=too-few-public-methods
         if "user_id" not in data:
             data["user_id"] = self._uow.current_user_id
         instance: T = await self._repo.create(self._uow.db, data)
-        queue_vector_from_instance(instance, self._uow.vector)
+        # 与业务数据同一事务写入 outbox, embedding 与 Qdrant 由后台 worker 处理
+        enqueue_vector_upsert(self._uow.db, instance)
         return instance
 
     async def update(self, data: Dict[str, Any]) -> Optional[T]:
         _id = data.pop("id")
         instance = await self._repo.update(self._uow.db, _id, data)
         if instance is not None:
-            queue_vector_from_instance(instance, self._uow.vector)
+            # 只有向量字段被更新时才入队
+            enqueue_vector_upsert(self._uow.db, instance, changed=data.keys())
         return instance
 
     async def delete(self, id_: Any) -> Optional[T]:
@@ -67,7 +67,7 @@ class BaseService(Generic[T]):  # pylint: disable=too-few-public-methods
             return None
 
         # 删除向量
-        queue_vector_delete_for_instance(instance, self._uow.vector)
+        enqueue_vector_delete(self._uow.db, instance)
         # 删除数据库记录
         deleted = await self._repo.delete(self._uow.db, id_)
         return deleted 
\ No newline at end of file
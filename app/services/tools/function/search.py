@@ -9,6 +9,7 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Callable, Coroutine, Literal
 
+from qdrant_client.http.models import FieldCondition, Filter, MatchValue
 from sqlalchemy import select
 
 from app.infra.context import uow_ctx
@@ -18,9 +19,10 @@ from app.infra.models import mistake as _mistake_model
 from app.infra.models import story as _story_model
 from app.infra.models import memory as _memory_model
 
+from app.core.tracing import span
 from app.core.vector.embeddings import get_embedding
 from app.core.vector.provider import get_qdrant_client
-from app.infra.vector.collections import VectorCollection
+from app.infra.vector.collections import SEARCH_PARAMS, VectorCollection, vector_dimension
 
 # ------------------------------------------------------------------
 # Resource meta-definition
@@ -36,41 +38,46 @@ ResourceLiteral = Literal[
 
 _SEARCH_META: Dict[ResourceLiteral, Dict[str, Any]] = {
     "vocab": {
+        "collection": VectorCollection.VOCAB,
         "model": _vocab_model.Vocab,
         "fields": {
-            "name": {"vector": True, "collection": VectorCollection.VOCAB_NAME},
-            "usage": {"vector": True, "collection": VectorCollection.VOCAB_USAGE},
+            "name": {"vector": True},
+            "usage": {"vector": True},
         },
     },
     "grammar": {
+        "collection": VectorCollection.GRAMMAR,
         "model": _grammar_model.Grammar,
         "fields": {
-            "name": {"vector": True, "collection": VectorCollection.GRAMMAR_NAME},
-            "usage": {"vector": True, "collection": VectorCollection.GRAMMAR_USAGE},
+            "name": {"vector": True},
+            "usage": {"vector": True},
         },
     },
     "memory": {
+        "collection": VectorCollection.MEMORY,
         "model": _memory_model.Memory,
         "fields": {
-            "content": {"vector": True, "collection": VectorCollection.MEMORY_CONTENT},
-            "summary": {"vector": True, "collection": VectorCollection.MEMORY_SUMMARY},
+            "content": {"vector": True},
+            "summary": {"vector": True},
         },
     },
     "story": {
+        "collection": VectorCollection.STORY,
         "model": _story_model.Story,
         "fields": {
-            "content": {"vector": True, "collection": VectorCollection.STORY_CONTENT},
-            "summary": {"vector": True, "collection": VectorCollection.STORY_SUMMARY},
-            "category": {"vector": True, "collection": VectorCollection.STORY_CATEGORY},
+            "content": {"vector": True},
+            "summary": {"vector": True},
+            "category": {"vector": True},
         },
     },
     "mistake": {
+        "collection": VectorCollection.MISTAKE,
         "model": _mistake_model.Mistake,
         "fields": {
-            "question": {"vector": True, "collection": VectorCollection.MISTAKE_QUESTION},
-            "answer": {"vector": True, "collection": VectorCollection.MISTAKE_ANSWER},
-            "correct_answer": {"vector": True, "collection": VectorCollection.MISTAKE_CORRECT_ANSWER},
-            "error_reason": {"vector": True, "collection": VectorCollection.MISTAKE_ERROR_REASON},
+            "question": {"vector": True},
+            "answer": {"vector": True},
+            "correct_answer": {"vector": True},
+            "error_reason": {"vector": True},
         },
     },
 }
@@ -140,21 +147,26 @@ async def search_resource(
         res = await uow.db.execute(stmt)
         return [_to_dict(r) for r in res.scalars().all()]
 
-    # vector search
-    collection: VectorCollection = field_cfg["collection"]
-    embedding = get_embedding(query)
+    # vector search (一个资源一个 collection, 字段名即 named vector 名)
+    collection: VectorCollection = meta["collection"]
+    embedding = get_embedding(query, vector_dimension(collection, field))
     client = get_qdrant_client()
     
     # 获取qdrant的client
-    q_filter = {"must": [{"key": "user_id", "match": {"value": uow.current_user.id}}]}
+    q_filter = Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=uow.current_user.id))])
 
     # 进行向量查询
-    points = client.search(
-        collection_name=collection.value,
-        query_vector=embedding,
-        limit=limit,
-        query_filter=q_filter,
-    )
+    with span("vector.query", collection=collection.value, using=field, limit=limit) as query_span:
+        points = client.query_points(
+            collection_name=collection.value,
+            query=embedding,
+            using=field,
+            limit=limit,
+            query_filter=q_filter,
+            search_params=SEARCH_PARAMS[collection],
+            with_payload=["origin_id"],
+        ).points
+        query_span.set_attribute("hits", len(points))
 
     # 获取原始id
     origin_ids = [p.payload.get("origin_id") for p in points if p.payload.get("origin_id")]
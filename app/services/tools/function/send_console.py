@@ -4,6 +4,10 @@
 
 from __future__ import annotations
 
+import logging
+
+logger = logging.getLogger(__name__)
+
 
 SEND_CONSOLE_SCHEMA = {
     "type": "function",
@@ -22,4 +26,4 @@ SEND_CONSOLE_SCHEMA = {
 
 async def send_console(message: str) -> None:
     """Send a message to the console"""
-    print(message)
\ No newline at end of file
+    logger.info(message)
\ No newline at end of file
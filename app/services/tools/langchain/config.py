@@ -0,0 +1,18 @@
+"""
+Helpers for tools that read per-run state from the LangGraph run config.
+
+Graph は起動時(きどうじ)に共有(きょうゆう)されるため、リクエストごとの object は
+``config["configurable"]`` から取得(しゅとく)します。
+"""
+
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+
+
+def get_configurable(config: RunnableConfig, key: str) -> Any:
+    """Read a per-run object (agent, question stack ...) injected through the run config."""
+    configurable = (config or {}).get("configurable") or {}
+    if key not in configurable:
+        raise KeyError(f"{key} missing in run config")
+    return configurable[key]
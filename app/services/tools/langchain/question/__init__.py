@@ -1,8 +1,8 @@
 # 新建
 """Question tool package.
 
-遍历当前子包下的模块，收集 `build_tools(stack)` 返回的 StructuredTool 列表，
-供 `QuestionStack` 使用。"""
+遍历当前子包下的模块，收集 `build_tools()` 返回的 StructuredTool 列表，
+供 `QuestionStack` 使用。工具在运行时从 run config 中读取当前请求的 QuestionStack。"""
 
 from __future__ import annotations
 
@@ -13,7 +13,7 @@ from typing import List
 from langchain_core.tools import StructuredTool
 
 
-def gather_tools(stack) -> List[StructuredTool]:
+def gather_tools() -> List[StructuredTool]:
     """遍历子模块，收集工具。"""
     tools: List[StructuredTool] = []
     pkg = __name__  # e.g. app.services.tools.langchain.question
@@ -22,9 +22,7 @@ def gather_tools(stack) -> List[StructuredTool]:
         build = getattr(module, "build_tools", None)
         if build is None:
             continue
-        # 对每个子模块注入 QuestionStack 的内部列表 `questions`，
-        # 避免在 add_*_question 中直接调用 `append` 时出现属性缺失错误。
-        built = build(stack.questions)
+        built = build()
         if isinstance(built, list):
             tools.extend(built)
         elif built is not None:
@@ -1,10 +1,12 @@
 from app.services.question.types import AssemblyQuestion
 from typing import List, Union
 from langchain_core.tools import StructuredTool
+from langchain_core.runnables import RunnableConfig
 from functools import partial
 from pydantic import BaseModel, Field
 from app.services.question.base.spec import QuestionSpec
 from app.services.question.types import QuestionUnion
+from app.services.tools.langchain.question_stack import get_question_stack
 import random
 from collections import Counter
 # 搜索参数
@@ -14,11 +16,12 @@ class QuestionArgs(BaseModel):
     correct_answer: Union[str, List[str]] = Field(..., description="Correct answer (single string or list)")
 # 创建题
 async def add_assembly_question(
-    stack: List[QuestionUnion],
     stem: str,
     options: List[str],
-    correct_answer: Union[str, List[str]]
+    correct_answer: Union[str, List[str]],
+    config: RunnableConfig,
 ) -> str:
+    stack: List[QuestionUnion] = get_question_stack(config).questions
     if len(stack) >= 8:
         return f"You have reached the maximum number of questions (8). Please delete some questions first."
     # 如果传入的是 str，则转为单元素 list
@@ -43,10 +46,10 @@ async def add_assembly_question(
     message = f"{len(stack)}/8(Max) AssemblyQuestion added, stem: {stem}"
     return message
 # 制作函数, 注入应该注入的内容
-def build_tools(stack: List[QuestionUnion]) -> StructuredTool:
+def build_tools() -> StructuredTool:
     return StructuredTool.from_function(
         name="add_assembly_question",
-        coroutine=partial(add_assembly_question, stack=stack),
+        coroutine=add_assembly_question,
         description=(
             """
 Add a assembly question to the stack.
@@ -1,10 +1,12 @@
 from app.services.question.types import ChoiceQuestion
 from typing import List
 from langchain_core.tools import StructuredTool
+from langchain_core.runnables import RunnableConfig
 from functools import partial
 from pydantic import BaseModel, Field
 from app.services.question.base.spec import QuestionSpec
 from app.services.question.types import QuestionUnion
+from app.services.tools.langchain.question_stack import get_question_stack
 # 搜索参数
 class QuestionArgs(BaseModel):
     stem: str = Field(..., description="Question stem")
@@ -12,11 +14,12 @@ class QuestionArgs(BaseModel):
     correct_answer: str = Field(..., description="Correct answer")
 # 创建题
 async def add_choice_question(
-    stack: List[QuestionUnion],
     stem: str, 
     options: List[str], 
-    correct_answer: str
+    correct_answer: str,
+    config: RunnableConfig,
 ) -> str:
+    stack: List[QuestionUnion] = get_question_stack(config).questions
     if len(stack) >= 8:
         return f"You have reached the maximum number of questions (8). Please delete some questions first."
     # 确保correct_answer在options中
@@ -27,10 +30,10 @@ async def add_choice_question(
     message = f"{len(stack)}/8(Max) ChoiceQuestion added, stem: {stem}"
     return message
 # 制作函数, 注入应该注入的内容
-def build_tools(stack: List[QuestionUnion]) -> StructuredTool:
+def build_tools() -> StructuredTool:
     return StructuredTool.from_function(
         name="add_choice_question",
-        coroutine=partial(add_choice_question, stack=stack),
+        coroutine=add_choice_question,
         description=(
             """
 Add a choice question to the stack.
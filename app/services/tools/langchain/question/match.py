@@ -2,10 +2,12 @@ from app.services.question.types import MatchQuestion
 import random
 from typing import List, Tuple
 from langchain_core.tools import StructuredTool
+from langchain_core.runnables import RunnableConfig
 from functools import partial
 from pydantic import BaseModel, Field
 from app.services.question.base.spec import QuestionSpec
 from app.services.question.types import QuestionUnion
+from app.services.tools.langchain.question_stack import get_question_stack
 # 搜索参数
 class AnswerPair(BaseModel):
     left: str = Field(..., description="Left option")
@@ -17,12 +19,13 @@ class QuestionArgs(BaseModel):
     correct_answer: List[AnswerPair] = Field(..., description="Correct answer pairs")
 # 创建题
 async def add_match_question(
-    stack: List[QuestionUnion],
     stem: str,
     left_options: List[str],
     right_options: List[str],
-    correct_answer: List[AnswerPair]
+    correct_answer: List[AnswerPair],
+    config: RunnableConfig,
 ) -> str:
+    stack: List[QuestionUnion] = get_question_stack(config).questions
     if len(stack) >= 8:
         return f"You have reached the maximum number of questions (8). Please delete some questions first."
     correct_pairs: List[Tuple[str, str]] = [(pair.left, pair.right) for pair in correct_answer]
@@ -51,10 +54,10 @@ async def add_match_question(
     message = f"{len(stack)}/8(Max) MatchQuestion added, stem: {stem}"
     return message
 # 制作函数, 注入应该注入的内容
-def build_tools(stack: List[QuestionUnion]) -> StructuredTool:
+def build_tools() -> StructuredTool:
     return StructuredTool.from_function(
         name="add_match_question",
-        coroutine=partial(add_match_question, stack=stack),
+        coroutine=add_match_question,
         description=(
             """
             Add a match question to the stack.
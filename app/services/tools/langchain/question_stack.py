@@ -1,11 +1,15 @@
-from functools import partial
 from typing import List
 
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
 
 from app.infra.context import uow_ctx
 from app.services.question.types import QuestionUnion
+from app.services.tools.langchain.config import get_configurable
+
+# run config 中保存当前请求 QuestionStack 的 key
+QUESTION_STACK_KEY = "question_stack"
 
 class EmptyArgs(BaseModel):
     pass
@@ -15,36 +19,63 @@ class DeleteQuestionArgs(BaseModel):
 
 
 class QuestionStack():
-    
+
     def __init__(self):
         self.uow = uow_ctx.get()
         self.questions : List[QuestionUnion] = []
-        
-        
+
+
     def get_tools(self) -> List[StructuredTool]:
         from app.services.tools.langchain.question import gather_tools
-        return gather_tools(self)
-    
-    def build_delete_question_tool(self) -> StructuredTool:
-        return StructuredTool.from_function(
-            name="delete_question",
-            description="Delete a question from the stack. Deleting a question shifts subsequent indices",
-            func=self.delete_question,
-            args_schema=DeleteQuestionArgs,
-        )
-    def build_get_questions_prompt_tool(self) -> StructuredTool:
-        return StructuredTool.from_function(
-            name="get_questions",
-            description="Return all questions in the stack as a single multi-line prompt.",
-            func=self.get_questions_prompt,  # 或者 func=self.get_questions_prompt（同步）
-            args_schema=EmptyArgs,  # 无参数时传空schema，调用时传 {}
-        )
+        return gather_tools()
+
     def delete_question(self, index: int) -> str:
         if index < 0 or index >= len(self.questions):
             return f"Index out of range, index: {index}, length: {len(self.questions)}"
         self.questions.pop(index)
         return f"Question deleted, index: {index}, length: {len(self.questions)}"
-    
+
     # 获取目前所有的问题的prompt
     def get_questions_prompt(self) -> str:
-        return "\n".join([f"Question {index}: {question.prompt()}" for index, question in enumerate(self.questions)])
\ No newline at end of file
+        return "\n".join([f"Question {index}: {question.prompt()}" for index, question in enumerate(self.questions)])
+
+
+# 从 run config 中取出当前请求的 QuestionStack
+def get_question_stack(config: RunnableConfig) -> QuestionStack:
+    return get_configurable(config, QUESTION_STACK_KEY)
+
+
+def delete_question(index: int, config: RunnableConfig) -> str:
+    return get_question_stack(config).delete_question(index)
+
+
+def get_questions_prompt(config: RunnableConfig) -> str:
+    return get_question_stack(config).get_questions_prompt()
+
+
+def build_delete_question_tool() -> StructuredTool:
+    return StructuredTool.from_function(
+        name="delete_question",
+        description="Delete a question from the stack. Deleting a question shifts subsequent indices",
+        func=delete_question,
+        args_schema=DeleteQuestionArgs,
+    )
+
+
+def build_get_questions_prompt_tool() -> StructuredTool:
+    return StructuredTool.from_function(
+        name="get_questions",
+        description="Return all questions in the stack as a single multi-line prompt.",
+        func=get_questions_prompt,
+        args_schema=EmptyArgs,  # 无参数时传空schema，调用时传 {}
+    )
+
+
+# 题目相关的全部工具: delete / get / add_*_question, 顺序固定 (工具描述也是 prompt 前缀的一部分)
+def get_question_stack_tools() -> List[StructuredTool]:
+    from app.services.tools.langchain.question import gather_tools
+    return [
+        build_delete_question_tool(),
+        build_get_questions_prompt_tool(),
+        *gather_tools(),
+    ]
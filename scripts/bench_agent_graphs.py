@@ -0,0 +1,88 @@
+"""
+Benchmark: compile agent graphs per request vs. reuse precompiled graphs.
+
+Agent graph をリクエストごとに compile する場合(ばあい)と、起動時(きどうじ)に compile した
+graph を再利用(さいりよう)する場合の比較(ひかく)です。LLM は呼(よ)び出(だ)しません。
+
+Usage:
+    python -m scripts.bench_agent_graphs --iterations 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import time
+
+# 只编译 graph, 不会真正调用 OpenAI; 没有配置时给一个占位 key
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langgraph.prebuilt import create_react_agent  # noqa: E402
+
+from app.services.agent.core.graph import AGENT_CHECKPOINTER, compile_agent_graphs, get_agent_model, get_graph  # noqa: E402
+from app.services.agent.question.agent import build_question_graph  # noqa: E402,F401
+from app.services.agent.record.agent import (  # noqa: E402
+    build_record_memory_graph,
+    build_record_vocab_grammar_graph,
+    build_suggestion_graph,
+)
+
+# 一次 record 请求使用的 graph (record 三个阶段), 加上一次 question 请求
+PER_REQUEST_BUILDERS = [
+    build_question_graph,
+    build_record_vocab_grammar_graph,
+    build_record_memory_graph,
+    build_suggestion_graph,
+]
+GRAPH_NAMES = ["question.make_questions", "record.vocab_grammar", "record.memory", "record.suggestion"]
+
+
+def bench(fn, iterations: int) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def per_request() -> None:
+    # 旧实现: 每个阶段重新创建工具 (StructuredTool.from_function) 并 compile
+    for builder in PER_REQUEST_BUILDERS:
+        builder()
+
+
+def precompiled() -> None:
+    for name in GRAPH_NAMES:
+        get_graph(name)
+
+
+def report(label: str, samples: list[float]) -> None:
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:<14} mean={statistics.mean(samples):8.3f}ms  p50={statistics.median(samples):8.3f}ms  p99={p99:8.3f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Agent graph compile benchmark")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    # 预热模型与 import
+    get_agent_model()
+    create_react_agent(model=get_agent_model(), tools=[], checkpointer=AGENT_CHECKPOINTER)
+
+    start = time.perf_counter()
+    compile_agent_graphs()
+    print(f"startup compile: {(time.perf_counter() - start) * 1000:.3f}ms (once per worker)")
+
+    old = bench(per_request, args.iterations)
+    new = bench(precompiled, args.iterations)
+    report("per-request", old)
+    report("precompiled", new)
+    print(f"saving per request: {statistics.mean(old) - statistics.mean(new):.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark: requests/s and latency of the agent SSE endpoints.
+
+Agent の SSE endpoint（question / record）の throughput と latency を測(はか)ります。
+LLM は fake model（app/llm/fake.py）にして、orchestration（graph / event stream / tool / DB）の
+オーバーヘッドだけを見(み)ます。
+
+先用 fake 模型启动服务 (embedding 也改为本地后端, 不需要网络):
+    LLM_PROVIDER=fake EMBEDDING_PROVIDER=hash LLM_FAKE_LATENCY_MS=300 uvicorn app.main:app
+
+再运行:
+    python -m scripts.bench_agent_streams --url http://localhost:8000 --requests 200 --concurrency 20
+
+每个请求记录: 第一个 SSE event 的时间 (ttfe) 与收到 result event 的总时间。
+record 的请求体包含一道答错的选择题, 也会经过 generate_error_reason。
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+QUESTION_PATH = "/v1/question/agent/question/stream"
+RECORD_PATH = "/v1/question/agent/record/stream"
+
+QUESTION_BODY = "食べ物に関する問題を作ってください"
+RECORD_BODY = {
+    "user_input": "食べ物の問題",
+    "questions": [
+        {"question_type": "choice", "stem": "魚___食べます。", "options": ["を", "が", "に", "で"],
+         "correct_answer": "を", "answer": "が"},
+        {"question_type": "choice", "stem": "水___飲みます。", "options": ["を", "が", "に", "で"],
+         "correct_answer": "を", "answer": "を"},
+    ],
+}
+ENDPOINTS = {"question": (QUESTION_PATH, QUESTION_BODY), "record": (RECORD_PATH, RECORD_BODY)}
+
+
+async def guest_headers(client: httpx.AsyncClient, users: int) -> List[Dict[str, str]]:
+    """Create ``users`` guest accounts and return their request headers."""
+    headers = []
+    for _ in range(users):
+        response = await client.post("/v1/auth/guest")
+        response.raise_for_status()
+        headers.append({
+            "Authorization": f"Bearer {response.json()['access_token']}",
+            "Accept-Language": "en",
+            "Target-Language": "ja",
+        })
+    return headers
+
+
+async def one_request(client: httpx.AsyncClient, path: str, body: Any, headers: Dict[str, str]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    first: Optional[float] = None
+    events = 0
+    result = False
+    async with client.stream("POST", path, json=body, headers=headers) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return {"ok": False, "error": f"HTTP {response.status_code}: {response.text[:200]}"}
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            if first is None:
+                first = time.perf_counter() - start
+            events += 1
+            if json.loads(line[6:]).get("type") == "result":
+                result = True
+    total = time.perf_counter() - start
+    if not result:
+        return {"ok": False, "error": "stream ended without a result event"}
+    return {"ok": True, "ttfe": first or total, "total": total, "events": events}
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+async def run_endpoint(
+    client: httpx.AsyncClient,
+    path: str,
+    body: Any,
+    headers: List[Dict[str, str]],
+    requests: int,
+    concurrency: int,
+) -> Dict[str, Any]:
+    """Send ``requests`` streams with at most ``concurrency`` in flight; return throughput and latency."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def guarded(index: int) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                return await one_request(client, path, body, headers[index % len(headers)])
+            except Exception as e:
+                return {"ok": False, "error": repr(e)}
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(guarded(i) for i in range(requests)))
+    wall = time.perf_counter() - start
+    ok = [r for r in results if r["ok"]]
+    errors = [r["error"] for r in results if not r["ok"]]
+    totals = [r["total"] * 1000 for r in ok]
+    ttfes = [r["ttfe"] * 1000 for r in ok]
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "ok": len(ok),
+        "failed": len(errors),
+        "rps": len(ok) / wall if wall else 0.0,
+        "p50_ms": _percentile(totals, 0.50),
+        "p99_ms": _percentile(totals, 0.99),
+        "ttfe_p50_ms": _percentile(ttfes, 0.50),
+        "ttfe_p99_ms": _percentile(ttfes, 0.99),
+        "events_per_request": sum(r["events"] for r in ok) / len(ok) if ok else 0.0,
+        "first_error": errors[0] if errors else "",
+    }
+
+
+def report(results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"\n{'endpoint':<10} {'conc':>5} {'ok':>6} {'fail':>5} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'ttfe p50':>9} {'ttfe p99':>9}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['concurrency']:>5} {r['ok']:>6} {r['failed']:>5} {r['rps']:>8.2f} {r['p50_ms']:>9.1f} "
+              f"{r['p99_ms']:>9.1f} {r['ttfe_p50_ms']:>9.1f} {r['ttfe_p99_ms']:>9.1f}")
+        if r["first_error"]:
+            print(f"  first error: {r['first_error']}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--users", type=int, default=10, help="guest users the requests are spread over")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        headers = await guest_headers(client, args.users)
+        results = {}
+        for name in args.endpoints:
+            path, body = ENDPOINTS[name]
+            print(f"{name}: {args.requests} requests, concurrency {args.concurrency}")
+            results[name] = await run_endpoint(client, path, body, headers, args.requests, args.concurrency)
+    report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,171 @@
+"""
+Benchmark: filtered vector search latency per tenant (user_id) at large point counts.
+
+user_id で filter した vector 検索(けんさく)の latency を、collection 設定(せってい)ごとに比較(ひかく)します。
+
+  baseline    : 旧设置, 全局 HNSW (m=16), 没有 payload index
+  multitenant : m=0 + payload_m=16 + user_id / language / model payload index (ensure_collections_exist 的设置)
+
+向量由 NumPy 随机生成 (固定 seed, 已归一化), 每个 point 随机分配给 --tenants 个用户之一。
+召回率以 exact=True (暴力搜索) 的结果为基准。需要 Qdrant server (本地 :memory: 模式不支持 index)。
+
+Usage:
+    python -m scripts.bench_vector_filter --points 1000000 --dim 1536 --tenants 10000
+    python -m scripts.bench_vector_filter --points 100000 --dim 256 --layouts multitenant --keep
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    CollectionStatus,
+    Distance,
+    FieldCondition,
+    Filter,
+    HnswConfigDiff,
+    MatchValue,
+    SearchParams,
+    VectorParams,
+)
+
+from app.infra.vector.collections import PAYLOAD_INDEXES
+
+VECTOR_NAME = "content"
+LANGUAGES = ("ja", "en", "zh")
+
+
+def _vectors(rng: np.random.Generator, n: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def create(client: QdrantClient, name: str, layout: str, dim: int) -> None:
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    hnsw = HnswConfigDiff(m=0, payload_m=16) if layout == "multitenant" else HnswConfigDiff(m=16)
+    client.create_collection(
+        collection_name=name,
+        vectors_config={VECTOR_NAME: VectorParams(size=dim, distance=Distance.COSINE)},
+        hnsw_config=hnsw,
+    )
+    if layout == "multitenant":
+        # payload_m 的图按 index 字段建立, 需在写入前创建
+        for field_name, schema in PAYLOAD_INDEXES.items():
+            client.create_payload_index(collection_name=name, field_name=field_name, field_schema=schema)
+
+
+def load(client: QdrantClient, name: str, points: int, dim: int, tenants: int, chunk: int, seed: int) -> float:
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    for offset in range(0, points, chunk):
+        n = min(chunk, points - offset)
+        users = rng.integers(1, tenants + 1, size=n)
+        client.upload_collection(
+            collection_name=name,
+            vectors={VECTOR_NAME: _vectors(rng, n, dim)},
+            payload=[
+                {"user_id": int(u), "model": "Memory", "language": LANGUAGES[int(u) % len(LANGUAGES)], "origin_id": offset + i}
+                for i, u in enumerate(users)
+            ],
+            ids=range(offset, offset + n),
+            batch_size=256,
+            wait=True,
+        )
+        print(f"  {name}: {offset + n}/{points} points", end="\r", flush=True)
+    print()
+    return time.perf_counter() - start
+
+
+def wait_indexed(client: QdrantClient, name: str, timeout: float) -> float:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        info = client.get_collection(name)
+        if info.status == CollectionStatus.GREEN:
+            return time.perf_counter() - start
+        time.sleep(1)
+    print(f"  {name}: still indexing after {timeout:.0f}s, measuring anyway")
+    return time.perf_counter() - start
+
+
+def measure(client: QdrantClient, name: str, dim: int, tenants: int, queries: int, limit: int, seed: int) -> Dict[str, float]:
+    rng = np.random.default_rng(seed + 1)
+    query_vectors = _vectors(rng, queries, dim)
+    users = rng.integers(1, tenants + 1, size=queries)
+    latencies: List[float] = []
+    recalls: List[float] = []
+    for vector, user in zip(query_vectors, users):
+        q_filter = Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=int(user)))])
+        start = time.perf_counter()
+        hits = client.query_points(
+            collection_name=name, query=vector.tolist(), using=VECTOR_NAME, query_filter=q_filter, limit=limit,
+        ).points
+        latencies.append((time.perf_counter() - start) * 1000)
+        exact = client.query_points(
+            collection_name=name, query=vector.tolist(), using=VECTOR_NAME, query_filter=q_filter, limit=limit,
+            search_params=SearchParams(exact=True),
+        ).points
+        if exact:
+            recalls.append(len({h.id for h in hits} & {h.id for h in exact}) / len(exact))
+    latencies.sort()
+    return {
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "recall": float(np.mean(recalls)) if recalls else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=os.getenv("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--points", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--tenants", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--chunk", type=int, default=10_000, help="points generated per upload call")
+    parser.add_argument("--layouts", nargs="+", default=["baseline", "multitenant"], choices=["baseline", "multitenant"])
+    parser.add_argument("--index-timeout", type=float, default=3600)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark collections")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    # ":memory:" 只用于检查脚本本身 (不支持 index, 结果没有参考意义)
+    client = QdrantClient(location=args.url, timeout=120)
+    results = {}
+    for layout in args.layouts:
+        name = f"bench_filter_{layout}"
+        print(f"{layout}: loading {args.points} points ({args.dim} dim, {args.tenants} tenants)")
+        create(client, name, layout, args.dim)
+        load_seconds = load(client, name, args.points, args.dim, args.tenants, args.chunk, args.seed)
+        index_seconds = wait_indexed(client, name, args.index_timeout)
+        results[layout] = {
+            "load_s": load_seconds,
+            "index_s": index_seconds,
+            **measure(client, name, args.dim, args.tenants, args.queries, args.limit, args.seed),
+        }
+        if not args.keep:
+            client.delete_collection(name)
+
+    print(f"\n{'layout':<12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'recall':>7} {'load s':>8} {'index s':>8}")
+    for layout, r in results.items():
+        print(
+            f"{layout:<12} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+            f"{r['recall']:>7.3f} {r['load_s']:>8.1f} {r['index_s']:>8.1f}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark: recall / latency of scalar and binary quantization against plain float32 vectors.
+
+量子化(りょうしか)の種類(しゅるい)ごとに、vector 検索の recall と latency、1 vector あたりの RAM を比較(ひかく)します。
+
+  none   : 现在的设置, float32 全部在内存
+  scalar : int8 量化在内存, 原始向量在磁盘 (on_disk)
+  binary : 1 bit 量化在内存, 原始向量在磁盘 (on_disk)
+
+量化的 layout 分别测 rescore 关闭 / 开启 (oversampling 倍候选 + 原始向量重新打分)。
+向量在本地生成: 围绕 --clusters 个中心加噪声后归一化, 比纯随机向量更接近真实 embedding 的分布。
+召回率以 exact=True + 忽略量化 (= float32 暴力搜索) 的结果为基准。需要 Qdrant server (本地 :memory: 模式不支持量化)。
+
+Usage:
+    python -m scripts.bench_vector_quantization --points 200000 --dim 1536
+    python -m scripts.bench_vector_quantization --layouts none binary --oversampling 2 4 --json quant.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import QuantizationSearchParams, SearchParams
+
+from app.infra.vector.collections import QUANTIZATION_KINDS, vector_params
+from scripts.bench_vector_filter import wait_indexed
+
+VECTOR_NAME = "content"
+# 1 个向量在内存中的字节数 (不含 HNSW 图)
+RAM_BYTES = {"none": lambda dim: dim * 4, "scalar": lambda dim: dim, "binary": lambda dim: dim / 8}
+
+
+def _embeddings(rng: np.random.Generator, centers: np.ndarray, n: int, noise: float) -> np.ndarray:
+    picks = rng.integers(0, len(centers), size=n)
+    vectors = centers[picks] + noise * rng.standard_normal((n, centers.shape[1]), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def create(client: QdrantClient, name: str, kind: str, dim: int) -> None:
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    client.create_collection(collection_name=name, vectors_config={VECTOR_NAME: vector_params(kind, size=dim)})
+
+
+def load(client: QdrantClient, name: str, centers: np.ndarray, points: int, noise: float, chunk: int, seed: int) -> float:
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    for offset in range(0, points, chunk):
+        n = min(chunk, points - offset)
+        client.upload_collection(
+            collection_name=name,
+            vectors={VECTOR_NAME: _embeddings(rng, centers, n, noise)},
+            payload=[{"user_id": 1, "model": "Memory", "origin_id": offset + i} for i in range(n)],
+            ids=range(offset, offset + n),
+            batch_size=256,
+            wait=True,
+        )
+        print(f"  {name}: {offset + n}/{points} points", end="\r", flush=True)
+    print()
+    return time.perf_counter() - start
+
+
+def _search(client: QdrantClient, name: str, vector: np.ndarray, limit: int, params: Optional[SearchParams]):
+    return client.query_points(
+        collection_name=name, query=vector.tolist(), using=VECTOR_NAME, limit=limit, search_params=params,
+    ).points
+
+
+def measure(
+    client: QdrantClient, name: str, queries: np.ndarray, limit: int, params: Optional[SearchParams],
+) -> Dict[str, float]:
+    exact_params = SearchParams(exact=True, quantization=QuantizationSearchParams(ignore=True))
+    latencies: List[float] = []
+    recalls: List[float] = []
+    for vector in queries:
+        start = time.perf_counter()
+        hits = _search(client, name, vector, limit, params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        exact = _search(client, name, vector, limit, exact_params)
+        if exact:
+            recalls.append(len({h.id for h in hits} & {h.id for h in exact}) / len(exact))
+    latencies.sort()
+    return {
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "recall": float(np.mean(recalls)) if recalls else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=os.getenv("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--points", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=256, help="number of topic centers for the generated embeddings")
+    parser.add_argument("--noise", type=float, default=0.6, help="spread around each center (larger = more uniform)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--oversampling", type=float, nargs="+", default=[2.0])
+    parser.add_argument("--chunk", type=int, default=10_000, help="points generated per upload call")
+    parser.add_argument("--layouts", nargs="+", default=list(QUANTIZATION_KINDS), choices=QUANTIZATION_KINDS)
+    parser.add_argument("--index-timeout", type=float, default=3600)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark collections")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((args.clusters, args.dim), dtype=np.float32)
+    queries = _embeddings(np.random.default_rng(args.seed + 1), centers, args.queries, args.noise)
+
+    # ":memory:" 只用于检查脚本本身 (不支持量化, 结果没有参考意义)
+    client = QdrantClient(location=args.url, timeout=120)
+    results: Dict[str, Dict[str, float]] = {}
+    for kind in args.layouts:
+        name = f"bench_quant_{kind}"
+        print(f"{kind}: loading {args.points} points ({args.dim} dim)")
+        create(client, name, kind, args.dim)
+        load_seconds = load(client, name, centers, args.points, args.noise, args.chunk, args.seed)
+        index_seconds = wait_indexed(client, name, args.index_timeout)
+        common = {"load_s": load_seconds, "index_s": index_seconds, "ram_bytes": RAM_BYTES[kind](args.dim)}
+
+        if kind == "none":
+            results[kind] = common | measure(client, name, queries, args.limit, None)
+        else:
+            no_rescore = SearchParams(quantization=QuantizationSearchParams(rescore=False))
+            results[kind] = common | measure(client, name, queries, args.limit, no_rescore)
+            for oversampling in args.oversampling:
+                rescore = SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=oversampling))
+                results[f"{kind}+rescore x{oversampling:g}"] = common | measure(
+                    client, name, queries, args.limit, rescore
+                )
+        if not args.keep:
+            client.delete_collection(name)
+
+    print(f"\n{'layout':<22} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'recall':>7} {'RAM B/vec':>10} {'index s':>8}")
+    for layout, r in results.items():
+        print(
+            f"{layout:<22} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+            f"{r['recall']:>7.3f} {r['ram_bytes']:>10.0f} {r['index_s']:>8.1f}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
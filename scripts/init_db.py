@@ -8,7 +8,7 @@ from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from app.infra.models import *
 from app.core.vector.provider import make_qdrant_client
-from app.infra.vector.collections import COLLECTIONS_CONFIG
+from app.infra.vector.operations import ensure_collections_exist
 
 # 加载环境变量
 load_dotenv()
@@ -55,15 +55,8 @@ async def init_collections():
     print("Initializing the collections...")
     
     qdrant_client = make_qdrant_client()
-    # 创建collection
-    for collection, params in COLLECTIONS_CONFIG.items():
-        if not qdrant_client.collection_exists(collection):
-            qdrant_client.create_collection(
-                collection_name=collection.value,
-                vectors_config=params
-            )
-        else:   
-            print(f"Collection {collection} already exists!")
+    # 创建collection (多租户 HNSW) 与 payload index; 已存在的 collection 只补建 index
+    ensure_collections_exist(qdrant_client)
     print("Collections initialized successfully!")
 if __name__ == "__main__":
     # 运行初始化函数
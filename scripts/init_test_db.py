@@ -29,6 +29,7 @@ from app.infra.models.mistake import Mistake
 from app.infra.models.refresh_token import RefreshToken
 from app.infra.models.story import Story
 from app.infra.vector.collections import COLLECTIONS_CONFIG
+from app.infra.vector.operations import ensure_collections_exist
 from app.core.vector.provider import make_qdrant_client
 # 或者可以直接导入所有模型
 # from app.infra.models import *
@@ -78,14 +79,8 @@ async def init_test_db():
     # 初始化collections
     os.environ["QDRANT_URL"] = TEST_QDRANT_URL
     qdrant_client = make_qdrant_client()
-    for collection, params in COLLECTIONS_CONFIG.items():
-        if not qdrant_client.collection_exists(collection):
-            qdrant_client.create_collection(
-                collection_name=collection.value,
-                vectors_config=params
-            )
-        else:
-            print(f"Collection {collection} already exists!")
+    # 与生产相同: 多租户 HNSW + payload index
+    ensure_collections_exist(qdrant_client)
             
     print("Test database initialized successfully!")
 
@@ -0,0 +1,110 @@
+"""
+Load test: how many concurrent agent streams fit into one DB pool.
+
+Agent stream を模擬(もぎ)し、connection を LLM 待(ま)ちの間(あいだ)も保持(ほじ)する場合(ばあい)と、
+読(よ)み取(と)り後(ご)に返(かえ)す場合(ばあい)の同時(どうじ)処理(しょり)数(すう)を比較(ひかく)します。
+
+每个模拟 stream: 认证查询 -> (查询 + 等待 LLM) x steps -> 最后一步写入 -> commit。
+  hold   : 旧行为, 第一次查询后一直占用连接直到 commit
+  release: 每次等待 LLM 前调用 release_connection (只读事务归还连接)
+
+默认使用临时 SQLite 文件 + 与生产相同的 QueuePool 参数, 也可以通过 --database-url 指向 Postgres。
+
+Usage:
+    python -m scripts.load_agent_streams --streams 5 10 15 30 60 --llm-latency 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.db.session import release_connection
+
+
+async def one_stream(maker: async_sessionmaker[AsyncSession], steps: int, llm_latency: float, release: bool) -> None:
+    async with maker() as session:
+        # 认证 (get_uow 中查询 user)
+        await session.execute(text("SELECT 1"))
+        for step in range(steps):
+            if release:
+                await release_connection(session)
+            # LLM 调用 / 流式输出
+            await asyncio.sleep(llm_latency)
+            # 工具调用: 查询, 最后一步写入
+            await session.execute(text("SELECT count(*) FROM load_records"))
+            if step == steps - 1:
+                await session.execute(text("INSERT INTO load_records (value) VALUES (:v)"), {"v": step})
+        await session.commit()
+
+
+async def run_level(maker, streams: int, steps: int, llm_latency: float, release: bool) -> dict:
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(one_stream(maker, steps, llm_latency, release) for _ in range(streams)),
+        return_exceptions=True,
+    )
+    failed = [r for r in results if isinstance(r, BaseException)]
+    return {
+        "streams": streams,
+        "ok": streams - len(failed),
+        "failed": len(failed),
+        "seconds": time.perf_counter() - start,
+        "error": type(failed[0]).__name__ if failed else "",
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Concurrent agent stream capacity")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--streams", type=int, nargs="+", default=[5, 10, 15, 30, 60])
+    parser.add_argument("--steps", type=int, default=4, help="LLM calls per stream")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per LLM call")
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--max-overflow", type=int, default=10)
+    parser.add_argument("--pool-timeout", type=float, default=1.0)
+    args = parser.parse_args()
+
+    tmpdir = None
+    database_url = args.database_url
+    if database_url is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite+aiosqlite:///{os.path.join(tmpdir.name, 'load.db')}"
+
+    engine = create_async_engine(
+        database_url,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=args.pool_size,
+        max_overflow=args.max_overflow,
+        pool_timeout=args.pool_timeout,
+    )
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE IF NOT EXISTS load_records (id INTEGER PRIMARY KEY, value INTEGER)"))
+    maker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+    print(f"pool_size={args.pool_size} max_overflow={args.max_overflow} pool_timeout={args.pool_timeout}s "
+          f"steps={args.steps} llm_latency={args.llm_latency}s")
+    for mode in ("hold", "release"):
+        capacity = 0
+        for streams in args.streams:
+            result = await run_level(maker, streams, args.steps, args.llm_latency, mode == "release")
+            if result["failed"] == 0:
+                capacity = streams
+            print(f"{mode:<8} streams={result['streams']:<4} ok={result['ok']:<4} failed={result['failed']:<4} "
+                  f"{result['seconds']:.2f}s {result['error']}")
+        print(f"{mode:<8} max concurrent streams without pool timeout: {capacity}")
+
+    await engine.dispose()
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,333 @@
+"""
+Load test: realistic request mix against the whole API with local stand-ins.
+
+API 全体(ぜんたい)に現実的(げんじつてき)なリクエストの組(く)み合(あ)わせで負荷(ふか)をかけ、
+scenario ごとの latency histogram と JSON baseline を出力(しゅつりょく)します。
+
+进程内启动 ``create_app()`` (uvicorn, 真实的 HTTP / SSE), 外部服务全部换成本地替代:
+  DB       : 临时 SQLite 文件 (或 --database-url 指向 Postgres)
+  Redis    : fakeredis
+  Qdrant   : QdrantClient(":memory:")
+  LLM      : ScriptedChatModel (LLM_PROVIDER=fake, app/llm/fake_trajectories.json)
+  embedding: hash 后端 (EMBEDDING_PROVIDER=hash)
+vector sync worker 也在同一进程中运行。
+
+每个虚拟用户: guest 注册 -> 写入少量 vocab / memory (不计时) -> 并发地按权重随机执行 --iterations 个 scenario (seed 固定)。
+
+Usage:
+    python -m scripts.load_api --users 10 --iterations 30
+    python -m scripts.load_api --write-baseline scripts/baselines/load_api.json
+    python -m scripts.load_api --baseline scripts/baselines/load_api.json   # p95 变慢超过 --tolerance 时退出码为 1
+"""
+
+from __future__ import annotations
+
+import os
+
+# 在导入 app 之前设置: 测试用 JWT 密钥, 本地 LLM / embedding, 由本脚本启动 sync worker
+os.environ.setdefault("TEST_MODE", "true")
+os.environ.setdefault("OPENAI_API_KEY", "sk-load-test")
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("EMBEDDING_PROVIDER", "hash")
+os.environ.setdefault("LLM_FAKE_LATENCY_MS", "50")
+os.environ.setdefault("LLM_FAKE_CHUNK_LATENCY_MS", "2")
+os.environ.setdefault("VECTOR_SYNC_ENABLED", "false")
+# 所有虚拟用户的请求都很密集, 压测的是应用本身而不是限流
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+# agent 的每次 LLM 调用都会扣除配额, guest 的默认配额不够跑完所有 iteration
+os.environ.setdefault("TOKEN_QUOTA", "2000000000")
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import json  # noqa: E402
+import random  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+from collections import defaultdict  # noqa: E402
+from typing import Any, Awaitable, Callable, Dict, List, Optional  # noqa: E402
+
+import fakeredis  # noqa: E402
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from qdrant_client import QdrantClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.core.db import get_engine, make_async_session_maker  # noqa: E402
+from app.core.db.base import Base  # noqa: E402
+from app.core.redis.provider import set_redis_client  # noqa: E402
+from app.core.vector import make_embedding_provider, set_qdrant_client  # noqa: E402
+from app.infra.vector.operations import ensure_collections_exist  # noqa: E402
+from app.infra.vector.outbox import VectorSyncWorker  # noqa: E402
+from app.llm import make_fake_chat_model, set_chat_model  # noqa: E402
+from app.main import create_app  # noqa: E402
+from app.services.agent.core.graph import compile_agent_graphs, set_agent_model  # noqa: E402
+from scripts.bench_agent_streams import QUESTION_BODY, QUESTION_PATH, RECORD_BODY, RECORD_PATH, one_request  # noqa: E402
+
+# histogram 的上界 (毫秒), 最后一个桶为 +Inf
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+Headers = Dict[str, str]
+Scenario = Callable[[httpx.AsyncClient, Headers], Awaitable[None]]
+
+
+# Scenarios
+
+async def guest_signup(client: httpx.AsyncClient, headers: Headers) -> None:
+    (await client.post("/v1/auth/guest")).raise_for_status()
+
+
+async def vocab_page(client: httpx.AsyncClient, headers: Headers) -> None:
+    (await client.get("/v1/vocab/page", params={"limit": 50}, headers=headers)).raise_for_status()
+
+
+async def memory_page(client: httpx.AsyncClient, headers: Headers) -> None:
+    (await client.get("/v1/memory/page", params={"limit": 50}, headers=headers)).raise_for_status()
+
+
+async def judge(client: httpx.AsyncClient, headers: Headers) -> None:
+    # 答错的题会调用一次 generate_error_reason
+    question = RECORD_BODY["questions"][0]
+    (await client.post("/v1/question/judge", json=question, headers=headers)).raise_for_status()
+
+
+async def record(client: httpx.AsyncClient, headers: Headers) -> None:
+    (await client.post("/v1/question/record", json=RECORD_BODY, headers=headers)).raise_for_status()
+
+
+async def _stream(client: httpx.AsyncClient, path: str, body: Any, headers: Headers) -> None:
+    result = await one_request(client, path, body, headers)
+    if not result["ok"]:
+        raise RuntimeError(result["error"])
+
+
+async def question_stream(client: httpx.AsyncClient, headers: Headers) -> None:
+    await _stream(client, QUESTION_PATH, QUESTION_BODY, headers)
+
+
+async def record_stream(client: httpx.AsyncClient, headers: Headers) -> None:
+    await _stream(client, RECORD_PATH, RECORD_BODY, headers)
+
+
+# 权重大致对应线上的比例: 浏览列表最多, agent 运行较少
+SCENARIOS: Dict[str, tuple[Scenario, int]] = {
+    "guest_signup": (guest_signup, 5),
+    "vocab_page": (vocab_page, 30),
+    "memory_page": (memory_page, 20),
+    "judge": (judge, 15),
+    "record": (record, 10),
+    "question_stream": (question_stream, 12),
+    "record_stream": (record_stream, 8),
+}
+
+
+# Stats
+
+class Recorder:
+    """Collect latencies (ms) and errors per scenario."""
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, List[str]] = defaultdict(list)
+
+    async def run(self, name: str, fn: Callable[[], Awaitable[None]]) -> None:
+        start = time.perf_counter()
+        try:
+            await fn()
+        except Exception as e:
+            self.errors[name].append(repr(e)[:300])
+            return
+        self.latencies[name].append((time.perf_counter() - start) * 1000)
+
+    def summary(self, wall: float) -> Dict[str, Dict[str, Any]]:
+        results = {}
+        for name in SCENARIOS:
+            samples = sorted(self.latencies.get(name, []))
+            errors = self.errors.get(name, [])
+            if not samples and not errors:
+                continue
+            histogram = [0] * (len(BUCKETS_MS) + 1)
+            for value in samples:
+                histogram[next((i for i, bound in enumerate(BUCKETS_MS) if value <= bound), len(BUCKETS_MS))] += 1
+            results[name] = {
+                "count": len(samples),
+                "errors": len(errors),
+                "rps": len(samples) / wall if wall else 0.0,
+                "mean_ms": sum(samples) / len(samples) if samples else 0.0,
+                "p50_ms": _percentile(samples, 0.50),
+                "p95_ms": _percentile(samples, 0.95),
+                "p99_ms": _percentile(samples, 0.99),
+                "histogram": dict(zip([*map(str, BUCKETS_MS), "+Inf"], histogram)),
+                "first_error": errors[0] if errors else "",
+            }
+        return results
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+# Stack
+
+def _sqlite_wal(dbapi_connection, _record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+async def start_stack(database_url: str, port: int):
+    """Boot the app with local stand-ins; return ``(base_url, stop)``."""
+    if database_url.startswith("sqlite"):
+        # 并发写入时等待锁而不是立即报错; WAL 让读取不被写入阻塞
+        make_async_session_maker(database_url, connect_args={"timeout": 30})
+        event.listen(get_engine().sync_engine, "connect", _sqlite_wal)
+    else:
+        make_async_session_maker(database_url)
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    qdrant = QdrantClient(":memory:")
+    set_qdrant_client(qdrant)
+    ensure_collections_exist(qdrant)
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    set_redis_client(redis_client)
+    make_embedding_provider("hash")
+    fake_model = make_fake_chat_model()
+    set_chat_model(fake_model)
+    set_agent_model(fake_model)
+    compile_agent_graphs()
+    worker_task = asyncio.create_task(VectorSyncWorker(redis_client=redis_client).run())
+
+    # lifespan 连接真实服务, 这里关闭, 由上面完成同样的初始化
+    server = uvicorn.Server(uvicorn.Config(create_app(), port=port, lifespan="off", log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+
+    async def stop() -> None:
+        server.should_exit = True
+        await server_task
+        worker_task.cancel()
+        await asyncio.gather(worker_task, return_exceptions=True)
+        await get_engine().dispose()
+        qdrant.close()
+        await redis_client.aclose()
+
+    return f"http://127.0.0.1:{bound_port}", stop
+
+
+async def prepare_user(client: httpx.AsyncClient, seed_items: int) -> Headers:
+    """Sign up a guest and create the rows the paging scenarios read; not measured."""
+    response = await client.post("/v1/auth/guest")
+    response.raise_for_status()
+    headers = {
+        "Authorization": f"Bearer {response.json()['access_token']}",
+        "Accept-Language": "en",
+        "Target-Language": "ja",
+    }
+    # 准备分页用的数据 (也会经过 outbox -> vector sync), 不计入结果
+    for i in range(seed_items):
+        await client.post("/v1/vocab/create", headers=headers, json={
+            "name": f"単語{i}", "usage": f"例文 {i} で使う", "status": 0.0, "language": "ja"})
+        await client.post("/v1/memory/create", headers=headers, json={
+            "content": f"ユーザーは {i} 番目の話題が好き", "category": "preference", "priority": 0, "language": "ja"})
+    return headers
+
+
+async def virtual_user(client: httpx.AsyncClient, recorder: Recorder, headers: Headers, rng: random.Random, iterations: int) -> None:
+    names = list(SCENARIOS)
+    weights = [SCENARIOS[name][1] for name in names]
+    for name in rng.choices(names, weights=weights, k=iterations):
+        await recorder.run(name, lambda fn=SCENARIOS[name][0]: fn(client, headers))
+
+
+# Report / baseline
+
+def report(results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"\n{'scenario':<16} {'count':>6} {'err':>4} {'req/s':>7} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)")
+    for name, r in results.items():
+        print(f"{name:<16} {r['count']:>6} {r['errors']:>4} {r['rps']:>7.2f} {r['mean_ms']:>8.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+    print("\nhistogram (count per bucket, upper bound in ms)")
+    bounds = [*map(str, BUCKETS_MS), "+Inf"]
+    print(f"{'':<16} " + " ".join(f"{b:>6}" for b in bounds))
+    for name, r in results.items():
+        print(f"{name:<16} " + " ".join(f"{r['histogram'][b]:>6}" for b in bounds))
+    for name, r in results.items():
+        if r["first_error"]:
+            print(f"{name}: first error: {r['first_error']}")
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float, floor_ms: float) -> List[str]:
+    """Return regressions: p95 slower than baseline by ``tolerance`` (and ``floor_ms``), or new errors."""
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        limit = max(base["p95_ms"] * (1 + tolerance), base["p95_ms"] + floor_ms)
+        if current["p95_ms"] > limit:
+            regressions.append(f"{name}: p95 {current['p95_ms']:.1f}ms > {limit:.1f}ms (baseline {base['p95_ms']:.1f}ms)")
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{name}: {current['errors']} errors (baseline {base['errors']})")
+    return regressions
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="default: temporary SQLite file")
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=30, help="scenarios per user")
+    parser.add_argument("--seed-items", type=int, default=5, help="vocab / memory rows created per user before the run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--write-baseline", help="write the results as the new baseline")
+    parser.add_argument("--baseline", help="compare against this baseline; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative p95 slowdown")
+    parser.add_argument("--floor-ms", type=float, default=20.0, help="ignore p95 slowdowns smaller than this")
+    args = parser.parse_args()
+
+    tmpdir: Optional[tempfile.TemporaryDirectory] = None
+    database_url = args.database_url
+    if database_url is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite+aiosqlite:///{os.path.join(tmpdir.name, 'load.db')}"
+
+    base_url, stop = await start_stack(database_url, args.port)
+    recorder = Recorder()
+    try:
+        limits = httpx.Limits(max_connections=args.users * 2)
+        async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+            # 准备阶段逐个执行, 只有 scenario 并发
+            users = [await prepare_user(client, args.seed_items) for _ in range(args.users)]
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                virtual_user(client, recorder, headers, random.Random(args.seed + i), args.iterations)
+                for i, headers in enumerate(users)
+            ))
+            wall = time.perf_counter() - start
+    finally:
+        await stop()
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    results = recorder.summary(wall)
+    report(results)
+    payload = {"args": {k: v for k, v in vars(args).items() if k != "database_url"}, "results": results}
+    for path in filter(None, (args.json, args.write_baseline)):
+        with open(path, "w") as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance, args.floor_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
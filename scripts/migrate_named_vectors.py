@@ -0,0 +1,102 @@
+"""
+Migrate per-field Qdrant collections into one collection per model with named vectors.
+
+field ごとの旧(きゅう) collection（例：mistake_question）を、model ごとの collection（mistake）の
+named vector（question / answer / ...）へ移行(いこう)します。
+
+- 旧 collection 的向量按 origin_id 合并到同一个 point (每个 point 只 upsert 一次), 已有的 named vector 会保留
+- payload 中旧的 content_hash (字符串) 合并为 {field: hash}; 没有 hash 的字段在下次更新时重新 embedding
+- 可重复执行; 加 --drop 时在迁移后删除旧 collection
+
+Usage:
+    python -m scripts.migrate_named_vectors [--batch-size 256] [--drop]
+"""
+
+from __future__ import annotations
+
+import argparse
+from typing import Any, Dict, Set
+
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import PointStruct
+
+from app.core.vector.provider import make_qdrant_client
+from app.infra.vector.collections import LEGACY_FIELD_COLLECTIONS, MODEL_FIELD_TO_COLLECTION
+from app.infra.vector.operations import ensure_collections_exist
+
+
+def _legacy_ids(client: QdrantClient, legacy: str, batch_size: int) -> Set[int]:
+    ids: Set[int] = set()
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=legacy, limit=batch_size, offset=offset, with_payload=False, with_vectors=False
+        )
+        ids.update(int(r.id) for r in records)
+        if offset is None or not records:
+            return ids
+
+
+def migrate_model(client: QdrantClient, model: str, batch_size: int) -> int:
+    """Merge every legacy collection of ``model`` into its named-vector collection; return the point count."""
+    legacy = {
+        field: name
+        for (mapped_model, field), name in LEGACY_FIELD_COLLECTIONS.items()
+        if mapped_model == model and client.collection_exists(name)
+    }
+    if not legacy:
+        return 0
+    target = MODEL_FIELD_TO_COLLECTION[(model, next(iter(legacy)))].value
+
+    # 先收集全部 id, 再按批次合并所有字段, 每个 point 只写入一次
+    ids = sorted(set().union(*(_legacy_ids(client, name, batch_size) for name in legacy.values())))
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        current = {int(p.id): p for p in client.retrieve(target, ids=batch, with_payload=True, with_vectors=True)}
+        payloads: Dict[int, Dict[str, Any]] = {i: dict(current[i].payload or {}) if i in current else {} for i in batch}
+        vectors: Dict[int, Dict[str, Any]] = {i: dict(current[i].vector or {}) if i in current else {} for i in batch}
+        hashes: Dict[int, Dict[str, str]] = {i: dict(payloads[i].get("content_hash") or {}) for i in batch}
+        for field, name in legacy.items():
+            for record in client.retrieve(name, ids=batch, with_payload=True, with_vectors=True):
+                origin_id = int(record.id)
+                legacy_payload = dict(record.payload or {})
+                if isinstance(legacy_payload.get("content_hash"), str):
+                    hashes[origin_id][field] = legacy_payload["content_hash"]
+                # 一行一个 point, field 不再需要
+                legacy_payload.pop("field", None)
+                legacy_payload.pop("content_hash", None)
+                payloads[origin_id] = legacy_payload | payloads[origin_id]
+                vectors[origin_id][field] = record.vector
+        client.upsert(
+            collection_name=target,
+            points=[
+                PointStruct(id=i, vector=vectors[i], payload=payloads[i] | {"content_hash": hashes[i]})
+                for i in batch
+            ],
+        )
+    return len(ids)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--drop", action="store_true", help="delete the legacy collections after migrating")
+    args = parser.parse_args()
+
+    client = make_qdrant_client()
+    ensure_collections_exist()
+
+    for model in dict.fromkeys(model for model, _field in LEGACY_FIELD_COLLECTIONS):
+        count = migrate_model(client, model, args.batch_size)
+        print(f"{model}: {count} points migrated")
+
+    if args.drop:
+        for legacy in LEGACY_FIELD_COLLECTIONS.values():
+            if client.collection_exists(legacy):
+                client.delete_collection(legacy)
+                print(f"Dropped {legacy}")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
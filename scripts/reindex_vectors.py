@@ -0,0 +1,104 @@
+"""
+Re-index Qdrant collections whose named-vector dimensions differ from ``COLLECTIONS_CONFIG``.
+
+EMBEDDING_DIMENSIONS を変(か)えた後(あと)、既存(きそん)の collection を新(あたら)しい次元(じげん)へ移行(いこう)します。
+
+- text-embedding-3 是 Matryoshka 表示: 已存储的向量截断到新维度并重新归一化即可, 不调用 embedding API
+- 流程: 写入临时 collection <name>__reindex -> 删除并按新配置重建 <name> -> 复制回来 -> 删除临时 collection
+- 只能缩小维度; 需要放大时删除该 collection 后重新同步 (re-embedding)
+- 执行期间请停止 vector sync worker (VECTOR_SYNC_ENABLED=false), 期间的变更保留在 outbox 中, 之后会补上
+
+Usage:
+    python -m scripts.reindex_vectors [--batch-size 256] [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+from typing import Dict, Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import PointStruct, VectorParams
+
+from app.core.vector.embeddings import truncate_embedding
+from app.core.vector.provider import make_qdrant_client
+from app.infra.vector.collections import COLLECTIONS_CONFIG
+from app.infra.vector.operations import create_vector_collection, ensure_collections_exist
+
+
+def _copy(
+    client: QdrantClient, source: str, target: str, batch_size: int, sizes: Optional[Dict[str, int]] = None
+) -> int:
+    """Copy every point of ``source`` into ``target``, truncating vectors to ``sizes`` when given."""
+    copied = 0
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=source, limit=batch_size, offset=offset, with_payload=True, with_vectors=True
+        )
+        points = []
+        for record in records:
+            vectors = dict(record.vector or {})
+            if sizes is not None:
+                vectors = {
+                    name: truncate_embedding(vector, sizes[name])
+                    for name, vector in vectors.items()
+                    if name in sizes
+                }
+            points.append(PointStruct(id=record.id, vector=vectors, payload=record.payload))
+        if points:
+            client.upsert(collection_name=target, points=points)
+            copied += len(points)
+        if offset is None or not records:
+            return copied
+
+
+def reindex_collection(client: QdrantClient, name: str, params: Dict[str, VectorParams], batch_size: int) -> int:
+    """Rebuild ``name`` with the vector sizes of ``params``; return the number of points moved (0 when unchanged)."""
+    current = client.get_collection(name).config.params.vectors or {}
+    sizes = {vector_name: p.size for vector_name, p in params.items()}
+    if {vector_name: p.size for vector_name, p in current.items()} == sizes:
+        return 0
+    grown = [n for n, size in sizes.items() if n in current and size > current[n].size]
+    if grown:
+        raise ValueError(f"{name}: cannot grow {grown} by truncation; drop the collection and re-sync instead")
+
+    temp = f"{name}__reindex"
+    if client.collection_exists(temp):
+        client.delete_collection(temp)
+    create_vector_collection(client, temp, params)
+    count = _copy(client, name, temp, batch_size, sizes)
+
+    client.delete_collection(name)
+    create_vector_collection(client, name, params)
+    _copy(client, temp, name, batch_size)
+    client.delete_collection(temp)
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--dry-run", action="store_true", help="only list the collections that need re-indexing")
+    args = parser.parse_args()
+
+    client = make_qdrant_client()
+    ensure_collections_exist(client)
+    for collection, params in COLLECTIONS_CONFIG.items():
+        name = collection.value
+        current = client.get_collection(name).config.params.vectors or {}
+        changes = {
+            vector_name: (current[vector_name].size if vector_name in current else None, p.size)
+            for vector_name, p in params.items()
+            if vector_name not in current or current[vector_name].size != p.size
+        }
+        if not changes:
+            continue
+        print(f"{name}: {', '.join(f'{n} {old} -> {new}' for n, (old, new) in changes.items())}")
+        if not args.dry_run:
+            print(f"{name}: {reindex_collection(client, name, params, args.batch_size)} points re-indexed")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Run the outbox -> Qdrant vector sync worker as a separate process.
+
+API プロセスと別(べつ)に embedding / Qdrant 同期(どうき)を実行(じっこう)します。
+
+API 进程设置 VECTOR_SYNC_ENABLED=false 后, 由本进程消费 outbox 与 Redis stream 通知;
+可以启动多个进程, outbox 行通过 FOR UPDATE SKIP LOCKED 分配。
+
+Usage:
+    python -m scripts.vector_sync_worker
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+from app.core.db import get_engine, make_async_session_maker
+from app.core.redis import make_redis_client
+from app.core.vector import make_qdrant_client
+from app.infra.vector.outbox import VectorSyncWorker, ensure_outbox_table
+
+
+async def main() -> None:
+    make_async_session_maker()
+    qdrant_client = make_qdrant_client()
+    redis_client = make_redis_client()
+    await ensure_outbox_table(get_engine())
+    print("Vector sync worker started")
+    try:
+        await VectorSyncWorker(redis_client=redis_client).run()
+    finally:
+        await get_engine().dispose()
+        qdrant_client.close()
+        await redis_client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
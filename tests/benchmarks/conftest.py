@@ -0,0 +1,63 @@
+"""
+Microbenchmark 用的 fixture (pytest-benchmark)。
+
+CPU だけを使(つか)う hot path を測(はか)ります。DB / Qdrant / LLM には接続(せつぞく)しません。
+
+运行与 baseline 比较:
+    python scripts/run_tests.py --benchmarks
+保存新的 baseline (tests/benchmarks/baselines/):
+    python scripts/run_tests.py --benchmarks --save-benchmark-baseline
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, List
+
+import pytest
+
+# 在导入 app 之前设置: 测试用 JWT 密钥 (verify_access_token)
+os.environ.setdefault("TEST_MODE", "true")
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from app.infra.context import uow_ctx  # noqa: E402
+
+# prompt builder 与 _to_dict 的行数
+ROWS = 256
+
+
+class RowsRepository:
+    """Repository stand-in: every read returns the same pre-built rows."""
+
+    def __init__(self, rows: List[Any]) -> None:
+        self.rows = rows
+
+    async def get_recent_records(self, db: Any, filter: Any = None, limit: int = 5) -> List[Any]:
+        return self.rows[:limit]
+
+    async def get_memory_by_language(self, user_id: int, language: str, limit: int = 256) -> List[Any]:
+        return self.rows[:limit]
+
+
+@pytest.fixture
+def uow():
+    """Minimal UnitOfWork context for the services (no DB session)."""
+    fake = SimpleNamespace(db=None, current_user=SimpleNamespace(id=1), current_user_id=1, target_language="ja")
+    token = uow_ctx.set(fake)
+    yield fake
+    uow_ctx.reset(token)
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine function to completion on a dedicated event loop."""
+    loop = asyncio.new_event_loop()
+    yield lambda fn, *args, **kwargs: loop.run_until_complete(fn(*args, **kwargs))
+    loop.close()
+
+
+@pytest.fixture
+def timestamps() -> List[datetime]:
+    start = datetime(2025, 1, 1)
+    return [start + timedelta(hours=i) for i in range(ROWS)]
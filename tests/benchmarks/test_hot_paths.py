@@ -0,0 +1,129 @@
+"""
+CPU-bound hot path 的 microbenchmark。
+
+每个 benchmark 的输入都在计时之外构建; 结果与本机 tests/benchmarks/baselines/ 中保存的 baseline 比较。
+"""
+
+import random
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from app.core.auth.jwt import create_access_token, verify_access_token  # noqa: E402
+from app.infra.models import Grammar, Memory, Mistake, Vocab  # noqa: E402
+from app.infra.vector.operations import _build_point  # noqa: E402
+from app.services.common.grammar import GrammarService  # noqa: E402
+from app.services.common.memory import MemoryService  # noqa: E402
+from app.services.common.mistake import MistakeService  # noqa: E402
+from app.services.common.vocab import VocabService  # noqa: E402
+from app.services.question.types import AssemblyQuestion, ChoiceQuestion, MatchQuestion, QuestionListAdapter  # noqa: E402
+from app.services.tools.function.search import _to_dict  # noqa: E402
+
+from tests.benchmarks.conftest import ROWS, RowsRepository  # noqa: E402
+
+# validate_python 的批量大小
+BATCH = 1000
+
+CHOICE = {"question_type": "choice", "stem": "「魚___食べます。」に入る助詞は？", "options": ["を", "が", "に", "で"],
+          "correct_answer": "を", "answer": "が"}
+MATCH = {"question_type": "match", "left_options": ["犬", "猫", "鳥", "魚"], "right_options": ["dog", "cat", "bird", "fish"],
+         "correct_answer": [["犬", "dog"], ["猫", "cat"], ["鳥", "bird"], ["魚", "fish"]]}
+ASSEMBLY = {"question_type": "assembly", "stem": "私は（　）を（　）。", "options": ["毎朝", "コーヒー", "飲みます", "、"],
+            "correct_answer": ["毎朝", "コーヒー", "を", "飲みます。"], "answer": ["毎朝", "「コーヒー」", "を", "飲みます！"]}
+
+
+# Question
+
+
+def test_assembly_normalize_tokens(benchmark):
+    benchmark.group = "question"
+    question = AssemblyQuestion.model_validate(ASSEMBLY)
+    tokens = ["「毎朝」", "ＣＯＦＦＥＥ", "を", "飲みます…", "（たぶん）", "！？"] * 4
+    assert benchmark(question._normalize_tokens, tokens)
+
+
+@pytest.mark.parametrize("payload", [CHOICE, MATCH, ASSEMBLY], ids=["choice", "match", "assembly"])
+def test_question_prompt(benchmark, payload):
+    benchmark.group = "question"
+    question = QuestionListAdapter.validate_python([payload])[0]
+    assert benchmark(question.prompt)
+
+
+def test_question_list_validate(benchmark):
+    benchmark.group = "question"
+    payloads = [random.Random(i).choice([CHOICE, MATCH, ASSEMBLY]) for i in range(BATCH)]
+    questions = benchmark(QuestionListAdapter.validate_python, payloads)
+    assert len(questions) == BATCH
+    assert {type(q) for q in questions} == {ChoiceQuestion, MatchQuestion, AssemblyQuestion}
+
+
+# Agent prompt builders (256 行)
+
+
+def _service(cls, rows):
+    service = cls()
+    service._repo = RowsRepository(rows)
+    return service
+
+
+def test_recent_vocab_prompt(benchmark, uow, run, timestamps):
+    benchmark.group = "prompt_for_agent"
+    rows = [Vocab(id=i, name=f"単語{i}", usage=f"単語{i}を使った例文です。", status=(i % 10) / 10, updated_at=t)
+            for i, t in enumerate(timestamps)]
+    service = _service(VocabService, rows)
+    assert benchmark(run, service.get_recent_vocab_prompt_for_agent, ROWS).count("\n") == ROWS + 2
+
+
+def test_recent_grammar_prompt(benchmark, uow, run, timestamps):
+    benchmark.group = "prompt_for_agent"
+    rows = [Grammar(id=i, name=f"〜てもいい {i}", usage="許可を表す", status=0.5, updated_at=t)
+            for i, t in enumerate(timestamps)]
+    service = _service(GrammarService, rows)
+    assert benchmark(run, service.get_recent_grammar_prompt_for_agent, ROWS).count("\n") == ROWS + 2
+
+
+def test_recent_mistake_prompt(benchmark, uow, run, timestamps):
+    benchmark.group = "prompt_for_agent"
+    rows = [Mistake(id=i, question=f"Choice Question: 魚___食べます。 ({i})", updated_at=t)
+            for i, t in enumerate(timestamps)]
+    service = _service(MistakeService, rows)
+    assert benchmark(run, service.get_user_mistake_prompt_for_agent, ROWS).count("\n") == ROWS + 2
+
+
+def test_memory_summary_prompt(benchmark, uow, run, timestamps):
+    benchmark.group = "prompt_for_agent"
+    rows = [Memory(id=i, summary=f"ユーザーは話題{i}が好き", category=f"category{i % 8}", priority=i % 3,
+                   language="ja" if i % 4 else "en", updated_at=t)
+            for i, t in enumerate(timestamps)]
+    service = _service(MemoryService, rows)
+    assert benchmark(run, service.get_user_memory_summary_prompt_for_agent, ROWS).count("\n") == ROWS + 8 + 2
+
+
+# Search / vector
+
+
+def test_search_to_dict(benchmark, timestamps):
+    benchmark.group = "search"
+    rows = [Vocab(id=i, user_id=1, name=f"単語{i}", usage="例文", status=1.0, language="ja",
+                  created_at=t, updated_at=t) for i, t in enumerate(timestamps)]
+    result = benchmark(lambda: [_to_dict(r) for r in rows])
+    assert len(result) == ROWS and result[0]["name"] == "単語0"
+
+
+def test_build_point(benchmark):
+    benchmark.group = "vector"
+    rng = random.Random(0)
+    vectors = {"name": [rng.random() for _ in range(1536)], "usage": [rng.random() for _ in range(1536)]}
+    payload = {"user_id": 1, "origin_id": 42, "model": "Vocab", "language": "ja"}
+    point = benchmark(_build_point, vectors, payload, 42)
+    assert point["id"] == 42 and set(point["vector"]) == {"name", "usage"}
+
+
+# Auth
+
+
+def test_verify_access_token(benchmark):
+    benchmark.group = "auth"
+    token = create_access_token(1)
+    assert benchmark(verify_access_token, token)["sub"] == "1"
@@ -0,0 +1,59 @@
+"""
+AgentEventQueue 的测试: chunk 合并与队列上限 (backpressure)。
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.agent.core.queue import AgentEventQueue
+from app.services.agent.core.schema import (
+    AgentEventType,
+    AgentStreamChunkData,
+    AgentStreamChunkEvent,
+    AgentStreamEndEvent,
+)
+
+
+def chunk(text: str) -> AgentStreamChunkEvent:
+    return AgentStreamChunkEvent(data=AgentStreamChunkData(chunk=text))
+
+
+@pytest.mark.asyncio
+async def test_consecutive_chunks_are_coalesced():
+    """窗口内连续的 chunk 合并为一个 event, 其他 event 保持顺序"""
+    queue = AgentEventQueue(maxsize=8, coalesce_ms=50, coalesce_bytes=1024)
+    for text in ["こん", "にち", "は"]:
+        await queue.put(chunk(text))
+    queue.put_nowait(AgentStreamEndEvent())
+
+    first = await queue.get()
+    assert first.type == AgentEventType.STREAM_CHUNK
+    assert first.data.chunk == "こんにちは"
+    assert (await queue.get()).type == AgentEventType.STREAM_END
+
+
+@pytest.mark.asyncio
+async def test_coalesce_respects_byte_limit():
+    """超过字节上限的 chunk 不会被合并到同一帧"""
+    queue = AgentEventQueue(maxsize=8, coalesce_ms=50, coalesce_bytes=4)
+    for text in ["ab", "cd", "ef"]:
+        await queue.put(chunk(text))
+
+    assert (await queue.get()).data.chunk == "abcd"
+    assert (await queue.get()).data.chunk == "ef"
+
+
+@pytest.mark.asyncio
+async def test_put_waits_when_full():
+    """队列满时 put 等待消费者取出"""
+    queue = AgentEventQueue(maxsize=1, coalesce_ms=0, coalesce_bytes=1024)
+    await queue.put(AgentStreamEndEvent())
+
+    pending = asyncio.create_task(queue.put(AgentStreamEndEvent()))
+    await asyncio.sleep(0.01)
+    assert not pending.done()
+
+    await queue.get()
+    await asyncio.wait_for(pending, 1)
+    assert queue.qsize() == 1
@@ -0,0 +1,54 @@
+"""
+回放 trajectory 的 fake chat model 的测试。
+"""
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+from app.llm.fake import ScriptedChatModel, make_fake_chat_model
+
+TRAJECTORIES = [
+    {"match": "record", "turns": [{"tool_calls": [{"name": "lookup", "args": {"word": "魚"}}]}, {"content": "done"}]},
+    {"turns": [{"content": "default"}]},
+]
+
+
+@tool
+def lookup(word: str) -> str:
+    """Look up a word."""
+    return f"{word}: fish"
+
+
+def test_turn_is_chosen_by_prompt_and_step():
+    model = ScriptedChatModel(trajectories=TRAJECTORIES)
+    first = model.invoke([SystemMessage("record answers"), HumanMessage("hi")])
+    assert first.tool_calls[0]["name"] == "lookup"
+    assert first.response_metadata["token_usage"]["total_tokens"] > 0
+    # 最后一条 system message 之后的 AI message 数即为步骤
+    history = [SystemMessage("record answers"), HumanMessage("hi"), first,
+               ToolMessage("魚: fish", tool_call_id=first.tool_calls[0]["id"])]
+    assert model.invoke(history).content == "done"
+    assert model.invoke([*history, AIMessage("done"), SystemMessage("next phase")]).tool_calls
+    assert model.invoke([SystemMessage("other")]).content == "default"
+
+
+@pytest.mark.asyncio
+async def test_react_agent_replays_tool_calls():
+    model = ScriptedChatModel(trajectories=TRAJECTORIES, chunk_size=2)
+    graph = create_react_agent(model=model, tools=[lookup])
+    events = [
+        ev async for ev in graph.astream_events(
+            {"messages": [{"role": "system", "content": "record"}, {"role": "user", "content": "hi"}]}, version="v2"
+        )
+    ]
+    assert [ev["name"] for ev in events if ev["event"] == "on_tool_end"] == ["lookup"]
+    ends = [ev["data"]["output"] for ev in events if ev["event"] == "on_chat_model_end"]
+    assert ends[-1].content == "done"
+    assert all(end.usage_metadata["input_tokens"] > 0 for end in ends)
+
+
+def test_default_trajectories_load():
+    model = make_fake_chat_model(latency=0, chunk_latency=0)
+    assert model.invoke([SystemMessage("You are the best language learning platform's intelligent judge AI")]).content
@@ -0,0 +1,64 @@
+"""
+Agent graph 中 LLM 调用的配额扣除与早停 (QuotaCallbackHandler) 的测试。
+"""
+
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+from app.core.exceptions.common import TokenQuotaExceededException
+from app.infra.quota import QuotaBucket
+from app.llm import LLMModel, QUOTA_CHARGED_TAG, QuotaCallbackHandler
+from app.llm.fake import ScriptedChatModel
+
+USAGE = {"input_tokens": 900, "output_tokens": 100, "cached_tokens": 0}
+TRAJECTORIES = [
+    {"turns": [
+        {"tool_calls": [{"name": "lookup", "args": {"word": "魚"}}], "usage": USAGE},
+        {"tool_calls": [{"name": "lookup", "args": {"word": "水"}}], "usage": USAGE},
+        {"content": "done", "usage": USAGE},
+    ]},
+]
+
+
+@tool
+def lookup(word: str) -> str:
+    """Look up a word."""
+    return f"{word}: fish"
+
+
+PAYLOAD = {"messages": [{"role": "system", "content": "record"}, {"role": "user", "content": "hi"}]}
+
+
+def _quota(limit: int) -> QuotaBucket:
+    user = SimpleNamespace(id=1, token_quota=limit)
+    return QuotaBucket(fakeredis.FakeAsyncRedis(decode_responses=True), user)
+
+
+async def test_each_call_is_charged_until_the_budget_runs_out():
+    price = LLMModel.price_of("scripted")
+    # 足够两次调用, 第三次调用前余额已为负
+    quota = _quota(2 * 1000 * price - 1)
+    handler = QuotaCallbackHandler(quota)
+    graph = create_react_agent(model=ScriptedChatModel(trajectories=TRAJECTORIES), tools=[lookup])
+
+    tools = []
+    with pytest.raises(TokenQuotaExceededException):
+        async for ev in graph.astream_events(PAYLOAD, config={"callbacks": [handler]}, version="v2"):
+            if ev["event"] == "on_tool_end":
+                tools.append(ev["name"])
+
+    assert tools == ["lookup", "lookup"]
+    assert handler.charged == 2 * 1000 * price
+    assert await quota._get_remaining(create_if_missing=False) == -1
+
+
+async def test_calls_charged_by_chat_completion_are_skipped():
+    quota = _quota(10**9)
+    handler = QuotaCallbackHandler(quota)
+    model = ScriptedChatModel(trajectories=[{"turns": [{"content": "ok", "usage": USAGE}]}])
+    await model.ainvoke("hi", config={"callbacks": [handler], "tags": [QUOTA_CHARGED_TAG]})
+    assert handler.charged == 0
@@ -0,0 +1,107 @@
+"""
+SSE 客户端断开时 run_stream 的清理 (取消 agent、回滚、归还配额 lease、结束 span) 的测试。
+
+Starlette 的 StreamingResponse 在断开时取消 anyio task group, 之后 finally 中的每个 await 都会再次被取消。
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import fakeredis
+
+from app.api.v1.endpoints.question import _sse_response
+from app.core.tracing import Tracer
+from app.infra.context import uow_ctx
+from app.infra.quota import QuotaBucket, QuotaLease
+from app.infra.uow import UnitOfWork
+from app.services.agent.core import core
+from app.services.agent.core.schema import AgentStreamChunkData, AgentStreamChunkEvent
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+    def shutdown(self):
+        pass
+
+
+class RecordingDB:
+    def __init__(self):
+        self.rollbacks = 0
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+class HangingAgent(core.CoreAgent):
+    """Send one chunk, then wait until cancelled."""
+
+    async def run(self):
+        await self.emit(AgentStreamChunkEvent(data=AgentStreamChunkData(chunk="hi")))
+        await asyncio.Event().wait()
+
+
+async def _disconnect_after_first_frame(response) -> None:
+    first_frame = asyncio.Event()
+
+    async def receive():
+        await first_frame.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            first_frame.set()
+
+    scope = {"type": "http", "asgi": {"spec_version": "2.0"}, "method": "POST", "path": "/"}
+    await response(scope, receive, send)
+
+
+def make_uow(quota_factory=QuotaBucket):
+    redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    user = SimpleNamespace(id=1, token_quota=10**9)
+    uow = UnitOfWork(db=RecordingDB(), redis=redis_client, current_user=user, current_user_id=1)
+    uow._register("quota", quota_factory(redis_client, user))
+    return uow
+
+
+async def test_disconnect_cancels_run_and_ends_span(monkeypatch):
+    exporter = ListExporter()
+    tracer = Tracer(exporter, export_interval=0.01)
+    monkeypatch.setattr(core, "start_span", lambda name, **attributes: tracer.start_span(name, None, **attributes))
+    uow = make_uow()
+    token = uow_ctx.set(uow)
+    try:
+        agent = HangingAgent()
+    finally:
+        uow_ctx.reset(token)
+    cancelled_before = core.AGENT_CANCELLED_RUNS.value(agent="HangingAgent")
+
+    await asyncio.wait_for(_disconnect_after_first_frame(_sse_response(agent.run_stream())), 5)
+    # 清理在独立的 task 中完成
+    await asyncio.wait_for(asyncio.gather(*core._CLEANUP_TASKS), 5)
+    tracer.shutdown()
+
+    assert uow.db.rollbacks == 1
+    assert core.AGENT_CANCELLED_RUNS.value(agent="HangingAgent") == cancelled_before + 1
+    [run_span] = [s for s in exporter.spans if s.name == "agent.run"]
+    assert run_span.attributes["cancelled"] is True
+
+
+async def test_disconnect_returns_quota_lease():
+    uow = make_uow(QuotaLease)
+    token = uow_ctx.set(uow)
+    try:
+        agent = HangingAgent()
+    finally:
+        uow_ctx.reset(token)
+
+    await asyncio.wait_for(_disconnect_after_first_frame(_sse_response(agent.run_stream())), 5)
+    await asyncio.wait_for(asyncio.gather(*core._CLEANUP_TASKS), 5)
+
+    # preflight 借的 lease 没有被使用, 全部归还
+    assert uow.quota.local == 0
+    assert int(await uow.redis.get("quota:1")) == 10**9
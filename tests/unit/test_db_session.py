@@ -0,0 +1,84 @@
+"""
+release_connection 与 replica 路由的测试。
+"""
+
+import pytest
+from sqlalchemy import Column, Integer, String, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+
+from app.core.db.provider import get_engine, get_replica_engine, make_async_session_maker
+from app.core.db.routing import use_primary
+from app.core.db.session import has_pending_writes, release_connection
+
+_Base = declarative_base()
+
+
+class _Item(_Base):
+    __tablename__ = "items"
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+
+
+@pytest.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(_Base.metadata.create_all)
+    maker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with maker() as s:
+        yield s
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_read_only_transaction_is_released(session):
+    await session.execute(select(_Item))
+    assert session.in_transaction()
+    assert not has_pending_writes(session)
+
+    assert await release_connection(session)
+    assert not session.in_transaction()
+
+
+@pytest.mark.asyncio
+async def test_transaction_with_writes_is_kept(session):
+    session.add(_Item(name="a"))
+    await session.flush()
+
+    assert not await release_connection(session)
+    assert session.in_transaction()
+
+    await session.commit()
+    await session.execute(text("SELECT 1"))
+    assert await release_connection(session)
+
+
+@pytest.mark.asyncio
+async def test_replica_routing_with_read_your_writes(tmp_path):
+    """只读查询走 replica; 写入之后以及 use_primary 内走 primary"""
+    urls = {}
+    for role in ("primary", "replica"):
+        urls[role] = f"sqlite+aiosqlite:///{tmp_path / role}.db"
+        engine = create_async_engine(urls[role])
+        async with engine.begin() as conn:
+            await conn.run_sync(_Base.metadata.create_all)
+            await conn.execute(text("INSERT INTO items (name) VALUES (:name)"), {"name": role})
+        await engine.dispose()
+
+    maker = make_async_session_maker(urls["primary"], replica_url=urls["replica"])
+    latest = select(_Item.name).order_by(_Item.id.desc())
+    try:
+        async with maker() as s:
+            assert (await s.execute(latest)).scalar() == "replica"
+            with use_primary(s):
+                assert (await s.execute(latest)).scalar() == "primary"
+
+            s.add(_Item(name="written"))
+            await s.flush()
+            assert (await s.execute(latest)).scalar() == "written"
+            await s.commit()
+            assert (await s.execute(latest)).scalar() == "written"
+    finally:
+        await get_engine().dispose()
+        await get_replica_engine().dispose()
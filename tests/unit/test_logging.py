@@ -0,0 +1,55 @@
+"""
+结构化日志 (context / 采样 / 队列) 的测试。
+"""
+
+import json
+import logging
+import queue
+
+from app.core.logging import (
+    ContextFilter,
+    JsonFormatter,
+    NonBlockingQueueHandler,
+    SamplingFilter,
+    bind_log_context,
+    parse_sample_rates,
+    reset_log_context,
+)
+
+
+def _record(name="app.agent.tool", level=logging.INFO, msg="tool end %s", args=("search",), **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_context_fields_are_formatted_as_json():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    handler.addFilter(ContextFilter())
+    token = bind_log_context(request_id="req-1", user_id=7)
+    try:
+        handler.handle(_record(tool="search_resource"))
+    finally:
+        reset_log_context(token)
+    handler.handle(_record())
+
+    first, second = handler.queue.get_nowait(), handler.queue.get_nowait()
+    entry = json.loads(JsonFormatter().format(first))
+    assert entry["message"] == "tool end search"
+    assert entry["request_id"] == "req-1" and entry["user_id"] == 7
+    assert entry["tool"] == "search_resource"
+    assert "request_id" not in json.loads(JsonFormatter().format(second))
+
+
+def test_sampling_keeps_warnings_and_full_queue_drops():
+    sampling = SamplingFilter(parse_sample_rates("app.agent.tool=0, bad, app.x=oops"))
+    assert sampling.rates == [("app.agent.tool", 0.0)]
+    assert not sampling.filter(_record())
+    assert sampling.filter(_record(level=logging.WARNING))
+    assert sampling.filter(_record(name="app.agent.toolbox"))
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(_record())
+    # 队列满时不抛出异常
+    handler.handle(_record())
+    assert handler.queue.qsize() == 1
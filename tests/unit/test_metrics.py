@@ -0,0 +1,42 @@
+"""
+Histogram / Prometheus exposition 的测试。
+"""
+
+import pytest
+
+from app.core.metrics import Histogram, MetricRegistry, current_endpoint, render
+from app.core.metrics.registry import Counter
+
+
+def test_histogram_render_is_cumulative_and_escaped():
+    registry = MetricRegistry()
+    seconds = registry.register(Histogram("t_seconds", "latency", labelnames=("endpoint",), buckets=(0.1, 1.0)))
+    calls = registry.register(Counter("t_total", "calls", labelnames=("endpoint", "tier")))
+    seconds.observe(0.05, endpoint="/v1/vocab/{id}")
+    seconds.observe(0.5, endpoint="/v1/vocab/{id}")
+    seconds.observe(5, endpoint="/v1/vocab/{id}")
+    calls.inc(endpoint='a"b', tier="")
+
+    text = render(registry)
+    assert "# TYPE t_seconds histogram" in text
+    assert 't_seconds_bucket{endpoint="/v1/vocab/{id}",le="0.1"} 1' in text
+    assert 't_seconds_bucket{endpoint="/v1/vocab/{id}",le="1"} 2' in text
+    assert 't_seconds_bucket{endpoint="/v1/vocab/{id}",le="+Inf"} 3' in text
+    assert 't_seconds_count{endpoint="/v1/vocab/{id}"} 3' in text
+    assert 't_seconds_sum{endpoint="/v1/vocab/{id}"} 5.55' in text
+    # 空 label 不输出
+    assert 't_total{endpoint="a\\"b"} 1' in text
+
+
+def test_endpoint_outside_request_is_background():
+    assert current_endpoint() == "background"
+
+
+def test_register_same_name_requires_same_kind_and_labels():
+    registry = MetricRegistry()
+    calls = registry.register(Counter("t_total", "calls", labelnames=("endpoint",)))
+    assert registry.register(Counter("t_total", "calls", labelnames=("endpoint",))) is calls
+    with pytest.raises(ValueError):
+        registry.register(Histogram("t_total", "calls", labelnames=("endpoint",)))
+    with pytest.raises(ValueError):
+        registry.register(Counter("t_total", "calls", labelnames=("endpoint", "tier")))
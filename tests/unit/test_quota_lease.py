@@ -0,0 +1,70 @@
+"""
+QuotaLease (本地 lease, 不足时补充, close 时归还) 的测试。
+"""
+
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from app.core.exceptions.common.token_quota_exceeded import TokenQuotaExceededException
+from app.infra.quota import QuotaLease
+
+
+def _user(quota: int = 1000) -> SimpleNamespace:
+    return SimpleNamespace(id=1, token_quota=quota)
+
+
+async def test_lease_spends_locally_and_returns_rest():
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    lease = QuotaLease(client, _user(), lease_size=100)
+
+    # 第一次 check 借一个 lease, 之后 lease 内的 check / consume 不访问 Redis
+    await lease.check(need=1)
+    assert int(await client.get("quota:1")) == 900
+    await lease.consume(30)
+    await lease.check(need=50)
+    await lease.consume(20, multiplier=2)
+    assert lease.local == 30
+    assert int(await client.get("quota:1")) == 900
+
+    # 不足的部分 (已用掉的 token) 一定扣除, 并补充下一个 lease
+    await lease.consume(50)
+    assert lease.local == 100
+    assert int(await client.get("quota:1")) == 780
+
+    await lease.aclose()
+    assert lease.local == 0
+    assert int(await client.get("quota:1")) == 880
+
+
+async def test_check_counts_balance_left_in_redis():
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    lease = QuotaLease(client, _user(), lease_size=100)
+
+    # 预检额大于 lease 时只借一个 lease
+    await lease.check(need=800)
+    assert lease.local == 100
+    with pytest.raises(TokenQuotaExceededException) as exc_info:
+        await lease.check(need=1001)
+    assert exc_info.value.detail["remaining"] == 1000
+
+    # 透支后余额为负, 之后的 check 被拒绝
+    await lease.consume(1200)
+    with pytest.raises(TokenQuotaExceededException):
+        await lease.check(need=1)
+    assert lease.local == 0
+    await lease.aclose()
+    assert int(await client.get("quota:1")) == -200
+
+
+async def test_zero_lease_size_behaves_like_bucket():
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    lease = QuotaLease(client, _user(), lease_size=0)
+
+    await lease.check(need=10)
+    await lease.consume(10)
+    assert lease.local == 0
+    assert int(await client.get("quota:1")) == 990
+    await lease.aclose()
+    assert int(await client.get("quota:1")) == 990
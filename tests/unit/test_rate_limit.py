@@ -0,0 +1,79 @@
+"""
+RateLimiter (滑动窗口 / 同时运行的 agent 数) 与 middleware 的测试。
+"""
+
+import fakeredis
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from app.core.auth.jwt import create_access_token
+from app.core.exceptions.common import TooManyRequestsException
+from app.core.redis import set_redis_client
+from app.infra.quota import RateLimit, RateLimiter, RateLimitMiddleware
+from app.infra.quota.rate_limit import parse_rate_limits
+
+
+async def test_sliding_window_and_stream_slots():
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    limiter = RateLimiter(client, limits={"agent": RateLimit(2, 60)}, max_streams=1)
+
+    await limiter.check(1, "agent")
+    await limiter.check(1, "agent")
+    with pytest.raises(TooManyRequestsException) as exc_info:
+        await limiter.check(1, "agent")
+    assert 0 < exc_info.value.detail["retry_after"] <= 60
+    # 其他用户与未配置的 route class 不受影响
+    await limiter.check(2, "agent")
+    await limiter.check(1, "default")
+
+    slot = await limiter.acquire_stream(1)
+    with pytest.raises(TooManyRequestsException):
+        await limiter.acquire_stream(1)
+    await limiter.release_stream(1, slot)
+    await limiter.release_stream(1, await limiter.acquire_stream(1))
+
+    assert parse_rate_limits("agent=5/10, llm=x/1, bad") == {"agent": RateLimit(5, 10.0)}
+
+
+async def test_middleware_rejects_with_429():
+    set_redis_client(fakeredis.FakeAsyncRedis(decode_responses=True))
+    app = Starlette(routes=[Route("/v1/question/agent/question", lambda request: PlainTextResponse("ok"), methods=["POST"])])
+    middleware = RateLimitMiddleware(app)
+    middleware._limiter = RateLimiter(middleware.limiter().redis, limits={"agent": RateLimit(1, 60)})
+    headers = {"Authorization": f"Bearer {create_access_token(7)}"}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://test") as http:
+        assert (await http.post("/v1/question/agent/question", headers=headers)).status_code == 200
+        rejected = await http.post("/v1/question/agent/question", headers=headers)
+        # 没有 token 的请求不在这里限制 (由 get_uow 返回 401)
+        anonymous = await http.post("/v1/question/agent/question")
+
+    assert rejected.status_code == 429
+    assert rejected.json()["error_type"] == "too_many_requests"
+    assert int(rejected.headers["Retry-After"]) > 0
+    assert anonymous.status_code == 200
+
+
+async def test_middleware_token_is_verified_once(monkeypatch):
+    from app.core.auth import jwt as jwt_module
+
+    calls = []
+    verify = jwt_module.verify_access_token
+    monkeypatch.setattr(jwt_module, "verify_access_token", lambda token: calls.append(token) or verify(token))
+    set_redis_client(fakeredis.FakeAsyncRedis(decode_responses=True))
+
+    async def endpoint(request):
+        # get_uow 同样通过 verify_access_token_once 取得 payload
+        payload = jwt_module.verify_access_token_once(token, request.scope.setdefault("state", {}))
+        return PlainTextResponse(payload["sub"])
+
+    app = Starlette(routes=[Route("/v1/vocab/page", endpoint)])
+    token = create_access_token(7)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=RateLimitMiddleware(app)), base_url="http://test") as http:
+        response = await http.get("/v1/vocab/page", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.text == "7"
+    assert calls == [token]
@@ -0,0 +1,67 @@
+"""
+Tracer / exporter 的测试。
+"""
+
+import asyncio
+
+import pytest
+
+from app.core.tracing import NOOP_SPAN, OTLPSpanExporter, Tracer, current_span, make_span_exporter
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+    def shutdown(self):
+        pass
+
+
+def test_spans_nest_and_are_exported():
+    exporter = ListExporter()
+    tracer = Tracer(exporter, export_interval=0.01)
+
+    async def child():
+        # create_task 复制 context, 子 task 中的 span 仍以外层 span 为 parent
+        with tracer.span("db.execute", operation="SELECT"):
+            pass
+
+    with tracer.span("http.request", path="/v1/vocab/page") as root:
+        asyncio.run(child())
+        with pytest.raises(ValueError):
+            with tracer.span("llm.chat"):
+                raise ValueError("boom")
+    assert current_span() is None
+    tracer.shutdown()
+
+    spans = {s.name: s for s in exporter.spans}
+    assert set(spans) == {"http.request", "db.execute", "llm.chat"}
+    assert spans["db.execute"].parent_id == root.span_id
+    assert {s.trace_id for s in exporter.spans} == {root.trace_id}
+    assert spans["llm.chat"].status == "error" and "boom" in spans["llm.chat"].error
+
+
+def test_unsampled_and_disabled_tracers_record_nothing():
+    exporter = ListExporter()
+    tracer = Tracer(exporter, sample_rate=0.0, export_interval=0.01)
+    with tracer.span("http.request") as root:
+        with tracer.span("db.execute") as child:
+            assert root is NOOP_SPAN and child is NOOP_SPAN
+    tracer.shutdown()
+    assert exporter.spans == []
+    assert not Tracer(make_span_exporter("none")).enabled
+
+
+def test_otlp_encoding():
+    tracer = Tracer(ListExporter())
+    span = tracer.start_span("embedding", None, texts=3, provider="hash", ratio=0.5, cached=True)
+    span.end()
+    encoded = OTLPSpanExporter(endpoint="http://collector:4318/v1/traces", headers={}).encode([span])
+    otlp = encoded["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert otlp["traceId"] == span.trace_id and len(otlp["traceId"]) == 32
+    assert otlp["status"] == {"code": 1}
+    assert {"key": "texts", "value": {"intValue": "3"}} in otlp["attributes"]
+    assert {"key": "cached", "value": {"boolValue": True}} in otlp["attributes"]
@@ -0,0 +1,28 @@
+"""
+UnitOfWork 的 Lazy 资源 (第一次访问时创建) 的测试。
+"""
+
+import pytest
+
+from app.infra.uow import Lazy, UnitOfWork
+
+
+def test_failed_lazy_factory_is_retried():
+    calls = []
+
+    def factory(uow):
+        calls.append(uow)
+        if len(calls) == 1:
+            raise RuntimeError("redis is not initialised")
+        return "quota"
+
+    uow = UnitOfWork(quota=Lazy(factory))
+
+    # 失败时抛出原来的错误, 而不是 "has no resource"
+    with pytest.raises(RuntimeError):
+        uow.quota
+    assert not uow.is_created("quota")
+
+    assert uow.quota == "quota"
+    assert uow.quota == "quota"
+    assert len(calls) == 2
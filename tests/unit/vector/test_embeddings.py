@@ -0,0 +1,47 @@
+"""
+本地 hash embedding 后端的测试。
+"""
+
+import numpy as np
+import pytest
+
+from app.core.vector.embeddings import (
+    HashEmbeddingProvider,
+    get_embeddings,
+    make_embedding_provider,
+    set_embedding_provider,
+    truncate_embedding,
+)
+
+
+def test_hash_embeddings_are_deterministic_and_normalized():
+    first = HashEmbeddingProvider(dimension=256).embed(["魚を食べる", ""])
+    second = HashEmbeddingProvider(dimension=256).embed(["魚を食べる", ""])
+    assert first == second
+    assert np.linalg.norm(first[0]) == pytest.approx(1.0)
+    assert not any(first[1])
+
+
+def test_similar_texts_are_closer():
+    a, b, c = HashEmbeddingProvider().embed(["魚を食べる", "魚を食べた", "図書館で勉強する"])
+    assert np.dot(a, b) > np.dot(a, c)
+
+
+def test_smaller_dimensions_match_truncation():
+    provider = HashEmbeddingProvider(dimension=256)
+    full = provider.embed(["vocabulary"])[0]
+    short = provider.embed(["vocabulary"], 64)[0]
+    assert short == pytest.approx(truncate_embedding(full, 64), abs=1e-6)
+    # 不能比基础维度更长 (Qdrant 会拒绝维度不符的 upsert)
+    with pytest.raises(ValueError):
+        provider.embed(["vocabulary"], 512)
+
+
+def test_provider_is_selected_by_name():
+    provider = make_embedding_provider("hash")
+    try:
+        assert get_embeddings(["a", "b"], 32) == provider.embed(["a", "b"], 32)
+        with pytest.raises(ValueError):
+            make_embedding_provider("word2vec")
+    finally:
+        set_embedding_provider(None)
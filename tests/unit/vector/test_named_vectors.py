@@ -0,0 +1,93 @@
+"""
+named vector collection 的创建与旧 per-field collection 迁移的测试。
+"""
+
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    Distance,
+    FieldCondition,
+    Filter,
+    MatchValue,
+    PointStruct,
+    ScalarType,
+    VectorParams,
+)
+
+from app.infra.vector.collections import COLLECTIONS_CONFIG, VectorCollection, vector_params
+from app.infra.vector.operations import create_vector_collection, ensure_collections_exist
+from scripts.migrate_named_vectors import migrate_model
+from scripts.reindex_vectors import reindex_collection
+
+
+def test_legacy_collections_merge_into_one_point():
+    client = QdrantClient(":memory:")
+    for collection, params in COLLECTIONS_CONFIG.items():
+        client.create_collection(collection_name=collection.value, vectors_config=params)
+    size = COLLECTIONS_CONFIG[VectorCollection.VOCAB]["name"].size
+    for field, first in (("name", 1.0), ("usage", 0.0)):
+        client.create_collection(f"vocab_{field}", vectors_config=VectorParams(size=size, distance=Distance.COSINE))
+        client.upsert(f"vocab_{field}", points=[
+            PointStruct(
+                id=7,
+                vector=[first] + [0.5] * (size - 1),
+                payload={"user_id": 1, "model": "Vocab", "field": field, "origin_id": 7, "content_hash": f"h-{field}"},
+            )
+        ])
+
+    assert migrate_model(client, "Vocab", batch_size=10) == 1
+
+    point = client.retrieve(VectorCollection.VOCAB.value, [7], with_payload=True, with_vectors=True)[0]
+    assert set(point.vector) == {"name", "usage"}
+    assert point.payload["content_hash"] == {"name": "h-name", "usage": "h-usage"}
+    assert "field" not in point.payload
+
+    hits = client.query_points(
+        VectorCollection.VOCAB.value,
+        query=[1.0] + [0.5] * (size - 1),
+        using="name",
+        query_filter=Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=1))]),
+        limit=1,
+    ).points
+    assert [h.id for h in hits] == [7]
+
+
+def test_ensure_collections_exist_is_idempotent():
+    client = QdrantClient(":memory:")
+    ensure_collections_exist(client)
+    ensure_collections_exist(client)
+    for collection, params in COLLECTIONS_CONFIG.items():
+        assert set(client.get_collection(collection.value).config.params.vectors) == set(params)
+
+
+def test_quantized_vectors_keep_originals_on_disk():
+    assert vector_params("none").quantization_config is None
+    assert vector_params("none").on_disk is False
+    scalar = vector_params("scalar")
+    assert scalar.quantization_config.scalar.type == ScalarType.INT8
+    assert scalar.on_disk is True
+    assert vector_params("binary").quantization_config.binary is not None
+    with pytest.raises(ValueError):
+        vector_params("pq")
+
+
+def test_reindex_truncates_to_configured_dimensions():
+    client = QdrantClient(":memory:")
+    create_vector_collection(client, "vocab", {
+        "name": VectorParams(size=8, distance=Distance.COSINE),
+        "usage": VectorParams(size=8, distance=Distance.COSINE),
+    })
+    client.upsert("vocab", points=[
+        PointStruct(id=i, vector={"name": [3.0, 4.0] + [1.0] * 6, "usage": [1.0] * 8}, payload={"user_id": 1, "origin_id": i})
+        for i in range(1, 4)
+    ])
+    params = {"name": VectorParams(size=2, distance=Distance.COSINE), "usage": VectorParams(size=8, distance=Distance.COSINE)}
+
+    assert reindex_collection(client, "vocab", params, batch_size=2) == 3
+    assert reindex_collection(client, "vocab", params, batch_size=2) == 0
+    assert not client.collection_exists("vocab__reindex")
+    point = client.retrieve("vocab", [2], with_vectors=True, with_payload=True)[0]
+    # 截断后重新归一化
+    assert point.vector["name"] == pytest.approx([0.6, 0.8])
+    assert len(point.vector["usage"]) == 8
+    assert point.payload["origin_id"] == 2
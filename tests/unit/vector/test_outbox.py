@@ -0,0 +1,234 @@
+"""
+outbox -> Qdrant 同步 worker 的测试 (sqlite + 内存 Qdrant)。
+"""
+
+import asyncio
+
+import fakeredis
+import pytest
+from qdrant_client import QdrantClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.db.base import Base
+from app.core.tracing import Tracer, tracer as tracer_module
+from app.core.vector.embeddings import EMBEDDING_DIMENSION
+from app.infra.models import Vocab, VectorOutbox
+from app.infra.vector.collections import COLLECTIONS_CONFIG, VectorCollection
+from app.infra.vector.outbox import (
+    VECTOR_SYNC_STREAM,
+    VECTOR_OPERATIONS,
+    VECTOR_POINTS,
+    VectorSyncWorker,
+    enqueue_vector_delete,
+    enqueue_vector_upsert,
+    publish_vector_jobs,
+)
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+    def shutdown(self):
+        pass
+
+
+def _embed(texts, dimensions=EMBEDDING_DIMENSION):
+    return [[float(len(text))] + [1.0] * (dimensions - 1) for text in texts]
+
+
+@pytest.fixture
+async def maker():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    await engine.dispose()
+
+
+@pytest.fixture
+def client():
+    client = QdrantClient(":memory:")
+    for collection, params in COLLECTIONS_CONFIG.items():
+        client.create_collection(collection_name=collection.value, vectors_config=params)
+    return client
+
+
+async def _outbox_count(maker) -> int:
+    async with maker() as db:
+        return (await db.execute(select(func.count()).select_from(VectorOutbox))).scalar()
+
+
+@pytest.mark.asyncio
+async def test_worker_upserts_then_deletes(maker, client):
+    async with maker() as db:
+        vocab = Vocab(user_id=1, name="猫", usage="猫が好き")
+        db.add(vocab)
+        await db.flush()
+        enqueue_vector_upsert(db, vocab)
+        # 同一批次中的重复写入只 embedding 一次
+        enqueue_vector_upsert(db, vocab)
+        await db.commit()
+
+    calls = []
+    worker = VectorSyncWorker(maker, client, embed=lambda texts, dimensions: calls.append(texts) or _embed(texts, dimensions))
+    assert await worker.run_once() == 2
+    # 一次 embedding 调用处理全部字段
+    assert [sorted(c) for c in calls] == [["猫", "猫が好き"]]
+    assert await _outbox_count(maker) == 0
+    # 一行一个 point, 每个字段一个 named vector
+    point = client.retrieve(VectorCollection.VOCAB.value, [vocab.id], with_payload=True, with_vectors=True)[0]
+    assert point.payload["origin_id"] == vocab.id
+    assert set(point.vector) == {"name", "usage"} == set(point.payload["content_hash"])
+
+    async with maker() as db:
+        enqueue_vector_delete(db, vocab)
+        await db.commit()
+    assert await worker.run_once() == 1
+    assert client.retrieve(VectorCollection.VOCAB.value, [vocab.id]) == []
+
+
+@pytest.mark.asyncio
+async def test_failed_rows_are_rescheduled(maker, client):
+    async with maker() as db:
+        vocab = Vocab(user_id=1, name="犬")
+        db.add(vocab)
+        await db.flush()
+        enqueue_vector_upsert(db, vocab)
+        await db.commit()
+
+    def _fail(texts, dimensions):
+        raise RuntimeError("embedding unavailable")
+
+    assert await VectorSyncWorker(maker, client, embed=_fail).run_once() == 1
+    async with maker() as db:
+        row = (await db.execute(select(VectorOutbox))).scalar_one()
+    assert row.attempts == 1 and "embedding unavailable" in row.last_error
+    # 退避期间不会被再次取出
+    assert await VectorSyncWorker(maker, client, embed=_embed).run_once() == 0
+
+
+@pytest.mark.asyncio
+async def test_sync_runs_without_an_open_transaction(maker, client):
+    """认领在第一个事务中提交; embedding / Qdrant 调用期间不持有事务"""
+    async with maker() as db:
+        vocab = Vocab(user_id=1, name="鳥")
+        db.add(vocab)
+        await db.flush()
+        enqueue_vector_upsert(db, vocab)
+        await db.commit()
+
+    sessions = []
+
+    def tracking_maker():
+        sessions.append(maker())
+        return sessions[-1]
+
+    seen = []
+
+    def embed(texts, dimensions):
+        seen.append(sessions[-1].in_transaction())
+        return _embed(texts, dimensions)
+
+    assert await VectorSyncWorker(tracking_maker, client, embed=embed).run_once() == 1
+    assert seen == [False]
+    assert await _outbox_count(maker) == 0
+
+    # 认领提交后 (同步完成前), 其他 worker 在 claim_timeout 内取不到这些行
+    async with maker() as db:
+        enqueue_vector_upsert(db, vocab)
+        await db.commit()
+    async with maker() as db:
+        [row] = await VectorSyncWorker(maker, client, embed=_embed, claim_timeout=60)._claim(db)
+        await db.commit()
+    assert row.attempts == 1
+    assert await VectorSyncWorker(maker, client, embed=_embed).run_once() == 0
+
+
+@pytest.mark.asyncio
+async def test_committed_jobs_wake_the_worker(maker, client):
+    """commit 后发布到 stream 的任务会唤醒 worker; rollback 的任务不发布"""
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    worker = VectorSyncWorker(maker, client, embed=_embed, redis_client=redis_client, interval=5)
+    waiting = asyncio.create_task(worker._wait())
+    await asyncio.sleep(0.05)
+
+    async with maker() as db:
+        db.add(Vocab(user_id=1, name="rolled back"))
+        await db.flush()
+        enqueue_vector_upsert(db, (await db.execute(select(Vocab))).scalar_one())
+        await db.rollback()
+        vocab = Vocab(user_id=1, name="鳥")
+        db.add(vocab)
+        await db.flush()
+        enqueue_vector_upsert(db, vocab)
+        await db.commit()
+        assert await publish_vector_jobs(db, redis_client) == 1
+
+    await asyncio.wait_for(waiting, timeout=1)
+    entries = await redis_client.xrange(VECTOR_SYNC_STREAM)
+    assert [e[1]["id"] for e in entries] == [str(vocab.id)]
+    assert await worker.run_once() == 1
+
+
+@pytest.mark.asyncio
+async def test_unchanged_fields_are_not_re_embedded(maker, client):
+    async with maker() as db:
+        vocab = Vocab(user_id=1, name="魚", usage="魚を食べる")
+        db.add(vocab)
+        await db.flush()
+        enqueue_vector_upsert(db, vocab)
+        await db.commit()
+    await VectorSyncWorker(maker, client, embed=_embed).run_once()
+    before = client.retrieve(VectorCollection.VOCAB.value, [vocab.id], with_vectors=True)[0]
+
+    calls = []
+    worker = VectorSyncWorker(maker, client, embed=lambda texts, dimensions: calls.append(texts) or _embed(texts, dimensions))
+    async with maker() as db:
+        vocab = await db.get(Vocab, vocab.id)
+        # 非向量字段的更新不入队
+        vocab.correct_rate = 0.5
+        enqueue_vector_upsert(db, vocab, changed=["correct_rate"])
+        vocab.usage = "魚が泳ぐ"
+        enqueue_vector_upsert(db, vocab, changed=["usage"])
+        await db.commit()
+
+    assert await worker.run_once() == 1
+    assert calls == [["魚が泳ぐ"]]
+    # 未变更的 name 向量被保留
+    point = client.retrieve(VectorCollection.VOCAB.value, [vocab.id], with_vectors=True)[0]
+    assert point.vector["name"] == pytest.approx(before.vector["name"])
+    assert point.vector["usage"] != pytest.approx(before.vector["usage"])
+
+
+@pytest.mark.asyncio
+async def test_worker_qdrant_calls_are_traced_and_counted(maker, client, monkeypatch):
+    exporter = ListExporter()
+    tracer = Tracer(exporter, export_interval=0.01)
+    monkeypatch.setattr(tracer_module, "_tracer", tracer)
+    async with maker() as db:
+        vocab = Vocab(user_id=1, name="猫", usage="猫が好き")
+        db.add(vocab)
+        await db.flush()
+        enqueue_vector_upsert(db, vocab)
+        await db.commit()
+    collection = VectorCollection.VOCAB.value
+    upserts = VECTOR_OPERATIONS.value(op="upsert", collection=collection)
+    deleted_points = VECTOR_POINTS.value(op="delete", collection=collection)
+    worker = VectorSyncWorker(maker, client, embed=_embed)
+    await worker.run_once()
+    async with maker() as db:
+        enqueue_vector_delete(db, vocab)
+        await db.commit()
+    await worker.run_once()
+    tracer.shutdown()
+
+    spans = [s for s in exporter.spans if s.name.startswith("vector.")]
+    assert [s.name for s in spans] == ["vector.retrieve", "vector.upsert", "vector.delete"]
+    assert all(s.attributes["collection"] == collection for s in spans)
+    assert VECTOR_OPERATIONS.value(op="upsert", collection=collection) == upserts + 1
+    assert VECTOR_POINTS.value(op="delete", collection=collection) == deleted_points + 1